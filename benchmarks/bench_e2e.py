@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark: runs the real CLI commands against the in-process
+LocalECSServer and reports requests/s and p50/p99 request latency.
+
+    python benchmarks/bench_e2e.py [--prefixes 240] [--objects 20] [--latency 0.002]
+                                   [--error-rate 0] [--max-in-flight N] [--concurrency 8]
+                                   [--auth v2]
+
+Latencies are measured by the server, from request received to response
+sent, injected latency included.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s3cli import cli  # noqa: E402
+from s3manager.localserver import LocalECSServer  # noqa: E402
+
+ACCESS_KEY = 'bench-user'
+SECRET_KEY = 'bench-secret'
+NAMESPACE = 'bench-ns'
+PROFILE = 'bench'
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def month_prefixes(count: int) -> list:
+    return [f"{(i % 12) + 1:02d}-{2000 + i // 12}" for i in range(count)]
+
+
+def settle(server):
+    """Wait for the server to finish recording requests whose response was already sent."""
+    while server.in_flight:
+        time.sleep(0.001)
+
+
+def run_scenario(server, config_path, name, args):
+    settle(server)
+    server.reset_stats()
+    sink = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+        try:
+            cli.main(['--config', config_path, '--profile', PROFILE] + args,
+                     prog_name='s3cli', standalone_mode=False)
+            status = 0
+        except SystemExit as e:
+            status = e.code or 0
+        except Exception as e:
+            status = type(e).__name__
+    elapsed = time.perf_counter() - start
+    settle(server)
+    count = len(server.latencies)
+    print(f"{name:<28} {count:>7} {count / elapsed:>10,.0f} "
+          f"{percentile(server.latencies, 50) * 1000:>9.2f} "
+          f"{percentile(server.latencies, 99) * 1000:>9.2f} "
+          f"{elapsed:>9.3f}{'' if not status else f'  (failed: {status})'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--prefixes', type=int, default=240, help='Prefixes in prefix_list')
+    parser.add_argument('--objects', type=int, default=20, help='Objects preloaded per prefix')
+    parser.add_argument('--latency', type=float, default=0.002, help='Injected latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Injected 503 rate')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='Server answers 503 beyond this many concurrent requests')
+    parser.add_argument('--concurrency', type=int, default=8, help='Workers for concurrent commands')
+    parser.add_argument('--auth', choices=['v2', 'v4'], default='v2', help='Signature version')
+    opts = parser.parse_args()
+
+    prefixes = month_prefixes(opts.prefixes)
+    with LocalECSServer({ACCESS_KEY: (SECRET_KEY, NAMESPACE)},
+                        latency=opts.latency, error_rate=opts.error_rate,
+                        max_in_flight=opts.max_in_flight, seed=1) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        bucket = server.create_bucket(NAMESPACE, PROFILE)
+        for prefix in prefixes:
+            for i in range(opts.objects):
+                bucket.put(f"{prefix}/object-{i:05d}.dat", b'x' * 64)
+
+        config_path = os.path.join(tmp, 'config.yaml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump({PROFILE: {
+                'endpoint': server.url,
+                'access_key': ACCESS_KEY,
+                'secret_key': SECRET_KEY,
+                'namespace': NAMESPACE,
+                'region': 'us-east-1',
+                'auth_method': opts.auth,
+                'pool_size': max(10, opts.concurrency),
+                'prefix_list': prefixes,
+            }}, f)
+
+        c = str(opts.concurrency)
+        print(f"{len(prefixes)} prefixes, {len(prefixes) * opts.objects} objects, "
+              f"latency {opts.latency * 1000:g} ms, error rate {opts.error_rate:g}, {opts.auth}")
+        print(f"{'command':<28} {'requests':>7} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'wall s':>9}")
+        run_scenario(server, config_path, 'create-prefixes', ['create-prefixes'])
+        run_scenario(server, config_path, f"create-prefixes -c {c}",
+                     ['create-prefixes', '--concurrency', c])
+        run_scenario(server, config_path, 'batch-lifecycle', ['batch-lifecycle', '10'])
+        run_scenario(server, config_path, 'populate-lifecycles',
+                     ['lifecycle', 'populate-lifecycles', PROFILE, '10'])
+        run_scenario(server, config_path, 'list-objects', ['list-objects', PROFILE])
+        run_scenario(server, config_path, f"list-objects --parallel {c}",
+                     ['list-objects', PROFILE, '--parallel', c])
+        checkpoint = os.path.join(os.path.dirname(config_path), 'usage.json')
+        run_scenario(server, config_path, 'bucket usage -c 1',
+                     ['bucket', 'usage', PROFILE, '--concurrency', '1', '--checkpoint', checkpoint])
+        run_scenario(server, config_path, f"bucket usage -c {c}",
+                     ['bucket', 'usage', PROFILE, '--concurrency', c, '--checkpoint', checkpoint])
+        month = prefixes[0]
+        run_scenario(server, config_path, 'object tag -c 1',
+                     ['object', 'tag', PROFILE, '--prefix', f"{month}/", '--tag', 'month=a', '--concurrency', '1'])
+        run_scenario(server, config_path, f"object tag -c {c}",
+                     ['object', 'tag', PROFILE, '--prefix', f"{month}/", '--tag', 'month=b', '--concurrency', c])
+        run_scenario(server, config_path, f"object tag -c {c} (tagged)",
+                     ['object', 'tag', PROFILE, '--prefix', f"{month}/", '--tag', 'month=b', '--concurrency', c])
+
+
+if __name__ == "__main__":
+    main()
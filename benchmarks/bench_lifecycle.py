@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: parse and serialize 1000-rule lifecycle documents, and
+find the oldest and newest dated rule as populate-lifecycles does.
+
+    python benchmarks/bench_lifecycle.py [iterations]
+
+The baseline is the plain ElementTree approach: fromstring, strip the
+namespaces, tostring; and for the lookups, parse the MM-YYYY part of every
+rule ID and sort. Both lookups start from the raw document, parse included,
+as populate-lifecycles runs them. The script fails if parse + serialize is
+not byte-identical.
+"""
+import datetime
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s3manager.lifecycle import LifecycleConfig, LifecycleRule, NS  # noqa: E402
+
+RULES = 1000
+
+
+def document():
+    rules = []
+    for i in range(RULES - 3):
+        prefix = f"{i % 12 + 1:02d}-{1950 + i // 12}"
+        rules.append(LifecycleRule(f"lifecycle-{prefix}", prefix + '/', date=f"{2000 + i // 12}-01-01"))
+    rules.append(LifecycleRule('expire-after-30-days', days=30, noncurrent_days=7))
+    rules.append(LifecycleRule('remove-expired-markers', delete_marker=True))
+    # Unknown elements are carried through untouched
+    rules.append(LifecycleRule(
+        'archive', 'archive/',
+        extra=['<Transition><Days>30</Days><StorageClass>GLACIER</StorageClass></Transition>']
+    ))
+    return LifecycleConfig(rules).serialize()
+
+
+def et_round_trip(data):
+    root = ET.fromstring(data)
+    for el in root.iter():
+        el.tag = el.tag.rpartition('}')[2]
+    root.set('xmlns', NS)
+    return ET.tostring(root)
+
+
+def sorted_lookup(data):
+    parsed = []
+    for el in ET.fromstring(data).iter(f"{{{NS}}}ID"):
+        rid = el.text
+        if not rid.startswith('lifecycle-'):
+            continue
+        try:
+            m, y = map(int, rid.split('-', 1)[1].split('-'))
+        except ValueError:
+            continue
+        parsed.append((datetime.date(y, m, 1), rid))
+    parsed.sort()
+    return parsed[0][1], parsed[-1][1]
+
+
+def indexed_lookup(data):
+    config = LifecycleConfig.parse(data)
+    return config.oldest('lifecycle-').id, config.newest('lifecycle-').id
+
+
+def bench(name, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34} {elapsed / iterations * 1000:>9.3f} ms")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    data = document()
+    config = LifecycleConfig.parse(data)
+    if config.serialize() != data or LifecycleConfig.parse(config.serialize()).serialize() != data:
+        sys.exit('round trip is not byte-identical')
+    if indexed_lookup(data) != sorted_lookup(data):
+        sys.exit('indexed lookup disagrees with the sorted baseline')
+
+    print(f"{RULES} rules, {len(data) // 1024} KiB, {iterations} iterations")
+    bench('ElementTree parse', lambda: ET.fromstring(data), iterations)
+    bench('LifecycleConfig.parse', lambda: LifecycleConfig.parse(data), iterations)
+    bench('LifecycleConfig.serialize', config.serialize, iterations)
+    bench('ElementTree round trip', lambda: et_round_trip(data), iterations)
+    bench('LifecycleConfig round trip', lambda: LifecycleConfig.parse(data).serialize(), iterations)
+    bench('oldest/newest (ElementTree + sort)', lambda: sorted_lookup(data), iterations)
+    bench('oldest/newest (LifecycleConfig)', lambda: indexed_lookup(data), iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: wall time of complete s3cli processes, as spawned by
+cron jobs and test scripts.
+
+    python benchmarks/bench_startup.py [runs] [--profiles 200] [--prefixes 240]
+
+Each scenario runs `runs` fresh interpreters and reports the median and
+best time, the last one with an `s3cli serve` process running. The
+configuration has --profiles profiles of --prefixes prefixes each, requests
+go to an in-process LocalECSServer. Use
+`python -X importtime s3cli.py --help` to see where import time goes.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from s3manager.localserver import LocalECSServer  # noqa: E402
+
+CLI = [sys.executable, os.path.join(ROOT, 's3cli.py')]
+
+
+def timed_runs(cmd, runs, env):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name, times):
+    print(f"{name:<40} {statistics.median(times) * 1000:>9.1f} {min(times) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('runs', nargs='?', type=int, default=20)
+    parser.add_argument('--profiles', type=int, default=200, help='Profiles in the configuration')
+    parser.add_argument('--prefixes', type=int, default=240, help='Prefixes per profile')
+    opts = parser.parse_args()
+
+    with LocalECSServer({'bench': ('secret', 'ns')}) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        server.create_bucket('ns', 'profile-0')
+        prefixes = [f"{(i % 12) + 1:02d}-{2000 + i // 12}" for i in range(opts.prefixes)]
+        config = {
+            f"profile-{i}": {
+                'endpoint': server.url, 'access_key': 'bench', 'secret_key': 'secret',
+                'namespace': 'ns', 'region': 'us-east-1', 'prefix_list': list(prefixes),
+            }
+            for i in range(opts.profiles)
+        }
+        config_path = os.path.join(tmp, 'config.yaml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump(config, f)
+
+        socket_path = os.path.join(tmp, 's3cli.sock')
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(tmp, 'cache'), S3CLI_SOCKET=socket_path)
+        no_cache = dict(env, S3CLI_NO_CONFIG_CACHE='1')
+        run = ['--config', config_path, '--profile', 'profile-0']
+
+        print(f"{opts.profiles} profiles x {opts.prefixes} prefixes, "
+              f"{os.path.getsize(config_path) // 1024} KiB of YAML, {opts.runs} runs")
+        print(f"{'scenario':<40} {'median ms':>9} {'best ms':>9}")
+        report('python -c pass (interpreter)', timed_runs([sys.executable, '-c', 'pass'], opts.runs, env))
+        report('s3cli --help', timed_runs(CLI + ['--help'], opts.runs, env))
+        report('s3cli object get --help', timed_runs(CLI + run + ['object', 'get', '--help'], opts.runs, env))
+        report('list-objects (config cache)',
+               timed_runs(CLI + run + ['list-objects', 'profile-0'], opts.runs, env))
+        report('list-objects (no config cache)',
+               timed_runs(CLI + run + ['list-objects', 'profile-0'], opts.runs, no_cache))
+
+        server = subprocess.Popen(CLI + ['serve'], env=env, stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                time.sleep(0.05)
+            report('list-objects (forwarded to s3cli serve)',
+                   timed_runs(CLI + run + ['list-objects', 'profile-0'], opts.runs, env))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
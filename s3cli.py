@@ -1,28 +1,205 @@
+import os
+import signal
 import sys
-import datetime
-import xml.etree.ElementTree as ET
-from dateutil.relativedelta import relativedelta
+import threading
 import click
-import yaml
-import requests
-from s3manager.auth import Authenticator
-from s3manager.bucket import BucketManager
-from s3manager.lifecycle import LifecycleManager, build_lifecycle_with_date
+from s3manager.config import load_profiles as _load_profiles
 
+# Command modules (requests, yaml, dateutil, ElementTree, managers...) are
+# imported inside the commands that use them so that short runs, --help
+# and usage errors do not pay for them.
 
-@click.group(context_settings=dict(help_option_names=['--help']))
-@click.option('--profile', required=True, help='Profile name from .config.yaml')
-@click.option('--config', 'config_path', default='.config.yaml',
-              help='Path to configuration file')
-@click.pass_context
-def cli(ctx, profile, config_path):
-    """CLI tool for managing Dell EMC ECS S3 resources."""
+
+def instrument(ctx, trace_path: str, metrics: bool, metrics_file: str) -> list:
+    """
+    Build the request hooks asked for on the command line. The trace file is
+    closed and the metrics reported when ctx closes, even on failure.
+    """
+    from s3manager.metrics import MetricsCollector, TraceWriter
+    hooks = []
+    if trace_path:
+        writer = TraceWriter(trace_path)
+        hooks.append(writer)
+        ctx.call_on_close(writer.close)
+    if metrics or metrics_file:
+        collector = MetricsCollector()
+        hooks.append(collector)
+
+        def report():
+            if metrics_file:
+                collector.write_prometheus(metrics_file)
+            if metrics:
+                click.echo(collector.summary(), err=True)
+        ctx.call_on_close(report)
+    return hooks
+
+
+def load_profiles(config_path: str) -> dict:
     try:
-        cfg = yaml.safe_load(open(config_path)) or {}
+        return _load_profiles(config_path)
     except Exception as e:
         click.echo(f"Error loading config: {e}", err=True)
         sys.exit(1)
 
+
+# Root options taking a value, and those that only make sense in this process
+ROOT_VALUE_OPTIONS = ('--profile', '--profiles', '--max-parallel', '--config', '--trace', '--metrics-file')
+LOCAL_ONLY_OPTIONS = ('--trace', '--metrics', '--metrics-file')
+
+# Commands that ask for confirmation (on the terminal of this process) unless
+# --yes is given, with the flag that makes them ask, None when they always do
+CONFIRMING_COMMANDS = {('prefix', 'purge'): None, ('prefix', 'copy'): '--delete-source'}
+
+
+def may_confirm(args: list) -> bool:
+    """Whether the arguments following the top-level command may call click.confirm."""
+    if '--yes' in args or not args:
+        return False
+    sub = next((a for a in args[1:] if not a.startswith('-')), None)
+    if (args[0], sub) not in CONFIRMING_COMMANDS:
+        return False
+    flag = CONFIRMING_COMMANDS[(args[0], sub)]
+    return flag is None or flag in args
+
+
+def command_name(argv: list):
+    """
+    First sub-command name of a command line, and whether it must run in
+    this process: a local-only option precedes it, or it may ask for confirmation.
+    """
+    local_only = False
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name = arg.split('=', 1)[0]
+        if name in LOCAL_ONLY_OPTIONS:
+            local_only = True
+        if not arg.startswith('-'):
+            return arg, local_only or may_confirm(argv[i:])
+        i += 2 if name in ROOT_VALUE_OPTIONS and '=' not in arg else 1
+    return None, local_only
+
+
+class FanOutGroup(click.Group):
+    """
+    Root group that, with --profiles/--all-profiles, runs the sub-command
+    once per profile concurrently instead of once for --profile.
+    When an `s3cli serve` process is running, top-level invocations are
+    forwarded to it instead of being run here, except those that may ask
+    for confirmation.
+    """
+
+    def main(self, args=None, prog_name=None, **extra):
+        if extra.get('obj') is None and not os.environ.get('S3CLI_NO_DAEMON'):
+            argv = sys.argv[1:] if args is None else list(args)
+            command, local_only = command_name(argv)
+            if command not in (None, 'serve') and not local_only:
+                from s3manager.daemon import forward
+                try:
+                    status = forward(argv)
+                except BrokenPipeError:
+                    # Reader went away (e.g. | head): exit quietly, without a
+                    # second EPIPE when the interpreter flushes stdout
+                    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                    sys.exit(1)
+                if status is not None:
+                    sys.exit(status)
+        return super().main(args=args, prog_name=prog_name, **extra)
+
+    def invoke(self, ctx):
+        params = ctx.params
+        if not (params.get('profiles') or params.get('all_profiles')):
+            return super().invoke(ctx)
+        if params.get('profile'):
+            ctx.fail('--profile cannot be combined with --profiles/--all-profiles')
+
+        protected = getattr(ctx, '_protected_args', None)
+        if protected is None:
+            protected = ctx.protected_args
+        args = [*protected, *ctx.args]
+        if not args:
+            ctx.fail('Missing command.')
+
+        inherited = ctx.obj or {}
+        config_path = params['config_path']
+        cfg = load_profiles(config_path)
+        # One trace file and one set of metrics for all profiles
+        hooks = instrument(ctx, params['trace_path'], params['metrics'], params['metrics_file'])
+        if params.get('all_profiles'):
+            profiles = list(cfg)
+        else:
+            profiles = [p.strip() for p in params['profiles'].split(',') if p.strip()]
+            unknown = [p for p in profiles if p not in cfg]
+            if unknown:
+                ctx.fail(f"Unknown profile(s) in {config_path}: {', '.join(unknown)}")
+
+        def run(profile):
+            # "{profile}" in arguments stands for the current profile, e.g. a bucket name
+            argv = ['--profile', profile, '--config', config_path,
+                    *[a.replace('{profile}', profile) for a in args]]
+            return self.run_isolated(argv, ctx.info_name, obj={**inherited, 'hooks': hooks})
+
+        from s3manager.fanout import run_per_profile
+        statuses = run_per_profile(run, profiles, params['max_parallel'])
+        failed = [p for p, status in statuses.items() if status]
+        click.echo(f"{len(profiles) - len(failed)}/{len(profiles)} profiles succeeded"
+                   + (f", failed: {', '.join(failed)}" if failed else ''))
+        ctx.exit(1 if failed else 0)
+
+    def run_isolated(self, argv: list, prog_name: str = None, obj: dict = None) -> int:
+        """
+        Run one full CLI invocation in-process and return its exit status.
+        obj['hooks'], if given, replaces the hooks of the --trace/--metrics options;
+        obj['sessions'] (a SessionCache) keeps profile contexts between runs.
+        """
+        try:
+            self.main(args=argv, prog_name=prog_name, standalone_mode=False, obj=obj or {})
+            return 0
+        except SystemExit as e:
+            code = e.code
+            return code if isinstance(code, int) else (0 if code is None else 1)
+        except click.exceptions.Exit as e:
+            return e.exit_code
+        except click.ClickException as e:
+            e.show()
+            return e.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            return 1
+        except Exception as e:
+            click.echo(f"Error: {e}", err=True)
+            return 1
+
+
+@click.group(cls=FanOutGroup, context_settings=dict(help_option_names=['--help']))
+@click.option('--profile', help='Profile name from .config.yaml')
+@click.option('--profiles', default=None,
+              help='Comma-separated profiles to run the command for, concurrently')
+@click.option('--all-profiles', is_flag=True,
+              help='Run the command for every profile of the configuration file')
+@click.option('--max-parallel', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Profiles processed at the same time with --profiles/--all-profiles')
+@click.option('--config', 'config_path', default='.config.yaml',
+              help='Path to configuration file')
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False), default=None,
+              help='Append one JSON line per S3 request to this file')
+@click.option('--metrics', is_flag=True,
+              help='Print request counts and latencies to stderr at exit')
+@click.option('--metrics-file', type=click.Path(dir_okay=False), default=None,
+              help='Write request metrics to this Prometheus textfile at exit')
+@click.pass_context
+def cli(ctx, profile, profiles, all_profiles, max_parallel, config_path,
+        trace_path, metrics, metrics_file):
+    """CLI tool for managing Dell EMC ECS S3 resources."""
+    inherited = ctx.obj or {}
+    if ctx.invoked_subcommand == 'serve':
+        # Hooks of the server apply to every command it runs
+        ctx.obj = {'hooks': instrument(ctx, trace_path, metrics, metrics_file)}
+        return
+    if not profile:
+        raise click.UsageError("Missing option '--profile' (or --profiles/--all-profiles)")
+
+    cfg = load_profiles(config_path)
     if profile not in cfg:
         click.echo(f"Profile '{profile}' not found in {config_path}", err=True)
         sys.exit(1)
@@ -33,50 +210,153 @@ def cli(ctx, profile, config_path):
             click.echo(f"Missing '{key}' in config for profile '{profile}'", err=True)
             sys.exit(1)
 
-    auth = Authenticator(
-        endpoint=conf['endpoint'],
-        access_key=conf['access_key'],
-        secret_key=conf['secret_key'],
-        namespace=conf['namespace'],
-        region=conf['region'],
-        method=conf.get('auth_method', 'v2')
-    )
+    hooks = inherited.get('hooks')
+    if hooks is None:
+        hooks = instrument(ctx, trace_path, metrics, metrics_file)
+    sessions = inherited.get('sessions')
+    if sessions is None:
+        ctx.obj = ProfileContext(profile, conf, hooks)
+    else:
+        ctx.obj = sessions.get(
+            (os.path.realpath(config_path), profile), conf,
+            lambda: ProfileContext(profile, conf, hooks, inherited.get('lifecycle_cache_ttl'))
+        )
 
-    ctx.obj = {
-        'profile': profile,
-        'conf': conf,
-        'auth': auth,
-        'bucket_mgr': BucketManager(auth),
-        'lifecycle_mgr': LifecycleManager(auth)
-    }
+
+class ProfileContext(dict):
+    """
+    ctx.obj of a profile run: 'profile' and 'conf', then 'auth' and the
+    managers, which are built (and their modules imported) on first access.
+    `s3cli serve` keeps one per profile and shares it between commands.
+    """
+
+    def __init__(self, profile: str, conf: dict, hooks: list = (), lifecycle_cache_ttl: float = None):
+        super().__init__(profile=profile, conf=conf)
+        self._hooks = hooks
+        self._lifecycle_cache_ttl = lifecycle_cache_ttl
+        self._lock = threading.RLock()
+
+    def __missing__(self, key):
+        factory = getattr(self, f"_make_{key}", None)
+        if factory is None:
+            raise KeyError(key)
+        with self._lock:
+            if key not in self:
+                self[key] = factory()
+            return dict.__getitem__(self, key)
+
+    def _make_auth(self):
+        from s3manager.auth import Authenticator
+        from s3manager.endpoints import EndpointPool, endpoint_list
+        from s3manager.metrics import for_profile
+        from s3manager.retry import AIMDLimiter, RetryPolicy
+        from s3manager.transport import Transport
+        conf = self['conf']
+        auth = Authenticator(
+            endpoint=endpoint_list(conf)[0],
+            access_key=conf['access_key'],
+            secret_key=conf['secret_key'],
+            namespace=conf['namespace'],
+            region=conf['region'],
+            method=conf.get('auth_method', 'v2'),
+            transport=Transport.from_config(conf),
+            unsigned_payload=bool(conf.get('unsigned_payload', False)),
+            retry=RetryPolicy.from_config(conf),
+            limiter=AIMDLimiter.from_config(conf),
+            endpoints=EndpointPool.from_config(conf)
+        )
+        for hook in self._hooks:
+            auth.add_hook(for_profile(hook, self['profile']))
+        return auth
+
+    def _make_bucket_mgr(self):
+        from s3manager.bucket import BucketManager
+        return BucketManager(self['auth'])
+
+    def _make_lifecycle_mgr(self):
+        from s3manager.lifecycle import LifecycleManager
+        return LifecycleManager(self['auth'], cache_ttl=self._lifecycle_cache_ttl)
+
+    def _make_object_mgr(self):
+        from s3manager.objects import ObjectManager
+        return ObjectManager(self['auth'])
+
+
+def open_index(ctx, bucket_name: str, create: bool = False):
+    """ObjectIndex of a bucket for the current profile, exits if it was never built."""
+    from s3manager.index import ObjectIndex, index_path
+    path = index_path(ctx.obj['conf'], bucket_name)
+    try:
+        index = ObjectIndex(path, create=create)
+    except FileNotFoundError:
+        click.echo(f"No index for {bucket_name}, run: s3cli index build {bucket_name}", err=True)
+        sys.exit(1)
+    ctx.call_on_close(index.close)
+    return index
 
 
 @cli.command('create-prefixes')
+@click.option('--concurrency', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Number of placeholder PUTs in flight')
 @click.pass_context
-def create_prefixes_cmd(ctx):
+def create_prefixes_cmd(ctx, concurrency):
     """Create placeholder objects for prefixes defined in config."""
-    auth = ctx.obj['auth']
+    from s3manager.concurrency import map_ordered
+    bm = ctx.obj['bucket_mgr']
     bucket = ctx.obj['profile']
     prefixes = ctx.obj['conf'].get('prefix_list', [])
+    ctx.obj['auth'].transport.reserve(concurrency)
 
-    for prefix in prefixes:
+    failures = []
+    results = map_ordered(lambda p: bm.create_prefix(bucket, p), prefixes, concurrency)
+    for prefix, _, err in results:
         key = f"{prefix}/"
-        headers, url = auth.sign('PUT', bucket=bucket,
-                                 subresource=f"/{key}")
-        resp = requests.put(url, headers=headers,
-                            data=b'', verify=False)
-        resp.raise_for_status()
-        click.echo(f"Created placeholder: {key}")
+        if err is not None:
+            failures.append((key, err))
+            click.echo(f"Failed placeholder: {key}", err=True)
+        else:
+            click.echo(f"Created placeholder: {key}")
+
+    if failures:
+        click.echo(f"{len(failures)} of {len(prefixes)} placeholders failed:", err=True)
+        for key, err in failures:
+            click.echo(f"  {key}: {err}", err=True)
+        sys.exit(1)
 
 
 @cli.command('list-objects')
 @click.argument('bucket_name')
 @click.option('--prefix', default='', help='Filter prefix')
+@click.option('--parallel', default=0, type=click.IntRange(min=0),
+              help='List partitions concurrently with N workers')
+@click.option('--partitions', type=click.Choice(['discover', 'profile']), default='discover',
+              show_default=True,
+              help='With --parallel: discover partitions with delimiter "/" '
+                   'or use the profile prefix_list')
+@click.option('--unordered', is_flag=True,
+              help='With --parallel: print keys as partitions complete instead of in key order')
+@click.option('--index', 'use_index', is_flag=True,
+              help='Answer from the local index (see `index build`) instead of listing the bucket')
 @click.pass_context
-def list_objects_cmd(ctx, bucket_name, prefix):
+def list_objects_cmd(ctx, bucket_name, prefix, parallel, partitions, unordered, use_index):
     """List objects in a bucket, optionally filtered by prefix."""
+    if use_index:
+        for obj in open_index(ctx, bucket_name).list_objects(prefix):
+            click.echo(obj.key)
+        return
     bm = ctx.obj['bucket_mgr']
-    objects = bm.list_objects(bucket_name, prefix=prefix)
+    if parallel:
+        parts = None
+        if partitions == 'profile':
+            parts = [f"{p}/" for p in ctx.obj['conf'].get('prefix_list', [])
+                     if f"{p}/".startswith(prefix)]
+        ctx.obj['auth'].transport.reserve(parallel)
+        objects = bm.list_objects_parallel(
+            bucket_name, prefix=prefix, partitions=parts,
+            workers=parallel, ordered=not unordered
+        )
+    else:
+        objects = bm.list_objects(bucket_name, prefix=prefix)
 
     for obj in objects:
         key = getattr(obj, 'key', obj)
@@ -89,25 +369,498 @@ def list_objects_cmd(ctx, bucket_name, prefix):
 def batch_lifecycle_cmd(ctx, years):
     """
     Apply lifecycle rules for each prefix with expiration offset by years.
+    The rules replace the lifecycle-* rules of the bucket, rules with other
+    IDs are kept; the configuration is written in a single request.
     """
+    from s3manager.lifecycle import MAX_LIFECYCLE_RULES, date_rules_for_prefixes
     lm = ctx.obj['lifecycle_mgr']
     bucket = ctx.obj['profile']
     prefixes = ctx.obj['conf'].get('prefix_list', [])
+    max_rules = int(ctx.obj['conf'].get('max_lifecycle_rules', MAX_LIFECYCLE_RULES))
+
+    rules = date_rules_for_prefixes(prefixes, years)
+    if not rules:
+        click.echo('No prefixes defined in profile')
+        return
+
+    try:
+        with lm.transaction(bucket) as tx:
+            for rule_id in tx.rule_ids():
+                if rule_id.startswith('lifecycle-'):
+                    tx.remove_rule(rule_id)
+            for rule in rules:
+                tx.add(rule)
+            if len(tx.config) > max_rules:
+                raise ValueError(f"{len(tx.config)} rules exceed the limit of {max_rules} rules per bucket")
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    for rule in rules:
+        click.echo(f"Applied rule {rule.id} expires on {rule.date}")
+    kept = len(tx.config) - len(rules)
+    click.echo(f"Applied {len(rules)} rules in one request"
+               + (f", kept {kept} other rule{'s' if kept > 1 else ''}" if kept else ''))
+
+
+@cli.command('sync')
+@click.argument('source')
+@click.argument('dest')
+@click.option('--concurrency', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Number of files transferred in parallel')
+@click.option('--dry-run', is_flag=True, help='Print what would be transferred')
+@click.pass_context
+def sync_cmd(ctx, source, dest, concurrency, dry_run):
+    """
+    Transfer the files that differ between a local directory and a bucket prefix.
+
+    \b
+    s3cli sync <local-dir> <bucket>[/<prefix>]   upload
+    s3cli sync <bucket>[/<prefix>] <local-dir>   download
+    An argument starting with s3:// is the bucket side; otherwise the
+    direction is an upload when SOURCE is an existing directory.
+    """
+    from s3manager.sync import DirectorySync, HashCache
+    if dest.startswith('s3://') or (not source.startswith('s3://') and os.path.isdir(source)):
+        local_dir, remote, push = source, dest, True
+    else:
+        local_dir, remote, push = dest, source, False
+    bucket_name, _, prefix = remote[5:].partition('/') if remote.startswith('s3://') else remote.partition('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+
+    cache = HashCache()
+    ctx.call_on_close(cache.close)
+    syncer = DirectorySync(ctx.obj['object_mgr'], cache)
+    verb = ('Would upload' if dry_run else 'Uploaded') if push else ('Would download' if dry_run else 'Downloaded')
+
+    def progress(rel, reason, err):
+        if err is not None:
+            click.echo(f"Failed {rel}: {err}", err=True)
+        else:
+            click.echo(f"{verb} {rel} ({reason})")
+
+    if push:
+        res = syncer.push(local_dir, bucket_name, prefix, workers=concurrency, dry_run=dry_run, progress=progress)
+    else:
+        res = syncer.pull(bucket_name, prefix, local_dir, workers=concurrency, dry_run=dry_run, progress=progress)
+    count = res['pending'] if dry_run else res['transferred']
+    click.echo(f"{verb} {count} files" + ('' if dry_run else f" ({res['bytes']} bytes)")
+               + f", {res['unchanged']} unchanged")
+    if res['errors']:
+        click.echo(f"{len(res['errors'])} transfers failed", err=True)
+        sys.exit(1)
+
+
+@cli.command('presign')
+@click.argument('bucket_name')
+@click.option('--prefix', default='', help='Only sign keys under this prefix')
+@click.option('--expires', default=3600, show_default=True, type=click.IntRange(min=1),
+              help='URL validity in seconds')
+@click.option('--method', default='GET', show_default=True,
+              type=click.Choice(['GET', 'PUT', 'HEAD', 'DELETE']), help='HTTP method of the URLs')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='Write JSON lines to this file instead of stdout')
+@click.pass_context
+def presign_cmd(ctx, bucket_name, prefix, expires, method, output):
+    """Write pre-signed URLs for every object under a prefix as JSON lines."""
+    import json
+    from s3manager.presign import Presigner
+    bm = ctx.obj['bucket_mgr']
+    try:
+        signer = Presigner(ctx.obj['auth'], bucket_name, expires=expires, method=method)
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    expires_at = signer.expires_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    for obj in bm.list_objects(bucket_name, prefix=prefix):
+        if obj.key.endswith('/') and not obj.size:
+            continue  # prefix placeholder
+        output.write(json.dumps({
+            'key': obj.key, 'url': signer.url(obj.key), 'expires': expires_at
+        }) + '\n')
+
+
+@cli.group('bucket')
+@click.pass_context
+def bucket_grp(ctx):
+    """Bucket management commands."""
+    pass
+
+
+@bucket_grp.command('usage')
+@click.argument('bucket_name')
+@click.option('--prefix', default='', help='Only count keys under this prefix')
+@click.option('--versions', is_flag=True, help='Also count noncurrent versions and delete markers')
+@click.option('--concurrency', default=8, show_default=True, type=click.IntRange(min=1),
+              help='Key ranges listed at the same time')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None,
+              help='Progress file of the scan [default: .s3cli-usage-<profile>-<bucket>.json]')
+@click.option('--restart', is_flag=True, help='Ignore the progress of an interrupted scan')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+@click.pass_context
+def bucket_usage_cmd(ctx, bucket_name, prefix, versions, concurrency, checkpoint, restart, as_json):
+    """
+    Count objects and bytes by prefix, age and version state from the
+    bucket listing. An interrupted scan resumes from its checkpoint.
+    """
+    import json
+    from s3manager.usage import UsageScanner, format_bytes
+    checkpoint = checkpoint or f".s3cli-usage-{ctx.obj['profile']}-{bucket_name}.json"
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    elif os.path.exists(checkpoint):
+        click.echo(f"Resuming the scan saved in {checkpoint}", err=True)
 
-    for prefix in prefixes:
-        month, year = prefix.split('-')
-        base = datetime.date(int(year), int(month), 1)
-        expire = base + relativedelta(years=years)
-        date_str = expire.strftime('%Y-%m-%dT00:00:00Z')
-        rule_id = f"lifecycle-{prefix}"
-        xml_body = build_lifecycle_with_date(
-            rule_id, prefix+'/', date_str
+    def progress(objects, done, ranges):
+        click.echo(f"Scanned {objects} objects, {done}/{ranges} key ranges done", err=True)
+
+    def saved():
+        # Checkpoints are replaced by a new file on every save
+        st = os.stat(checkpoint) if os.path.exists(checkpoint) else None
+        return st and (st.st_ino, st.st_mtime_ns)
+
+    before = saved()
+    ctx.obj['auth'].transport.reserve(concurrency)
+    try:
+        report = UsageScanner(ctx.obj['auth']).scan(
+            bucket_name, prefix=prefix, versions=versions,
+            known_prefixes=ctx.obj['conf'].get('prefix_list', []),
+            workers=concurrency, checkpoint=checkpoint, progress=progress
         )
-        res = lm.apply_lifecycle_with_xml(bucket, xml_body)
-        click.echo(
-            f"Applied rule {rule_id} expires on {date_str},"
-            f" status={res.status_code}"
+    except (Exception, KeyboardInterrupt) as e:
+        if saved() not in (None, before):
+            click.echo(f"Scan interrupted, progress saved to {checkpoint}", err=True)
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        click.echo(f"Scan failed: {e}", err=True)
+        sys.exit(1)
+
+    if as_json:
+        click.echo(json.dumps(report.to_dict(), indent=2))
+        return
+
+    def line(label, count, size):
+        click.echo(f"  {label:<24} {count:>12} {format_bytes(size):>12}")
+
+    count, size = report.totals()
+    click.echo(f"{bucket_name}/{prefix}: {count} objects, {format_bytes(size)}")
+    for title, field in (('By prefix', 'prefix'), ('By age', 'age'), ('By state', 'state')):
+        if field == 'state' and not versions:
+            continue
+        click.echo(f"{title}:")
+        for label, (c, s) in report.by(field).items():
+            line(label, c, s)
+    if versions:
+        click.echo('Noncurrent versions by prefix:')
+        for label, states in report.by_prefix_state().items():
+            if 'noncurrent' in states:
+                line(label, *states['noncurrent'])
+
+
+def parse_tags(ctx, param, values) -> dict:
+    """Click callback turning repeated KEY=VALUE options into a dict."""
+    tags = {}
+    for value in values:
+        key, sep, val = value.partition('=')
+        if not sep or not key:
+            raise click.BadParameter(f"expected KEY=VALUE, got '{value}'")
+        tags[key] = val
+    return tags
+
+
+@bucket_grp.command('tag')
+@click.argument('bucket_name')
+@click.option('--tag', 'tags', multiple=True, callback=parse_tags,
+              help='Tag KEY=VALUE to set (repeatable), prints the tags when omitted')
+@click.option('--replace', is_flag=True, help='Replace the tag set instead of merging into it')
+@click.pass_context
+def bucket_tag_cmd(ctx, bucket_name, tags, replace):
+    """Show or set the tags of a bucket."""
+    bm = ctx.obj['bucket_mgr']
+    if not tags and not replace:
+        current = bm.get_bucket_tagging(bucket_name)
+        if not current:
+            click.echo(f"{bucket_name}: no tags")
+        for key, value in current.items():
+            click.echo(f"{key}={value}")
+        return
+    try:
+        res = bm.tag_bucket(bucket_name, tags, replace=replace)
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    state = 'updated' if res['changed'] else 'unchanged'
+    click.echo(f"{bucket_name}: tags {state}: " + ', '.join(f"{k}={v}" for k, v in res['tags'].items()))
+
+
+@cli.group('object')
+@click.pass_context
+def object_grp(ctx):
+    """Object transfer commands."""
+    pass
+
+
+@object_grp.command('put')
+@click.argument('bucket_name')
+@click.argument('file_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--key', default=None, help='Object key (defaults to the file name)')
+@click.option('--concurrency', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Number of parts uploaded in parallel')
+@click.option('--part-size', type=click.IntRange(min=5), default=None,
+              help='Part size in MiB (adaptive by default)')
+@click.pass_context
+def object_put_cmd(ctx, bucket_name, file_path, key, concurrency, part_size):
+    """Upload a file, using a parallel multipart upload for large files."""
+    from s3manager.objects import MiB
+    om = ctx.obj['object_mgr']
+    key = key or os.path.basename(file_path)
+
+    def progress(number, count, nbytes):
+        click.echo(f"Uploaded part {number}/{count} ({nbytes} bytes)")
+
+    res = om.upload_file(
+        bucket_name, key, file_path,
+        part_size=part_size * MiB if part_size else None,
+        workers=concurrency, progress=progress
+    )
+    click.echo(f"Uploaded {file_path} to {bucket_name}/{key}, etag={res['etag']}")
+
+
+@object_grp.command('get')
+@click.argument('bucket_name')
+@click.argument('key')
+@click.argument('dest', required=False, type=click.Path(dir_okay=False))
+@click.option('--concurrency', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Number of ranges downloaded in parallel')
+@click.option('--part-size', type=click.IntRange(min=5), default=None,
+              help='Range size in MiB (adaptive by default)')
+@click.option('--no-resume', is_flag=True, help='Ignore a previous partial download')
+@click.pass_context
+def object_get_cmd(ctx, bucket_name, key, dest, concurrency, part_size, no_resume):
+    """Download an object with parallel ranged GETs (resumable)."""
+    from s3manager.objects import MiB
+    om = ctx.obj['object_mgr']
+    dest = dest or os.path.basename(key)
+
+    def progress(number, count, nbytes):
+        click.echo(f"Downloaded range {number}/{count} ({nbytes} bytes)")
+
+    res = om.download_file(
+        bucket_name, key, dest,
+        part_size=part_size * MiB if part_size else None,
+        workers=concurrency, resume=not no_resume, progress=progress
+    )
+    if res.get('resumed'):
+        click.echo(f"Resumed: {res['resumed']} ranges were already present")
+    click.echo(f"Downloaded {bucket_name}/{key} to {dest}, etag={res['etag']}")
+
+
+@object_grp.command('tag')
+@click.argument('bucket_name')
+@click.option('--prefix', default='', help='Only tag keys under this prefix')
+@click.option('--tag', 'tags', multiple=True, required=True, callback=parse_tags,
+              help='Tag KEY=VALUE to set (repeatable)')
+@click.option('--replace', is_flag=True, help='Replace the tag set of each object instead of merging')
+@click.option('--concurrency', default=16, show_default=True, type=click.IntRange(min=1),
+              help='Number of objects tagged in parallel')
+@click.pass_context
+def object_tag_cmd(ctx, bucket_name, prefix, tags, replace, concurrency):
+    """
+    Tag every object under a prefix, e.g. to drive tag-filtered lifecycle
+    rules. Objects that already carry the tags are left alone.
+    """
+    om = ctx.obj['object_mgr']
+    totals = {'objects': 0}
+
+    def progress(key, changed, err):
+        totals['objects'] += 1
+        if totals['objects'] % 1000 == 0:
+            click.echo(f"Processed {totals['objects']} objects")
+
+    res = om.tag_prefix(bucket_name, prefix, tags, replace=replace, workers=concurrency, progress=progress)
+    click.echo(f"Tagged {res['tagged']} objects under {bucket_name}/{prefix}, "
+               f"{res['skipped']} already tagged")
+    if res['errors']:
+        click.echo(f"{len(res['errors'])} objects failed:", err=True)
+        for e in res['errors']:
+            click.echo(f"  {e['key']}: {e['message']}", err=True)
+        sys.exit(1)
+
+
+@cli.group('prefix')
+@click.pass_context
+def prefix_grp(ctx):
+    """Bulk operations on every object under a prefix."""
+    pass
+
+
+@prefix_grp.command('purge')
+@click.argument('bucket_name')
+@click.argument('prefix')
+@click.option('--all-versions/--current-only', default=None,
+              help='Also delete versions and delete markers (default: when versioning is on)')
+@click.option('--keep-placeholder', is_flag=True, help='Keep the "prefix/" placeholder object')
+@click.option('--concurrency', default=4, show_default=True, type=click.IntRange(min=1),
+              help='Number of delete batches in flight')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+@click.pass_context
+def prefix_purge_cmd(ctx, bucket_name, prefix, all_versions, keep_placeholder, concurrency, yes):
+    """Delete every object under a prefix with Multi-Object Delete."""
+    bm = ctx.obj['bucket_mgr']
+    om = ctx.obj['object_mgr']
+
+    if all_versions is None:
+        all_versions = bm.get_versioning(bucket_name) in ('Enabled', 'Suspended')
+    scope = 'all versions of ' if all_versions else ''
+    if not yes:
+        click.confirm(f"Delete {scope}every object under {bucket_name}/{prefix}?", abort=True)
+
+    totals = {'deleted': 0}
+
+    def progress(deleted, failed):
+        totals['deleted'] += deleted
+        click.echo(f"Deleted {deleted} objects ({failed} failed), total {totals['deleted']}")
+
+    keep = f"{prefix.rstrip('/')}/" if keep_placeholder else None
+    res = om.purge_prefix(bucket_name, prefix, versions=all_versions,
+                          workers=concurrency, keep=keep, progress=progress)
+    click.echo(f"Purged {res['deleted']} objects from {bucket_name}/{prefix}")
+
+    if res['errors']:
+        click.echo(f"{len(res['errors'])} deletions failed:", err=True)
+        for e in res['errors']:
+            version = f" (version {e['version_id']})" if e.get('version_id') else ''
+            click.echo(f"  {e['key']}{version}: {e['code']} {e['message']}", err=True)
+        sys.exit(1)
+
+
+@prefix_grp.command('copy')
+@click.argument('source_bucket')
+@click.argument('prefix')
+@click.argument('dest_bucket')
+@click.option('--dest-prefix', default=None, help='Replace PREFIX with this prefix in the copied keys')
+@click.option('--dest-profile', default=None,
+              help='Profile of the destination (endpoint, namespace, credentials), default: --profile')
+@click.option('--concurrency', default=8, show_default=True, type=click.IntRange(min=1),
+              help='Number of objects copied in parallel')
+@click.option('--part-size', type=click.IntRange(min=5), default=None,
+              help='Part size in MiB for large objects (adaptive by default)')
+@click.option('--delete-source', is_flag=True, help='Delete each source key once it is copied')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation')
+@click.pass_context
+def prefix_copy_cmd(ctx, source_bucket, prefix, dest_bucket, dest_prefix, dest_profile,
+                    concurrency, part_size, delete_source, yes):
+    """
+    Copy every object under a prefix to another bucket.
+
+    Within one endpoint and namespace the copy is server-side (CopyObject,
+    UploadPartCopy for large objects); with a --dest-profile in another
+    namespace or endpoint the objects are relayed through this process.
+    """
+    from s3manager.objects import MiB
+    source = ctx.obj['object_mgr']
+    om = source
+    if dest_profile and dest_profile != ctx.obj['profile']:
+        cfg = load_profiles(ctx.find_root().params['config_path'])
+        if dest_profile not in cfg:
+            click.echo(f"Profile '{dest_profile}' not found", err=True)
+            sys.exit(1)
+        om = ProfileContext(dest_profile, cfg[dest_profile], ctx.obj._hooks)['object_mgr']
+    if delete_source and not yes:
+        click.confirm(f"Delete every object under {source_bucket}/{prefix} once copied?", abort=True)
+
+    totals = {'objects': 0}
+
+    def progress(key, size, err):
+        totals['objects'] += 1
+        if totals['objects'] % 1000 == 0:
+            click.echo(f"Processed {totals['objects']} objects")
+
+    try:
+        res = om.copy_prefix(
+            source_bucket, prefix, dest_bucket, dest_prefix=dest_prefix, source=source,
+            workers=concurrency, part_size=part_size * MiB if part_size else None,
+            delete_source=delete_source, progress=progress
         )
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    mode = 'server-side' if res['server_side'] else 'relayed'
+    click.echo(f"Copied {res['copied']} objects ({res['bytes']} bytes, {mode}) "
+               f"from {source_bucket}/{prefix} to {dest_bucket}/{prefix if dest_prefix is None else dest_prefix}")
+    if delete_source:
+        click.echo(f"Deleted {res['deleted']} source objects")
+    if res['errors']:
+        click.echo(f"{len(res['errors'])} operations failed:", err=True)
+        for e in res['errors']:
+            click.echo(f"  {e['key']}: {e['code']} {e['message']}", err=True)
+        sys.exit(1)
+
+
+@cli.group('index')
+@click.pass_context
+def index_grp(ctx):
+    """Local SQLite index of bucket listings."""
+    pass
+
+
+def echo_refresh(bucket_name: str, res: dict):
+    click.echo(f"{bucket_name}: {res['listed']} folders listed, {res['checked']} checked for new keys, "
+               f"{res['removed']} removed, {res['added']} keys added, {res['objects']} indexed")
+
+
+@index_grp.command('build')
+@click.argument('bucket_name')
+@click.option('--concurrency', default=8, show_default=True, type=click.IntRange(min=1),
+              help='Folders listed at the same time')
+@click.pass_context
+def index_build_cmd(ctx, bucket_name, concurrency):
+    """Fill the index of a bucket from a full listing."""
+    ctx.obj['auth'].transport.reserve(concurrency)
+    index = open_index(ctx, bucket_name, create=True)
+    echo_refresh(bucket_name, index.build(ctx.obj['bucket_mgr'], bucket_name, workers=concurrency))
+
+
+@index_grp.command('refresh')
+@click.argument('bucket_name')
+@click.option('--prefix', 'prefixes', multiple=True,
+              help='Only refresh the folders matching this prefix, listing them in full (repeatable)')
+@click.option('--max-age', type=click.FloatRange(min=0), default=None,
+              help='List in full the folders not fully listed for this many hours')
+@click.option('--concurrency', default=8, show_default=True, type=click.IntRange(min=1),
+              help='Folders listed at the same time')
+@click.pass_context
+def index_refresh_cmd(ctx, bucket_name, prefixes, max_age, concurrency):
+    """
+    Update the index: new folders are listed in full, known folders only
+    after the last key seen, vanished folders are dropped.
+    """
+    ctx.obj['auth'].transport.reserve(concurrency)
+    index = open_index(ctx, bucket_name)
+    res = index.refresh(
+        ctx.obj['bucket_mgr'], bucket_name, prefixes=list(prefixes) or None,
+        max_age=max_age * 3600 if max_age is not None else None, workers=concurrency
+    )
+    echo_refresh(bucket_name, res)
+
+
+@index_grp.command('query')
+@click.argument('bucket_name')
+@click.option('--prefix', default='', help='Only keys under this prefix')
+@click.option('--older-than', type=click.FloatRange(min=0), default=None,
+              help='Only keys last modified more than this many days ago')
+@click.option('--summary', is_flag=True, help='Print the number of keys and their size only')
+@click.pass_context
+def index_query_cmd(ctx, bucket_name, prefix, older_than, summary):
+    """Query the index of a bucket, no request is sent."""
+    index = open_index(ctx, bucket_name)
+    if summary:
+        res = index.summary(prefix, older_than=older_than)
+        click.echo(f"{res['objects']} objects, {res['bytes']} bytes")
+        return
+    for obj in index.list_objects(prefix, older_than=older_than):
+        click.echo(f"{obj.last_modified}  {obj.size:>12}  {obj.key}")
 
 
 @cli.group()
@@ -120,98 +873,124 @@ def lifecycle(ctx):
 @lifecycle.command('populate-lifecycles')
 @click.argument('bucket_name')
 @click.argument('years', type=int)
+@click.option('--use-index', is_flag=True,
+              help='Check whether the oldest prefix is empty in the local index')
 @click.pass_context
-def lifecycle_populate_cmd(ctx, bucket_name, years):
+def lifecycle_populate_cmd(ctx, bucket_name, years, use_index):
     """
     Monthly maintenance: remove oldest lifecycle rule and placeholder
     then add new rule and placeholder for next month.
+    Rule changes are written back in a single lifecycle PUT.
     """
+    from s3manager.lifecycle import expiration_date_for_prefix
     lm = ctx.obj['lifecycle_mgr']
     bm = ctx.obj['bucket_mgr']
-    auth = ctx.obj['auth']
 
-    rules = [rid for rid in lm.list_rules(bucket_name)
-             if rid.startswith('lifecycle-')]
-
-    parsed = []
-    for rid in rules:
-        prefix_part = rid.split('-', 1)[1]
-        try:
-            m, y = map(int, prefix_part.split('-'))
-            parsed.append((datetime.date(y, m, 1), rid, prefix_part))
-        except ValueError:
-            continue
-
-    if not parsed:
+    # Rules are indexed by the MM-YYYY date of their prefix
+    config = lm.get_config(bucket_name)
+    oldest, latest = config.oldest('lifecycle-'), config.newest('lifecycle-')
+    if oldest is None:
         click.echo('No lifecycle rules to populate')
         return
 
-    parsed.sort(key=lambda x: x[0])
-    oldest_date, old_rule, old_prefix = parsed[0]
+    old_rule = oldest.id
+    old_year, old_month = oldest.date_key
+    old_prefix = f"{old_month:02d}-{old_year}"
 
-    objs = bm.list_objects(bucket_name,
-                           prefix=f"{old_prefix}/")
-    if not objs:
-        if len(parsed) > 1:
-            lm.remove_rule(bucket_name, old_rule)
-        else:
-            headers, url = auth.sign(
-                'DELETE', bucket=bucket_name,
-                subresource='?lifecycle'
-            )
-            requests.delete(url, headers=headers,
-                            verify=False).raise_for_status()
-
-        headers, url = auth.sign(
-            'DELETE', bucket=bucket_name,
-            subresource=f"/{old_prefix}/"
-        )
-        requests.delete(url, headers=headers,
-                        verify=False).raise_for_status()
-        click.echo(f"Removed rule {old_rule} and placeholder {old_prefix}/")
+    if use_index:
+        old_empty = not open_index(ctx, bucket_name).exists_any(f"{old_prefix}/")
+    else:
+        old_empty = not bm.exists_any(bucket_name, f"{old_prefix}/")
 
-    latest_date, _, latest_prefix = parsed[-1]
-    next_month = latest_date.month % 12 + 1
-    next_year = latest_date.year + (1 if
-                                     latest_date.month == 12 else 0)
+    latest_year, latest_month = latest.date_key
+    next_month = latest_month % 12 + 1
+    next_year = latest_year + (1 if latest_month == 12 else 0)
     new_prefix = f"{next_month:02d}-{next_year}"
 
-    base_date = datetime.date(next_year, next_month, 1)
-    new_expire = base_date + relativedelta(years=years)
-    new_date_str = new_expire.strftime('%Y-%m-%dT00:00:00Z')
+    new_date_str = expiration_date_for_prefix(new_prefix, years)
     new_rule_id = f"lifecycle-{new_prefix}"
-    new_xml = build_lifecycle_with_date(
-        new_rule_id, new_prefix+'/', new_date_str
-    )
-    lm.apply_lifecycle_with_xml(bucket_name, new_xml)
 
-    headers, url = auth.sign(
-        'PUT', bucket=bucket_name,
-        subresource=f"/{new_prefix}/"
-    )
-    requests.put(url, headers=headers,
-                 data=b'', verify=False)
+    with lm.transaction(bucket_name) as tx:
+        if old_empty:
+            tx.remove_rule(old_rule)
+        tx.add_date_rule(new_rule_id, new_prefix + '/', new_date_str)
+
+    if old_empty:
+        bm.delete_prefix(bucket_name, old_prefix)
+        click.echo(f"Removed rule {old_rule} and placeholder {old_prefix}/")
+
+    bm.create_prefix(bucket_name, new_prefix)
     click.echo(f"Created rule {new_rule_id} & placeholder {new_prefix}/")
 
 
+@lifecycle.command('sync')
+@click.argument('years', type=int, required=False)
+@click.option('--dry-run', is_flag=True, help='Print the plan without changing the bucket')
+@click.option('--keep-extra', is_flag=True,
+              help='Keep lifecycle-* rules whose prefix is not in prefix_list')
+@click.pass_context
+def lifecycle_sync_cmd(ctx, years, dry_run, keep_extra):
+    """
+    Make the lifecycle-* rules of the profile bucket match prefix_list.
+
+    Each prefix MM-YYYY gets a rule expiring it YEARS (default: the profile
+    retention_years) after its month. Rules are compared by canonical
+    content and the bucket is only written when they differ. Rules with
+    other IDs are kept. Use --all-profiles to sync every bucket concurrently.
+    """
+    from s3manager.lifecycle import MAX_LIFECYCLE_RULES, date_rules_for_prefixes
+    conf = ctx.obj['conf']
+    bucket = ctx.obj['profile']
+    if years is None:
+        years = conf.get('retention_years')
+        if years is None:
+            raise click.UsageError('Missing YEARS argument (or retention_years in the profile)')
+    lm = ctx.obj['lifecycle_mgr']
+    plan = lm.plan_sync(bucket, date_rules_for_prefixes(conf.get('prefix_list', []), int(years)))
+    if keep_extra:
+        plan['remove'] = []
+
+    counts = {kind: len(plan[kind]) for kind in ('add', 'change', 'remove', 'unchanged')}
+    if not (counts['add'] or counts['change'] or counts['remove']):
+        click.echo(f"{bucket}: up to date ({counts['unchanged']} rules)")
+        return
+    click.echo(f"{bucket}: {counts['add']} to add, {counts['change']} to change, "
+               f"{counts['remove']} to remove, {counts['unchanged']} unchanged")
+    for rule in plan['add']:
+        click.echo(f"  + {rule.id}  {rule.prefix}  expires {rule.date}")
+    for rule, was in plan['change']:
+        old = f"{was.prefix} {was.date}" if was.prefix != rule.prefix else was.date
+        click.echo(f"  ~ {rule.id}  {rule.prefix}  expires {old} -> {rule.date}")
+    for rule in plan['remove']:
+        click.echo(f"  - {rule.id}  {rule.prefix}  expires {rule.date}")
+    if dry_run:
+        return
+
+    max_rules = int(conf.get('max_lifecycle_rules', MAX_LIFECYCLE_RULES))
+    try:
+        lm.apply_sync(bucket, plan, max_rules=max_rules)
+    except ValueError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    click.echo(f"{bucket}: applied in one request")
+
+
 @lifecycle.command('get')
 @click.argument('bucket_name')
 @click.pass_context
 def lifecycle_get_cmd(ctx, bucket_name):
     """Display all lifecycle rules for a bucket."""
     lm = ctx.obj['lifecycle_mgr']
-    xml = lm.get_lifecycle(bucket_name)
-
     try:
-        root = ET.fromstring(xml)
-        ns = '{http://s3.amazonaws.com/doc/2006-03-01/}'
-        for rule in root.findall(f'.//{ns}Rule'):
-            rid = rule.find(f'{ns}ID').text
-            prefix = rule.find(f'{ns}Filter/{ns}Prefix').text
-            date = rule.find(f'{ns}Expiration/{ns}Date').text
-            click.echo(f"Rule: {rid}, Prefix: {prefix}, Expires: {date}")
-    except ET.ParseError:
-        click.echo(xml)
+        config = lm.get_config(bucket_name)
+    except ValueError:
+        click.echo(lm.get_lifecycle(bucket_name))
+        return
+    if not config:
+        click.echo('No lifecycle rules')
+    for rule in config:
+        expires = rule.date or (f"after {rule.days} days" if rule.days is not None else None)
+        click.echo(f"Rule: {rule.id}, Prefix: {rule.prefix}, Expires: {expires}")
 
 
 @lifecycle.command('list-objects')
@@ -227,5 +1006,48 @@ def lifecycle_list_objects_cmd(ctx, bucket_name, prefix):
         click.echo(key)
 
 
+@cli.command('serve')
+@click.option('--socket', 'socket_path', default=None,
+              help='Unix socket to listen on [default: $S3CLI_SOCKET or a per-user socket]')
+@click.option('--lifecycle-cache-ttl', default=60.0, show_default=True, type=click.FloatRange(min=0),
+              help='Seconds a bucket lifecycle configuration is reused between commands')
+@click.pass_context
+def serve_cmd(ctx, socket_path, lifecycle_cache_ttl):
+    """
+    Run commands sent by other s3cli invocations, keeping connections,
+    configuration and lifecycle caches warm between them.
+    """
+    from s3manager.daemon import CommandServer, SessionCache
+    from s3manager.metrics import MetricsCollector
+
+    hooks = ctx.obj['hooks']
+    obj = {'hooks': hooks, 'sessions': SessionCache(), 'lifecycle_cache_ttl': lifecycle_cache_ttl}
+    metrics_file = ctx.parent.params['metrics_file']
+    collectors = [h for h in hooks if isinstance(h, MetricsCollector)]
+
+    def on_done():
+        # Keep the textfile current, not only at exit
+        if metrics_file and collectors:
+            collectors[0].write_prometheus(metrics_file)
+
+    group = ctx.find_root().command
+    server = CommandServer(
+        lambda argv: group.run_isolated(argv, ctx.find_root().info_name, obj=obj),
+        socket_path=socket_path, on_done=on_done
+    )
+    try:
+        server.bind()
+    except (RuntimeError, OSError) as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    click.echo(f"Serving on {server.socket_path} from {server.cwd}", err=True)
+    # Clean shutdown (socket removed, metrics reported) on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == '__main__':
     cli()
\ No newline at end of file
@@ -1,5 +1,26 @@
 """
 S3 Manager Package
 """
-from .bucket import BucketManager
-from .lifecycle import LifecycleManager
\ No newline at end of file
+import importlib
+
+# Managers are imported on first access so that importing a submodule
+# (s3manager.config, s3manager.fanout...) does not pull in requests
+_LAZY = {
+    'BucketManager': '.bucket',
+    'LifecycleManager': '.lifecycle',
+    'ObjectManager': '.objects',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,5 +1,11 @@
-from urllib.parse import quote_plus
-from .utils import S3Signer
+import hashlib
+import time
+from urllib.parse import quote
+from .utils import S3Signer, UNSIGNED_PAYLOAD
+from .transport import Transport
+from .endpoints import NODE_FAILURE_STATUSES, EndpointPool
+from .metrics import RequestRecord, operation_name
+from .retry import NETWORK_ERRORS, THROTTLE_STATUSES, AIMDLimiter, RetryPolicy
 
 class Authenticator:
     def __init__(
@@ -9,15 +15,25 @@ class Authenticator:
         namespace: str,
         endpoint: str,
         region: str = None,
-        method: str = 'v2'
+        method: str = 'v2',
+        transport: Transport = None,
+        unsigned_payload: bool = False,
+        retry: RetryPolicy = None,
+        limiter: AIMDLimiter = None,
+        endpoints: EndpointPool = None
     ):
         """
         :param access_key: S3 access key (ECS username)
         :param secret_key: S3 secret key
         :param namespace: ECS namespace
-        :param endpoint: ECS S3 endpoint URL
-        :param region: AWS region (for future v4 signature)
+        :param endpoint: ECS S3 endpoint URL, used for pre-signed URLs when endpoints is given
+        :param region: AWS region (v4 signature scope)
         :param method: Authentication method, 'v2' or 'v4'
+        :param transport: Shared HTTP transport, a default pool is created if omitted
+        :param unsigned_payload: v4 only, send UNSIGNED-PAYLOAD instead of hashing bodies
+        :param retry: Retry policy, defaults to RetryPolicy()
+        :param limiter: Shared concurrency limiter, requests are not limited if omitted
+        :param endpoints: Data node endpoints to spread requests over instead of endpoint
         """
         self.access_key = access_key
         self.secret_key = secret_key
@@ -25,6 +41,15 @@ class Authenticator:
         self.endpoint = endpoint.rstrip('/')
         self.region = region
         self.auth_method = method.lower()
+        self.unsigned_payload = unsigned_payload
+        self.transport = transport or Transport()
+        self.retry = retry or RetryPolicy()
+        self.limiter = limiter
+        self.endpoints = endpoints
+        if endpoints:
+            # One connection pool per node
+            self.transport.reserve_hosts(len(endpoints.endpoints))
+        self.hooks = []
 
     def sign(
         self,
@@ -33,18 +58,23 @@ class Authenticator:
         object_name: str = '',
         subresource: str = '',
         headers: dict = None,
-        payload: bytes = b''
+        payload: bytes = b'',
+        payload_hash: str = None,
+        endpoint: str = None
     ) -> (dict, str):
         """
         Returns (signed_headers, full_url)
+        payload_hash (v4 only) is the hex SHA-256 of payload when the caller
+        already computed it, or UNSIGNED-PAYLOAD.
+        endpoint overrides self.endpoint, v4 signs the Host of the URL.
         """
         headers = headers.copy() if headers else {}
         headers['x-emc-namespace'] = self.namespace
 
         path = f"/{bucket}" if bucket else '/'
         if object_name:
-            path += f"/{quote_plus(object_name)}"
-        url = self.endpoint + path
+            path += f"/{quote(object_name, safe='/~')}"
+        url = (endpoint or self.endpoint) + path
         if subresource:
             url += subresource
 
@@ -53,5 +83,135 @@ class Authenticator:
                 method, url, headers, self.access_key, self.secret_key, payload
             )
             return signed_headers, url
+        elif self.auth_method == 'v4':
+            if payload_hash is None:
+                payload_hash = (UNSIGNED_PAYLOAD if self.unsigned_payload
+                                else hashlib.sha256(payload).hexdigest())
+            signed_headers = S3Signer.sign_request_v4(
+                method, url, headers, self.access_key, self.secret_key,
+                self.region or 'us-east-1', payload_hash
+            )
+            return signed_headers, url
         else:
-            raise NotImplementedError("Only v2 authentication is supported at this time.")
+            raise NotImplementedError(f"Unsupported authentication method '{self.auth_method}'")
+
+    def request(
+        self,
+        method: str,
+        bucket: str = '',
+        object_name: str = '',
+        subresource: str = '',
+        headers: dict = None,
+        payload: bytes = b'',
+        stream: bool = False,
+        payload_hash: str = None
+    ):
+        """
+        Sign a request and send it through the shared transport.
+        Returns the requests.Response, status is left to the caller.
+
+        Throttling, 5xx responses and connection errors of idempotent
+        requests are retried according to self.retry, every attempt is
+        signed again. With a limiter, each attempt holds one of its slots
+        until the response headers arrive. With endpoints, each attempt is
+        sent to (and signed for) the endpoint the pool picks, and its outcome
+        feeds the health of that endpoint. Every hook is called with a
+        RequestRecord of each attempt.
+        """
+        args = (method, bucket, object_name, subresource, headers, payload, stream, payload_hash)
+        attempt = 1
+        while True:
+            token = self.limiter.acquire() if self.limiter else None
+            endpoint = self.endpoints.acquire() if self.endpoints else None
+            try:
+                resp = self._attempt(attempt, endpoint, *args)
+            except Exception as e:
+                # Only connection errors and timeouts say anything about the
+                # server, a local error (signing, bug) leaves both untouched
+                network = isinstance(e, NETWORK_ERRORS)
+                if self.limiter:
+                    self.limiter.release(token, throttled=network)
+                if endpoint:
+                    self.endpoints.release(endpoint, failed=network)
+                if not self.retry.retry_error(method, subresource, e, attempt):
+                    raise
+                resp = None
+            else:
+                if self.limiter:
+                    self.limiter.release(token, throttled=resp.status_code in THROTTLE_STATUSES)
+                if endpoint:
+                    self.endpoints.release(endpoint, failed=resp.status_code in NODE_FAILURE_STATUSES)
+                if not self.retry.retry_response(method, subresource, resp, attempt):
+                    return resp
+                resp.close()
+            time.sleep(self.retry.delay(attempt, resp))
+            attempt += 1
+
+    def _attempt(self, attempt, endpoint, method, bucket, object_name, subresource, headers,
+                 payload, stream, payload_hash):
+        if not self.hooks:
+            signed_headers, url = self.sign(
+                method, bucket=bucket, object_name=object_name,
+                subresource=subresource, headers=headers, payload=payload,
+                payload_hash=payload_hash, endpoint=endpoint
+            )
+            return self.transport.request(
+                method, url, headers=signed_headers, data=payload or None, stream=stream
+            )
+
+        timestamp, started = time.time(), time.perf_counter()
+        resp, error, signed = None, None, None
+        try:
+            signed_headers, url = self.sign(
+                method, bucket=bucket, object_name=object_name,
+                subresource=subresource, headers=headers, payload=payload,
+                payload_hash=payload_hash, endpoint=endpoint
+            )
+            signed = time.perf_counter()
+            resp = self.transport.request(
+                method, url, headers=signed_headers, data=payload or None, stream=stream
+            )
+            return resp
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._record(timestamp, started, signed, attempt, endpoint, method, bucket, object_name,
+                         subresource, payload, stream, resp, error)
+
+    def add_hook(self, hook):
+        """Register hook(record) to be called after every request."""
+        self.hooks.append(hook)
+
+    def _record(self, timestamp, started, signed, attempt, endpoint, method, bucket, object_name,
+                subresource, payload, stream, resp, error):
+        done = time.perf_counter()
+        signed = signed or done
+        if resp is None:
+            status, bytes_in, ttfb = None, None, None
+        else:
+            status, ttfb = resp.status_code, resp.elapsed.total_seconds()
+            if not stream:
+                bytes_in = len(resp.content)
+            else:
+                # Body not read yet, trust the announced length
+                length = resp.headers.get('Content-Length')
+                bytes_in = int(length) if length else None
+        # create_prefix/delete_prefix pass the key as a "/key" subresource
+        path, _, query = subresource.partition('?')
+        key = object_name or path.lstrip('/')
+        record = RequestRecord(
+            timestamp=timestamp, profile='', op=operation_name(method, key, query),
+            method=method, bucket=bucket, key=key, status=status,
+            bytes_out=len(payload) if payload else 0, bytes_in=bytes_in,
+            sign=signed - started, connect=self.transport.connect_time(),
+            ttfb=ttfb, total=done - started, attempt=attempt, error=error,
+            endpoint=endpoint or self.endpoint
+        )
+        for hook in self.hooks:
+            hook(record)
+
+    def presign(self, bucket: str, object_name: str, expires: int = 3600, method: str = 'GET') -> str:
+        """Return a pre-signed URL (query-string authentication) for one object."""
+        from .presign import Presigner
+        return Presigner(self, bucket, expires=expires, method=method).url(object_name)
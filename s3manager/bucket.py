@@ -1,4 +1,62 @@
-import requests
+import base64
+import hashlib
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, quote
+from xml.sax.saxutils import escape
+
+# Compact record yielded by BucketManager.list_objects
+ObjectInfo = namedtuple('ObjectInfo', ['key', 'size', 'etag', 'last_modified'])
+# Record yielded by BucketManager.list_object_versions, delete markers have no size/etag
+ObjectVersion = namedtuple('ObjectVersion', [
+    'key', 'version_id', 'size', 'etag', 'last_modified', 'is_latest', 'delete_marker'
+])
+
+
+# S3 limits of a tag set
+MAX_BUCKET_TAGS = 50
+MAX_OBJECT_TAGS = 10
+
+# Number of keys handed over at once by a partition listing worker
+_BATCH_SIZE = 1000
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _local(tag: str) -> str:
+    """Strip the XML namespace from an element tag."""
+    return tag.rpartition('}')[2]
+
+
+def tagging_body(tags: dict) -> bytes:
+    """Tagging document of a {key: value} tag set."""
+    tag_set = ''.join(f"<Tag><Key>{escape(k)}</Key><Value>{escape(v)}</Value></Tag>"
+                      for k, v in tags.items())
+    return (f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Tagging xmlns="http://s3.amazonaws.com/doc/2006-03-01/"><TagSet>{tag_set}</TagSet></Tagging>'
+            ).encode('utf-8')
+
+
+def parse_tagging(content: bytes) -> dict:
+    """{key: value} of a Tagging document."""
+    tags = {}
+    for el in ET.fromstring(content).iter():
+        if _local(el.tag) == 'Tag':
+            fields = {_local(child.tag): child.text or '' for child in el}
+            tags[fields.get('Key', '')] = fields.get('Value', '')
+    return tags
+
+
+def _tagging_headers(body: bytes) -> dict:
+    return {'Content-Type': 'application/xml',
+            'Content-MD5': base64.b64encode(hashlib.md5(body).digest()).decode('utf-8')}
+
 
 class BucketManager:
     def __init__(self, auth):
@@ -7,8 +65,7 @@ class BucketManager:
     def create_bucket(self, bucket_name: str, namespace: str = None, versioning: bool = False):
         if namespace:
             self.auth.namespace = namespace
-        headers, url = self.auth.sign('PUT', bucket=bucket_name)
-        resp = requests.put(url, headers=headers)
+        resp = self.auth.request('PUT', bucket=bucket_name)
         resp.raise_for_status()
 
         if versioning:
@@ -18,14 +75,13 @@ class BucketManager:
                 '<Status>Enabled</Status>'
                 '</VersioningConfiguration>'
             )
-            headers_v, url_v = self.auth.sign(
+            resp_v = self.auth.request(
                 'PUT',
                 bucket=bucket_name,
                 subresource='?versioning',
                 headers={'Content-Type': 'application/xml'},
                 payload=xml.encode()
             )
-            resp_v = requests.put(url_v, headers=headers_v, data=xml)
             resp_v.raise_for_status()
 
         return {'success': True}
@@ -41,21 +97,28 @@ class BucketManager:
                 f'<Status>{status}</Status>'
                 '</VersioningConfiguration>'
             )
-            headers, url = self.auth.sign(
+            resp = self.auth.request(
                 'PUT',
                 bucket=bucket_name,
                 subresource='?versioning',
                 headers={'Content-Type': 'application/xml'},
                 payload=xml.encode()
             )
-            resp = requests.put(url, headers=headers, data=xml)
             resp.raise_for_status()
             return {'success': True, 'versioning': status}
         return {'success': True, 'message': 'No changes applied'}
 
+    def get_versioning(self, bucket_name: str) -> str:
+        """Versioning status of the bucket: 'Enabled', 'Suspended' or '' if never enabled."""
+        resp = self.auth.request('GET', bucket=bucket_name, subresource='?versioning')
+        resp.raise_for_status()
+        for el in ET.fromstring(resp.content).iter():
+            if _local(el.tag) == 'Status':
+                return el.text or ''
+        return ''
+
     def get_bucket_info(self, bucket_name: str) -> dict:
-        headers, url = self.auth.sign('HEAD', bucket=bucket_name)
-        resp = requests.head(url, headers=headers)
+        resp = self.auth.request('HEAD', bucket=bucket_name)
         if resp.status_code == 404:
             return {'success': False, 'message': f"Bucket {bucket_name} not found", 'status_code': 404}
         resp.raise_for_status()
@@ -66,16 +129,290 @@ class BucketManager:
             'StorageSize': resp.headers.get('x-emc-meta-storage-size')
         }
 
-    def list_objects(self, bucket_name: str, prefix: str = None) -> list:
-        return []
+    def create_prefix(self, bucket_name: str, prefix: str) -> dict:
+        """Create the empty placeholder object `prefix/`."""
+        key = f"{prefix.rstrip('/')}/"
+        resp = self.auth.request('PUT', bucket=bucket_name, subresource=f"/{key}")
+        resp.raise_for_status()
+        return {'success': True, 'key': key}
+
+    def delete_prefix(self, bucket_name: str, prefix: str) -> dict:
+        """Delete the placeholder object `prefix/`."""
+        key = f"{prefix.rstrip('/')}/"
+        resp = self.auth.request('DELETE', bucket=bucket_name, subresource=f"/{key}")
+        resp.raise_for_status()
+        return {'success': True, 'key': key}
+
+    def list_objects(
+        self,
+        bucket_name: str,
+        prefix: str = None,
+        delimiter: str = None,
+        start_after: str = None,
+        max_keys: int = 1000
+    ):
+        """
+        Generator over the bucket listing (ListObjectsV2).
+        Pages are fetched one at a time following continuation tokens and
+        parsed incrementally, yielding ObjectInfo records in key order.
+        """
+        for kind, item in self._list_pages(bucket_name, prefix, delimiter, start_after, max_keys):
+            if kind == 'object':
+                yield item
+
+    def exists_any(self, bucket_name: str, prefix: str) -> bool:
+        """
+        True if at least one key exists under prefix, not counting the
+        `prefix` placeholder itself. Costs a single max-keys=1 request.
+        """
+        for _ in self.list_objects(bucket_name, prefix=prefix, start_after=prefix, max_keys=1):
+            return True
+        return False
+
+    def list_common_prefixes(self, bucket_name: str, prefix: str = None, delimiter: str = '/'):
+        """Generator over the common prefixes (pseudo-folders) directly under prefix."""
+        for kind, item in self._list_pages(bucket_name, prefix, delimiter):
+            if kind == 'prefix':
+                yield item
+
+    def list_objects_parallel(
+        self,
+        bucket_name: str,
+        prefix: str = None,
+        partitions: list = None,
+        workers: int = 8,
+        ordered: bool = True,
+        start_after: dict = None
+    ):
+        """
+        List several partitions of a bucket concurrently.
+
+        Partitions default to the common prefixes found under prefix with
+        delimiter '/', keys sitting directly under prefix are listed too.
+        When partitions are given (e.g. the profile prefix_list) only keys
+        inside them are listed. With ordered=True records come out in key
+        order, otherwise batches are yielded as soon as they are fetched.
+        start_after maps a partition to the key its listing starts after.
+        """
+        loose = []
+        if partitions is None:
+            partitions = []
+            for kind, item in self._list_pages(bucket_name, prefix, '/'):
+                (partitions if kind == 'prefix' else loose).append(item)
+        partitions = sorted(set(partitions))
+
+        stop = threading.Event()
+        shared = queue.Queue(maxsize=workers * 2)
+        queues = {part: queue.Queue(maxsize=2) if ordered else shared for part in partitions}
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        futures = [
+            pool.submit(self._fill_partition, bucket_name, part, queues[part], stop,
+                        (start_after or {}).get(part))
+            for part in partitions
+        ]
+        try:
+            if ordered:
+                entries = sorted(
+                    [(obj.key, obj) for obj in loose] + [(part, None) for part in partitions],
+                    key=lambda entry: entry[0]
+                )
+                for name, obj in entries:
+                    if obj is not None:
+                        yield obj
+                        continue
+                    for batch in self._drain(queues[name], 1):
+                        yield from batch
+            else:
+                yield from loose
+                for batch in self._drain(shared, len(partitions)):
+                    yield from batch
+        finally:
+            stop.set()
+            for fut in futures:
+                fut.cancel()
+            pool.shutdown(wait=True)
+
+    @staticmethod
+    def _drain(q, producers: int):
+        """Yield batches from q until `producers` workers have signalled completion."""
+        while producers:
+            item = q.get()
+            if item is _DONE:
+                producers -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+    def _fill_partition(self, bucket_name, partition, q, stop, start_after=None):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            raise _Cancelled()
+
+        try:
+            batch = []
+            for obj in self.list_objects(bucket_name, prefix=partition, start_after=start_after):
+                batch.append(obj)
+                if len(batch) >= _BATCH_SIZE:
+                    put(batch)
+                    batch = []
+            if batch:
+                put(batch)
+            put(_DONE)
+        except _Cancelled:
+            pass
+        except Exception as e:
+            try:
+                put(e)
+            except _Cancelled:
+                pass
+
+    def _list_pages(self, bucket_name, prefix=None, delimiter=None, start_after=None, max_keys=1000):
+        """Yield ('object', ObjectInfo) and ('prefix', str) events across all pages."""
+        token = None
+        while True:
+            params = [('list-type', '2'), ('max-keys', str(max_keys))]
+            if prefix:
+                params.append(('prefix', prefix))
+            if delimiter:
+                params.append(('delimiter', delimiter))
+            if token:
+                params.append(('continuation-token', token))
+            elif start_after:
+                params.append(('start-after', start_after))
+
+            resp = self.auth.request(
+                'GET', bucket=bucket_name,
+                subresource='?' + urlencode(params, quote_via=quote), stream=True
+            )
+            try:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                page = {}
+                for _, elem in ET.iterparse(resp.raw):
+                    tag = _local(elem.tag)
+                    if tag == 'Contents':
+                        fields = {_local(child.tag): child.text for child in elem}
+                        yield 'object', ObjectInfo(
+                            fields.get('Key'),
+                            int(fields.get('Size') or 0),
+                            (fields.get('ETag') or '').strip('"'),
+                            fields.get('LastModified')
+                        )
+                        elem.clear()
+                    elif tag == 'CommonPrefixes':
+                        for child in elem:
+                            if _local(child.tag) == 'Prefix':
+                                yield 'prefix', child.text
+                        elem.clear()
+                    elif tag in ('IsTruncated', 'NextContinuationToken'):
+                        page[tag] = elem.text
+            finally:
+                resp.close()
+
+            token = page.get('NextContinuationToken')
+            if page.get('IsTruncated') != 'true' or not token:
+                return
+
+    def list_object_versions(
+        self,
+        bucket_name: str,
+        prefix: str = None,
+        key_marker: str = None,
+        max_keys: int = 1000
+    ):
+        """
+        Generator over every version and delete marker under prefix
+        (ListObjectVersions), streamed page by page like list_objects.
+        Listing starts after the versions of key_marker when given.
+        """
+        version_marker = None
+        while True:
+            params = [('max-keys', str(max_keys))]
+            if prefix:
+                params.append(('prefix', prefix))
+            if key_marker:
+                params.append(('key-marker', key_marker))
+            if version_marker:
+                params.append(('version-id-marker', version_marker))
+
+            resp = self.auth.request(
+                'GET', bucket=bucket_name,
+                subresource='?versions&' + urlencode(params, quote_via=quote), stream=True
+            )
+            try:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                page = {}
+                for _, elem in ET.iterparse(resp.raw):
+                    tag = _local(elem.tag)
+                    if tag in ('Version', 'DeleteMarker'):
+                        fields = {_local(child.tag): child.text for child in elem}
+                        yield ObjectVersion(
+                            fields.get('Key'),
+                            fields.get('VersionId'),
+                            int(fields.get('Size') or 0),
+                            (fields.get('ETag') or '').strip('"'),
+                            fields.get('LastModified'),
+                            fields.get('IsLatest') == 'true',
+                            tag == 'DeleteMarker'
+                        )
+                        elem.clear()
+                    elif tag in ('IsTruncated', 'NextKeyMarker', 'NextVersionIdMarker'):
+                        page[tag] = elem.text
+            finally:
+                resp.close()
+
+            key_marker = page.get('NextKeyMarker')
+            version_marker = page.get('NextVersionIdMarker')
+            if page.get('IsTruncated') != 'true' or not key_marker:
+                return
+
+    def get_bucket_tagging(self, bucket_name: str) -> dict:
+        """Tag set of the bucket as {key: value}, empty if it has none."""
+        resp = self.auth.request('GET', bucket=bucket_name, subresource='?tagging')
+        if resp.status_code == 404:
+            return {}
+        resp.raise_for_status()
+        return parse_tagging(resp.content)
+
+    def put_bucket_tagging(self, bucket_name: str, tags: dict) -> dict:
+        """Replace the tag set of the bucket, an empty tag set removes it."""
+        if not tags:
+            resp = self.auth.request('DELETE', bucket=bucket_name, subresource='?tagging')
+        else:
+            if len(tags) > MAX_BUCKET_TAGS:
+                raise ValueError(f"{len(tags)} tags exceed the limit of {MAX_BUCKET_TAGS} per bucket")
+            body = tagging_body(tags)
+            resp = self.auth.request('PUT', bucket=bucket_name, subresource='?tagging',
+                                     headers=_tagging_headers(body), payload=body)
+        resp.raise_for_status()
+        return {'success': True, 'bucket': bucket_name, 'tags': tags}
+
+    def tag_bucket(self, bucket_name: str, tags: dict, replace: bool = False) -> dict:
+        """
+        Merge tags into the tag set of the bucket, or replace it with
+        replace=True. Nothing is written when the tag set would not change.
+        """
+        current = self.get_bucket_tagging(bucket_name)
+        wanted = dict(tags) if replace else {**current, **tags}
+        if wanted == current:
+            return {'success': True, 'bucket': bucket_name, 'tags': current, 'changed': False}
+        self.put_bucket_tagging(bucket_name, wanted)
+        return {'success': True, 'bucket': bucket_name, 'tags': wanted, 'changed': True}
 
-    def apply_bucket_tag(self, bucket_name: str, tag_name: str) -> dict:
-        return {'success': True, 'bucket': bucket_name, 'tag_applied': tag_name}
+    def apply_bucket_tag(self, bucket_name: str, tag_name: str, value: str = '') -> dict:
+        res = self.tag_bucket(bucket_name, {tag_name: value})
+        return {**res, 'tag_applied': tag_name}
 
     def delete_bucket(self, bucket_name: str, namespace: str = None) -> dict:
         if namespace:
             self.auth.namespace = namespace
-        headers, url = self.auth.sign('DELETE', bucket=bucket_name)
-        resp = requests.delete(url, headers=headers)
+        resp = self.auth.request('DELETE', bucket=bucket_name)
         resp.raise_for_status()
         return {'success': True}
@@ -0,0 +1,27 @@
+import json
+import os
+
+
+def load_state(path: str) -> dict:
+    """Checkpoint saved by save_state(), None if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(path: str, state: dict):
+    """Write state as JSON through a temporary file, so a crash never leaves half a checkpoint."""
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def remove_file(path: str):
+    """Remove path if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
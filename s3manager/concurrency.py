@@ -0,0 +1,43 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+
+def map_ordered(fn, items, workers: int = 8):
+    """
+    Apply fn to every item on a bounded thread pool.
+
+    Yields (item, result, error) tuples in input order. At most
+    2 * workers calls are in flight, so items may be a lazy iterable.
+    Errors are returned rather than raised so callers can report them.
+    """
+    workers = max(1, int(workers))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for item in items:
+                pending.append((item, pool.submit(fn, item)))
+                if len(pending) >= workers * 2:
+                    yield _settle(*pending.popleft())
+            while pending:
+                yield _settle(*pending.popleft())
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+
+def chunked(items, size: int):
+    """Yield lists of at most `size` items from a (lazy) iterable."""
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _settle(item, fut):
+    try:
+        return item, fut.result(), None
+    except Exception as e:
+        return item, None, e
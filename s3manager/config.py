@@ -0,0 +1,171 @@
+"""
+Profile configuration loading.
+
+Parsing YAML is the slowest part of a short CLI run, so the parsed file is
+cached as JSON, keyed on the path, modification time and size of the YAML
+file. Any change to the file invalidates the cache. Secrets are not
+cached: the cache records where each one is written in the YAML file, and
+they are read back from there. A file whose secrets cannot be read back
+that way is not cached. The cache is written with mode 0600.
+"""
+import hashlib
+import json
+import os
+
+# realpath -> (stamp, profiles), for long-running processes (s3cli serve)
+_memo = {}
+# Profile settings left out of the cache
+SECRET_KEYS = frozenset(['secret_key'])
+_CACHE_VERSION = 2
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 's3cli'
+)
+
+
+def load_profiles(config_path: str, cache: bool = True) -> dict:
+    """Return {profile: settings} for a YAML configuration file."""
+    if not cache or os.environ.get('S3CLI_NO_CONFIG_CACHE'):
+        return _parse(config_path)
+
+    st = os.stat(config_path)
+    stamp = [st.st_mtime_ns, st.st_size]
+    real_path = os.path.realpath(config_path)
+    memo = _memo.get(real_path)
+    if memo is not None and memo[0] == stamp:
+        return memo[1]
+
+    cache_path = _cache_path(config_path)
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == _CACHE_VERSION and cached.get('stamp') == stamp:
+            profiles = _restore_secrets(config_path, stamp, cached['profiles'], cached['secrets'])
+        else:
+            profiles = None
+    except (OSError, ValueError, KeyError, TypeError):
+        profiles = None
+
+    if profiles is None:
+        profiles, secrets = _parse_with_secrets(config_path)
+        if secrets is not None:
+            _write_cache(cache_path, {'version': _CACHE_VERSION, 'stamp': stamp,
+                                      'profiles': _without_secrets(profiles), 'secrets': secrets})
+    _memo[real_path] = (stamp, profiles)
+    return profiles
+
+
+def load_profile(config_path: str, profile: str, cache: bool = True) -> dict:
+    """Settings of one profile, KeyError if the profile does not exist."""
+    return load_profiles(config_path, cache=cache)[profile]
+
+
+def _parse(config_path: str) -> dict:
+    import yaml
+    with open(config_path, encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def _parse_with_secrets(config_path: str) -> tuple:
+    """
+    (profiles, secrets) where secrets lists [profile, key, start, end, style]
+    of every secret: its characters in the YAML text and its scalar style.
+    secrets is None when a secret cannot be read back from its characters.
+    """
+    import yaml
+    with open(config_path, encoding='utf-8') as f:
+        text = f.read()
+    loader = yaml.SafeLoader(text)
+    try:
+        root = loader.get_single_node()
+        profiles = (loader.construct_document(root) if root is not None else None) or {}
+    finally:
+        loader.dispose()
+    if not isinstance(profiles, dict):
+        return profiles, None
+
+    secrets = []
+    for profile_node, conf_node in root.value if isinstance(root, yaml.MappingNode) else []:
+        if not isinstance(conf_node, yaml.MappingNode):
+            continue
+        for key_node, value_node in conf_node.value:
+            if key_node.value not in SECRET_KEYS:
+                continue
+            profile = profiles.get(profile_node.value)
+            value = profile.get(key_node.value) if isinstance(profile, dict) else None
+            if not isinstance(value_node, yaml.ScalarNode) or not isinstance(value, str):
+                return profiles, None
+            start, end = value_node.start_mark.index, value_node.end_mark.index
+            style = value_node.style or ''
+            if _scalar_text(text[start:end], style) != value:
+                return profiles, None  # escapes, folded lines...
+            secrets.append([profile_node.value, key_node.value, start, end, style])
+    return profiles, secrets
+
+
+def _scalar_text(raw: str, style: str):
+    """Value of a one-line plain or quoted YAML scalar, None for other forms."""
+    if '\n' in raw:
+        return None
+    if style == '':
+        return raw
+    if style == "'" and len(raw) >= 2 and raw[0] == raw[-1] == "'":
+        return raw[1:-1].replace("''", "'")
+    if style == '"' and len(raw) >= 2 and raw[0] == raw[-1] == '"' and '\\' not in raw:
+        return raw[1:-1]
+    return None
+
+
+def _without_secrets(profiles: dict) -> dict:
+    return {
+        name: {k: v for k, v in conf.items() if k not in SECRET_KEYS} if isinstance(conf, dict) else conf
+        for name, conf in profiles.items()
+    }
+
+
+def _restore_secrets(config_path: str, stamp: list, profiles: dict, secrets: list):
+    """Put the secrets back into cached profiles, None if the file changed meanwhile."""
+    if not secrets:
+        return profiles
+    with open(config_path, encoding='utf-8') as f:
+        st = os.fstat(f.fileno())
+        if [st.st_mtime_ns, st.st_size] != stamp:
+            return None
+        text = f.read()
+    for profile, key, start, end, style in secrets:
+        value = _scalar_text(text[start:end], style)
+        if value is None:
+            return None
+        profiles[profile][key] = value
+    return profiles
+
+
+def _cache_path(config_path: str) -> str:
+    digest = hashlib.sha1(os.path.realpath(config_path).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"config-{digest}.json")
+
+
+def _write_cache(cache_path: str, data: dict):
+    """
+    Best effort: a read-only home directory only disables the cache, and
+    configurations JSON cannot represent exactly (dates, integer keys...)
+    are not cached.
+    """
+    try:
+        text = json.dumps(data)
+        if json.loads(text) != data:
+            return
+    except (TypeError, ValueError):
+        return
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,219 @@
+"""
+Resident command server and its thin client.
+
+`s3cli serve` listens on a Unix domain socket and runs the CLI commands it
+receives in-process, so that connection pools, parsed configuration and
+lifecycle caches outlive a single command. The protocol is JSON lines:
+
+    client -> server   {"argv": [...], "cwd": "/path"}
+    server -> client   {"out": "text"} / {"err": "text"} ... then {"exit": 0}
+                       or {"fallback": "reason"}: run the command locally
+
+This module only imports the standard library so that the client side
+stays cheap to load.
+"""
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+
+
+def default_socket_path() -> str:
+    """
+    $S3CLI_SOCKET, else a per-user socket in $XDG_RUNTIME_DIR or in a private
+    s3cli-<uid> directory of the temp directory.
+    """
+    if os.environ.get('S3CLI_SOCKET'):
+        return os.environ['S3CLI_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], f"s3cli-{os.getuid()}.sock")
+    return os.path.join(_temp_socket_dir(), 's3cli.sock')
+
+
+def _temp_socket_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), f"s3cli-{os.getuid()}")
+
+
+def make_private_dir(path: str):
+    """Create an owner-only directory; RuntimeError if it exists with another owner or mode."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{path} is not a private directory of this user")
+
+
+def trusted_socket(socket_path: str) -> bool:
+    """
+    Whether socket_path is a socket of this user in a directory no other
+    user can write to, i.e. one that only this user's server can listen on.
+    """
+    try:
+        st = os.lstat(socket_path)
+        parent = os.stat(os.path.dirname(os.path.abspath(socket_path)))
+    except OSError:
+        return False
+    uid = os.getuid()
+    return (stat.S_ISSOCK(st.st_mode) and st.st_uid == uid
+            and parent.st_uid == uid and not parent.st_mode & 0o022)
+
+
+def forward(argv: list, socket_path: str = None, stdout=None, stderr=None):
+    """
+    Run argv on a running server and relay its output.
+    Returns the exit status, or None when no trusted server accepts the
+    command (see trusted_socket()).
+    """
+    socket_path = socket_path or default_socket_path()
+    if not trusted_socket(socket_path):
+        return None
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+    except OSError:
+        return None  # stale socket
+    with sock, sock.makefile('rb') as reader:
+        sock.sendall(json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode('utf-8') + b'\n')
+        for line in reader:
+            frame = json.loads(line)
+            if 'out' in frame:
+                stdout.write(frame['out'])
+            elif 'err' in frame:
+                stderr.write(frame['err'])
+            elif 'exit' in frame:
+                stdout.flush()
+                return frame['exit']
+            elif 'fallback' in frame:
+                return None
+    stderr.write('s3cli: connection to the server was lost\n')
+    return 1
+
+
+class ClientGone(Exception):
+    """
+    The client disconnected while its command was running. Deliberately not
+    an OSError: click reacts to EPIPE by replacing sys.stdout process-wide.
+    """
+
+
+class SessionCache:
+    """
+    Warm per-profile state kept by the server between commands, rebuilt when
+    the profile settings change.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, conf: dict, factory):
+        with self._lock:
+            cached = self._sessions.get(key)
+            if cached is None or cached[0] != conf:
+                cached = self._sessions[key] = (conf, factory())
+            return cached[1]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class CommandServer:
+    """
+    Accept commands on a Unix socket and run each one on its own thread with
+    run(argv) -> exit status, its stdout/stderr sent back to the client.
+    """
+
+    def __init__(self, run, socket_path: str = None, on_done=None):
+        """
+        :param run: Callable running one command line, returns the exit status
+        :param socket_path: Socket to listen on, see default_socket_path()
+        :param on_done: Optional callable invoked after every command
+        """
+        self.run = run
+        self.on_done = on_done
+        self.socket_path = socket_path or default_socket_path()
+        self.cwd = os.path.realpath(os.getcwd())
+        self._sock = None
+
+    def serve_forever(self):
+        from .fanout import routed_stdio
+        if self._sock is None:
+            self.bind()
+        try:
+            with routed_stdio() as streams:
+                while True:
+                    conn, _ = self._sock.accept()
+                    threading.Thread(target=self._handle, args=(conn, streams), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    def bind(self):
+        """Listen on the socket, replacing a stale one; RuntimeError if a server already runs."""
+        if os.path.dirname(os.path.abspath(self.socket_path)) == _temp_socket_dir():
+            make_private_dir(_temp_socket_dir())
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.remove(self.socket_path)  # left over by a server that died
+            else:
+                raise RuntimeError(f"A server is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Commands run with this user's credentials: owner-only socket
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        sock.listen(64)
+        self._sock = sock
+
+    def _handle(self, conn, streams):
+        out, err = streams
+        lock = threading.Lock()
+
+        def send(frame):
+            with lock:
+                try:
+                    conn.sendall(json.dumps(frame).encode('utf-8') + b'\n')
+                except OSError as e:
+                    raise ClientGone() from e
+
+        with conn, conn.makefile('rb') as reader:
+            try:
+                request = json.loads(reader.readline())
+                argv = [str(a) for a in request['argv']]
+            except (ValueError, KeyError, TypeError):
+                return
+            # Commands resolve relative paths (--config, files) against the
+            # server's directory, only accept clients that share it
+            if os.path.realpath(request.get('cwd') or '') != self.cwd:
+                return send({'fallback': f"server runs in {self.cwd}"})
+            try:
+                with out.route(lambda s: send({'out': s})), err.route(lambda s: send({'err': s})):
+                    status = self.run(argv)
+                send({'exit': status})
+            except ClientGone:
+                pass
+            finally:
+                if self.on_done:
+                    self.on_done()
@@ -0,0 +1,109 @@
+import threading
+import time
+
+# Answers that point at a sick node rather than at the request or at throttling
+NODE_FAILURE_STATUSES = frozenset([500, 502, 504])
+STRATEGIES = ('round-robin', 'least-outstanding')
+
+
+def endpoint_list(conf: dict) -> list:
+    """Endpoints of a profile, whose `endpoint` is a URL or a list of URLs."""
+    endpoints = conf.get('endpoint') or []
+    if isinstance(endpoints, str):
+        endpoints = [endpoints]
+    return [e.rstrip('/') for e in endpoints]
+
+
+class EndpointPool:
+    """
+    Endpoints (data nodes) of one ECS cluster, one chosen per request
+    attempt by round-robin or least outstanding requests.
+
+    Health is tracked passively: a node whose requests fail `max_failures`
+    times in a row (connection errors, timeouts, 500/502/504) is ejected
+    for `cooldown` seconds, then tried again. When every node is ejected,
+    the one coming back first is used rather than failing the request.
+    """
+
+    def __init__(
+        self,
+        endpoints: list,
+        strategy: str = 'round-robin',
+        cooldown: float = 30.0,
+        max_failures: int = 1,
+        clock=time.monotonic
+    ):
+        """
+        :param endpoints: Endpoint URLs
+        :param strategy: 'round-robin' or 'least-outstanding'
+        :param cooldown: Seconds an ejected endpoint receives no request
+        :param max_failures: Consecutive failures that eject an endpoint
+        """
+        if not endpoints:
+            raise ValueError('No endpoint given')
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown endpoint strategy '{strategy}', use one of {', '.join(STRATEGIES)}")
+        self.endpoints = [e.rstrip('/') for e in endpoints]
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.max_failures = max(1, max_failures)
+        self._clock = clock
+        self._next = 0
+        self._outstanding = dict.fromkeys(self.endpoints, 0)
+        self._requests = dict.fromkeys(self.endpoints, 0)
+        self._failures = dict.fromkeys(self.endpoints, 0)
+        self._ejections = dict.fromkeys(self.endpoints, 0)
+        self._ejected_until = dict.fromkeys(self.endpoints, 0.0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, conf: dict):
+        """Pool for a profile, None when it has a single endpoint."""
+        endpoints = endpoint_list(conf)
+        if len(endpoints) < 2:
+            return None
+        return cls(
+            endpoints,
+            strategy=conf.get('endpoint_strategy', 'round-robin'),
+            cooldown=float(conf.get('endpoint_cooldown', 30)),
+            max_failures=int(conf.get('endpoint_max_failures', 1))
+        )
+
+    def acquire(self) -> str:
+        """Endpoint for the next attempt, to pass to release() once it is answered."""
+        with self._lock:
+            now = self._clock()
+            healthy = [e for e in self.endpoints if self._ejected_until[e] <= now]
+            if not healthy:
+                healthy = [min(self.endpoints, key=self._ejected_until.get)]
+            if self.strategy == 'round-robin':
+                endpoint = healthy[self._next % len(healthy)]
+                self._next += 1
+            else:
+                # Ties go to the endpoint that served the fewest requests
+                endpoint = min(healthy, key=lambda e: (self._outstanding[e], self._requests[e]))
+            self._outstanding[endpoint] += 1
+            self._requests[endpoint] += 1
+            return endpoint
+
+    def release(self, endpoint: str, failed: bool = False):
+        with self._lock:
+            self._outstanding[endpoint] -= 1
+            if not failed:
+                self._failures[endpoint] = 0
+                return
+            self._failures[endpoint] += 1
+            if self._failures[endpoint] >= self.max_failures:
+                self._failures[endpoint] = 0
+                self._ejections[endpoint] += 1
+                self._ejected_until[endpoint] = self._clock() + self.cooldown
+
+    def status(self) -> list:
+        """Per endpoint: requests sent, in flight, ejections and seconds left out of rotation."""
+        with self._lock:
+            now = self._clock()
+            return [
+                {'endpoint': e, 'requests': self._requests[e], 'outstanding': self._outstanding[e],
+                 'ejections': self._ejections[e], 'ejected_for': max(0.0, self._ejected_until[e] - now)}
+                for e in self.endpoints
+            ]
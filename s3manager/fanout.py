@@ -0,0 +1,128 @@
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class ThreadLocalOutput(io.TextIOBase):
+    """
+    Stand-in for sys.stdout/sys.stderr that lets each thread send its output
+    somewhere else. Threads without a route write to the original stream.
+    """
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    @property
+    def encoding(self):
+        return getattr(self._default, 'encoding', None) or 'utf-8'
+
+    @property
+    def errors(self):
+        return getattr(self._default, 'errors', None) or 'strict'
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._target() is None and self._default.isatty()
+
+    def _target(self):
+        return getattr(self._local, 'write', None)
+
+    def writer(self):
+        """Function the current thread's output goes to, to hand over to worker threads."""
+        return self._target() or self._default.write
+
+    def write(self, s):
+        if not isinstance(s, str):
+            raise TypeError(f"write() argument must be str, not {type(s).__name__}")
+        target = self._target()
+        if target is None:
+            return self._default.write(s)
+        target(s)
+        return len(s)
+
+    def flush(self):
+        self._default.flush()
+
+    @contextmanager
+    def route(self, write):
+        """Send this thread's output to write(str) for the duration of the block."""
+        previous = self._target()
+        self._local.write = write
+        try:
+            yield
+        finally:
+            self._local.write = previous
+
+
+class LinePrefixer:
+    """Buffer text up to each newline and write it with a prefix, one line at a time."""
+
+    def __init__(self, prefix: str, write, lock: threading.Lock):
+        self.prefix = prefix
+        self._write = write
+        self._lock = lock
+        self._buffer = ''
+
+    def __call__(self, s: str):
+        self._buffer += s
+        if '\n' not in self._buffer:
+            return
+        *lines, self._buffer = self._buffer.split('\n')
+        with self._lock:
+            for line in lines:
+                self._write(f"{self.prefix}{line}\n")
+
+    def close(self):
+        if self._buffer:
+            self('\n')
+
+
+@contextmanager
+def routed_stdio():
+    """
+    Install ThreadLocalOutput on sys.stdout and sys.stderr, yield (stdout, stderr).
+    Nested calls (fan-out inside the command server) reuse the installed pair.
+    """
+    if isinstance(sys.stdout, ThreadLocalOutput) and isinstance(sys.stderr, ThreadLocalOutput):
+        yield sys.stdout, sys.stderr
+        return
+    out, err = ThreadLocalOutput(sys.stdout), ThreadLocalOutput(sys.stderr)
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = out, err
+    try:
+        yield out, err
+    finally:
+        sys.stdout, sys.stderr = saved
+
+
+def run_per_profile(fn, profiles: list, workers: int = 4) -> dict:
+    """
+    Call fn(profile) for every profile on a pool of `workers` threads, with
+    everything the call prints to stdout/stderr prefixed by "[profile] ".
+    fn returns an exit status. Returns {profile: exit_status}.
+    """
+    lock = threading.Lock()
+    with routed_stdio() as (out, err):
+        out_write, err_write = out.writer(), err.writer()
+
+        def run(profile):
+            prefix = f"[{profile}] "
+            out_lines = LinePrefixer(prefix, out_write, lock)
+            err_lines = LinePrefixer(prefix, err_write, lock)
+            with out.route(out_lines), err.route(err_lines):
+                try:
+                    return fn(profile)
+                finally:
+                    out_lines.close()
+                    err_lines.close()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            statuses = dict(zip(profiles, pool.map(run, profiles)))
+        out.flush()
+        err.flush()
+    return statuses
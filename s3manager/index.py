@@ -0,0 +1,235 @@
+"""
+Local SQLite index of bucket listings, one database file per bucket.
+
+The index is split in partitions: the top-level folders of the bucket
+("05-2025/", ...) plus "" for the keys at the root. A refresh lists the
+folders once with delimiter "/", then
+  - lists new folders, and those given explicitly or older than max_age, in full,
+  - lists existing folders only after the last key seen (new keys of an
+    append-mostly folder cost one request when nothing changed),
+  - drops the folders that disappeared.
+Deleted or rewritten keys inside an existing folder are only seen by a full
+listing of that folder.
+"""
+import datetime
+import os
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+from .bucket import ObjectInfo
+from .config import CACHE_DIR
+from .endpoints import endpoint_list
+
+SCHEMA_VERSION = 1
+_INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS objects_last_modified ON objects (last_modified);
+CREATE TABLE IF NOT EXISTS partitions (
+    name TEXT PRIMARY KEY,
+    marker TEXT,
+    listed_at REAL NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def index_path(conf: dict, bucket_name: str) -> str:
+    """Index file of a bucket: <index_dir>/<endpoint host>-<namespace>-<bucket>.sqlite"""
+    base = conf.get('index_dir') or os.path.join(CACHE_DIR, 'index')
+    host = urlparse(endpoint_list(conf)[0]).hostname or 'local'
+    return os.path.join(os.path.expanduser(base), f"{host}-{conf['namespace']}-{bucket_name}.sqlite")
+
+
+class ObjectIndex:
+    def __init__(self, path: str, create: bool = True):
+        """
+        :param path: SQLite database file, see index_path()
+        :param create: Create the file if missing, FileNotFoundError otherwise
+        """
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        # Readers keep answering from the last committed state during a refresh
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript('DROP TABLE IF EXISTS objects; DROP TABLE IF EXISTS partitions;')
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- filling -------------------------------------------------------------
+
+    def build(self, bucket_mgr, bucket_name: str, workers: int = 8) -> dict:
+        """Replace the index content with a full listing of the bucket."""
+        return self.refresh(bucket_mgr, bucket_name, workers=workers, full=True)
+
+    def refresh(
+        self,
+        bucket_mgr,
+        bucket_name: str,
+        prefixes: list = None,
+        max_age: float = None,
+        workers: int = 8,
+        full: bool = False
+    ) -> dict:
+        """
+        Bring the index up to date with the bucket, see the module docstring.
+
+        :param prefixes: Only refresh the folders matching these prefixes, in full
+            (the root keys are left alone)
+        :param max_age: List folders in full when their last full listing is older (seconds)
+        :param full: List every folder in full
+        """
+        now = time.time()
+        known = {name: (marker, listed_at)
+                 for name, marker, listed_at in self.db.execute(
+                     'SELECT name, marker, listed_at FROM partitions')}
+        folders = set(bucket_mgr.list_common_prefixes(bucket_name))
+        gone = set(known) - folders - {''}
+        if prefixes is not None:
+            def selected(folder):
+                return any(folder.startswith(p) or p.startswith(folder) for p in prefixes)
+            folders = {f for f in folders if selected(f)}
+            gone = {f for f in gone if selected(f)}
+            full = True
+
+        relist, markers = [], {}
+        for folder in sorted(folders):
+            marker, listed_at = known.get(folder, (None, None))
+            if full or listed_at is None or (max_age is not None and now - listed_at > max_age):
+                relist.append(folder)
+            else:
+                markers[folder] = marker
+
+        stats = {'success': True, 'listed': len(relist), 'checked': len(markers),
+                 'removed': 0, 'added': 0}
+        with self.db:
+            if prefixes is None:
+                # Keys at the root come with the folder listing, replace them
+                self.db.execute("DELETE FROM objects WHERE instr(key, '/') = 0")
+                loose = list(bucket_mgr.list_objects(bucket_name, delimiter='/'))
+                self._insert(loose)
+                stats['added'] += len(loose)
+                self._set_partition('', None, now, now)
+            for folder in gone:
+                self._delete_range(folder)
+                self.db.execute('DELETE FROM partitions WHERE name = ?', (folder,))
+                stats['removed'] += 1
+            for folder in relist:
+                self._delete_range(folder)
+
+            last = dict(markers)
+            batch = []
+            records = bucket_mgr.list_objects_parallel(
+                bucket_name, partitions=relist + list(markers), workers=workers,
+                ordered=False, start_after=markers
+            )
+            for obj in records:
+                batch.append(obj)
+                folder = obj.key[:obj.key.index('/') + 1]
+                if last.get(folder) is None or obj.key > last[folder]:
+                    last[folder] = obj.key
+                if len(batch) >= _INSERT_BATCH:
+                    self._insert(batch)
+                    stats['added'] += len(batch)
+                    batch = []
+            self._insert(batch)
+            stats['added'] += len(batch)
+
+            for folder in relist:
+                self._set_partition(folder, last.get(folder), now, now)
+            for folder in markers:
+                self.db.execute('UPDATE partitions SET marker = ?, checked_at = ? WHERE name = ?',
+                                (last.get(folder), now, folder))
+        stats['objects'] = self.db.execute('SELECT count(*) FROM objects').fetchone()[0]
+        return stats
+
+    def _insert(self, objects: list):
+        self.db.executemany(
+            'INSERT OR REPLACE INTO objects (key, size, etag, last_modified) VALUES (?, ?, ?, ?)',
+            objects
+        )
+
+    def _delete_range(self, prefix: str):
+        self.db.execute('DELETE FROM objects WHERE key >= ? AND key < ?', _bounds(prefix))
+
+    def _set_partition(self, name, marker, listed_at, checked_at):
+        self.db.execute(
+            'INSERT OR REPLACE INTO partitions (name, marker, listed_at, checked_at) VALUES (?, ?, ?, ?)',
+            (name, marker, listed_at, checked_at)
+        )
+
+    # -- queries -------------------------------------------------------------
+
+    def list_objects(self, prefix: str = '', older_than: float = None):
+        """
+        Generator over the indexed ObjectInfo records under prefix in key
+        order, only those last modified more than older_than days ago if given.
+        """
+        sql, args = self._where(prefix)
+        if older_than is not None:
+            sql += ' AND last_modified < ?'
+            args += (_cutoff(older_than),)
+        cursor = self.db.execute(
+            f"SELECT key, size, etag, last_modified FROM objects WHERE {sql} ORDER BY key", args
+        )
+        for row in cursor:
+            yield ObjectInfo(*row)
+
+    def exists_any(self, prefix: str) -> bool:
+        """Same as BucketManager.exists_any: a key under prefix other than prefix itself."""
+        sql, args = self._where(prefix)
+        row = self.db.execute(f"SELECT 1 FROM objects WHERE {sql} AND key != ? LIMIT 1",
+                              args + (prefix,)).fetchone()
+        return row is not None
+
+    def summary(self, prefix: str = '', older_than: float = None) -> dict:
+        sql, args = self._where(prefix)
+        if older_than is not None:
+            sql += ' AND last_modified < ?'
+            args += (_cutoff(older_than),)
+        count, size = self.db.execute(
+            f"SELECT count(*), coalesce(sum(size), 0) FROM objects WHERE {sql}", args
+        ).fetchone()
+        return {'objects': count, 'bytes': size}
+
+    def partitions(self) -> list:
+        """(name, marker, listed_at, checked_at) of every indexed folder."""
+        return self.db.execute(
+            'SELECT name, marker, listed_at, checked_at FROM partitions ORDER BY name'
+        ).fetchall()
+
+    @staticmethod
+    def _where(prefix: str):
+        if not prefix:
+            return '1', ()
+        return 'key >= ? AND key < ?', _bounds(prefix)
+
+
+def _bounds(prefix: str) -> tuple:
+    """[low, high) key range of a prefix. SQLite compares TEXT as UTF-8 bytes, in code point order like S3."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _cutoff(days: float) -> str:
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    return cutoff.strftime('%Y-%m-%dT%H:%M:%S')
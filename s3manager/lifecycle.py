@@ -1,45 +1,104 @@
 import hashlib
 import base64
+import bisect
+import datetime
+import re
+import time
+from contextlib import contextmanager
 import requests
 import xml.etree.ElementTree as ET
-from xml.etree.ElementTree import Element, SubElement, tostring
+from xml.sax.saxutils import escape
 
 NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+# Maximum number of rules accepted in one bucket lifecycle configuration
+MAX_LIFECYCLE_RULES = 1000
+
+_XML_HEADER = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+# MM-YYYY at the end of a prefix ("05-2025/") or rule ID ("lifecycle-05-2025")
+_MONTH_YEAR = re.compile(r'(?:^|\D)(\d{2})-(\d{4})/?$')
+
 
 class LifecycleManager:
-    def __init__(self, auth):
+    def __init__(self, auth, cache_ttl: float = None):
+        """
+        :param auth: Authenticator
+        :param cache_ttl: Seconds a fetched configuration is reused, forever if None
+        """
         self.auth = auth
         self.rules = {}
+        self.cache_ttl = cache_ttl
+        # bucket -> LifecycleConfig, None when the bucket has no configuration
+        self._cache = {}
+        self._cached_at = {}
 
-    def get_lifecycle(self, bucket_name: str) -> str:
-        headers, url = self.auth.sign('GET', bucket=bucket_name, subresource='?lifecycle')
-        resp = requests.get(url, headers=headers)
+    def get_lifecycle(self, bucket_name: str, refresh: bool = False) -> str:
+        if not refresh and self._fresh(bucket_name):
+            config = self._cache[bucket_name]
+            return config.serialize().decode('utf-8') if config is not None else ''
+        resp = self.auth.request('GET', bucket=bucket_name, subresource='?lifecycle')
         if resp.status_code == 404:
+            self._store(bucket_name, None)
             return ''
         resp.raise_for_status()
+        try:
+            self._store(bucket_name, LifecycleConfig.parse(resp.content) if resp.content else None)
+        except (ET.ParseError, ValueError):
+            self.invalidate(bucket_name)
         return resp.text
 
+    def get_config(self, bucket_name: str, refresh: bool = False) -> 'LifecycleConfig':
+        """
+        Working copy of the bucket configuration, fetched once then cached,
+        empty if the bucket has none. ValueError if it cannot be parsed.
+        """
+        if refresh or not self._fresh(bucket_name):
+            self.get_lifecycle(bucket_name, refresh=True)
+        if bucket_name not in self._cache:
+            raise ValueError(f"Cannot parse the lifecycle configuration of {bucket_name}")
+        config = self._cache[bucket_name]
+        return config.copy() if config is not None else LifecycleConfig()
+
+    def invalidate(self, bucket_name: str = None):
+        """Drop the cached configuration of one bucket, or of all buckets."""
+        if bucket_name is None:
+            self._cache.clear()
+            self._cached_at.clear()
+        else:
+            self._cache.pop(bucket_name, None)
+            self._cached_at.pop(bucket_name, None)
+
+    def _store(self, bucket_name: str, config):
+        self._cache[bucket_name] = config
+        self._cached_at[bucket_name] = time.monotonic()
+
+    def _fresh(self, bucket_name: str) -> bool:
+        if bucket_name not in self._cache:
+            return False
+        return (self.cache_ttl is None
+                or time.monotonic() - self._cached_at.get(bucket_name, 0) < self.cache_ttl)
+
     def list_rules(self, bucket_name: str) -> list:
-        xml = self.get_lifecycle(bucket_name)
-        if not xml:
-            return []
-        root = ET.fromstring(xml)
-        rules = []
-        for rule_el in root.findall(f'{{{NS}}}Rule'):
-            rules.append(rule_el.find(f'{{{NS}}}ID').text)
-        return rules
+        return self.get_config(bucket_name).ids()
+
+    @contextmanager
+    def transaction(self, bucket_name: str):
+        """
+        Queue several rule additions and removals and flush them as one PUT
+        when the block exits without error.
+
+            with lm.transaction(bucket) as tx:
+                tx.remove_rule('lifecycle-04-2015')
+                tx.add_date_rule('lifecycle-05-2025', '05-2025/', date_str)
+        """
+        tx = LifecycleTransaction(self.get_config(bucket_name))
+        yield tx
+        if tx.changed:
+            self._put_lifecycle(bucket_name, tx.config)
 
     def remove_rule(self, bucket_name: str, rule_id: str) -> dict:
-        xml = self.get_lifecycle(bucket_name)
-        root = ET.fromstring(xml) if xml else Element('LifecycleConfiguration', xmlns=NS)
-        for rule_el in root.findall(f'{{{NS}}}Rule'):
-            rid_el = rule_el.find(f'{{{NS}}}ID')
-            if rid_el is not None and rid_el.text == rule_id:
-                root.remove(rule_el)
-                break
-        else:
-            return {'error': 'rule not found', 'name': rule_id}
-        self._put_lifecycle(bucket_name, root)
+        with self.transaction(bucket_name) as tx:
+            if not tx.remove_rule(rule_id):
+                return {'error': 'rule not found', 'name': rule_id}
         return {'removed': rule_id}
 
     def create_rule(
@@ -75,46 +134,38 @@ class LifecycleManager:
         return self.apply_expiration_lifecycle(bucket_name, days=days, rule_id=rule_name)
 
     def apply_delete_marker_lifecycle(self, bucket_name: str, rule_id: str = None) -> dict:
-        xml = self.get_lifecycle(bucket_name)
-        root = ET.fromstring(xml) if xml else Element('LifecycleConfiguration', xmlns=NS)
-        rule = SubElement(root, 'Rule')
-        SubElement(rule, 'ID').text = rule_id or 'remove-expired-markers'
-        SubElement(rule, 'Filter')
-        SubElement(rule, 'Status').text = 'Enabled'
-        exp = SubElement(rule, 'Expiration')
-        SubElement(exp, 'ExpiredObjectDeleteMarker').text = 'true'
-        return self._put_lifecycle(bucket_name, root)
+        with self.transaction(bucket_name) as tx:
+            tx.add_delete_marker_rule(rule_id or 'remove-expired-markers')
+        return {'success': True}
 
     def apply_expiration_lifecycle(self, bucket_name: str, days: int, rule_id: str = None) -> dict:
-        xml = self.get_lifecycle(bucket_name)
-        root = ET.fromstring(xml) if xml else Element('LifecycleConfiguration', xmlns=NS)
-        rule = SubElement(root, 'Rule')
-        SubElement(rule, 'ID').text = rule_id or f'expire-after-{days}-days'
-        SubElement(rule, 'Filter')
-        SubElement(rule, 'Status').text = 'Enabled'
-        exp = SubElement(rule, 'Expiration')
-        SubElement(exp, 'Days').text = str(days)
-        return self._put_lifecycle(bucket_name, root)
-
-    def _put_lifecycle(self, bucket_name: str, root: Element) -> dict:
-        raw = tostring(root, encoding='utf-8')
-        body = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + raw
-        digest = hashlib.md5(body).digest()
-        md5_b64 = base64.b64encode(digest).decode('utf-8')
-        headers = {
-            'Content-Type': 'application/xml',
-            'Content-MD5': md5_b64,
-            'Content-Length': str(len(body))
-        }
-        signed_headers, url = self.auth.sign(
-            'PUT', bucket=bucket_name, subresource='?lifecycle', headers=headers, payload=body
-        )
-        resp = requests.put(url, headers=signed_headers, data=body)
-        resp.raise_for_status()
+        with self.transaction(bucket_name) as tx:
+            tx.add_days_rule(rule_id or f'expire-after-{days}-days', days)
+        return {'success': True}
+
+    def delete_lifecycle(self, bucket_name: str) -> dict:
+        try:
+            resp = self.auth.request('DELETE', bucket=bucket_name, subresource='?lifecycle')
+            resp.raise_for_status()
+        except Exception:
+            self.invalidate(bucket_name)
+            raise
+        self._store(bucket_name, None)
+        return {'success': True}
+
+    def _put_lifecycle(self, bucket_name: str, config: 'LifecycleConfig') -> dict:
+        # An empty LifecycleConfiguration is rejected, drop the subresource instead
+        if not config:
+            return self.delete_lifecycle(bucket_name)
+        # Cache the rules as they are instead of parsing the document just built
+        self._put_xml(bucket_name, config.serialize(), config.copy())
         return {'success': True}
 
     def apply_lifecycle_with_xml(self, bucket_name: str, xml_body: bytes) -> requests.Response:
         """Apply a full lifecycle XML body directly to the bucket."""
+        return self._put_xml(bucket_name, xml_body)
+
+    def _put_xml(self, bucket_name: str, xml_body: bytes, config: 'LifecycleConfig' = None) -> requests.Response:
         digest = hashlib.md5(xml_body).digest()
         md5_b64 = base64.b64encode(digest).decode('utf-8')
         headers = {
@@ -122,25 +173,330 @@ class LifecycleManager:
             'Content-MD5': md5_b64,
             'Content-Length': str(len(xml_body))
         }
-        signed_headers, url = self.auth.sign(
-            'PUT', bucket=bucket_name, subresource='?lifecycle', headers=headers, payload=xml_body
-        )
-        resp = requests.put(url, headers=signed_headers, data=xml_body)
-        resp.raise_for_status()
+        try:
+            resp = self.auth.request(
+                'PUT', bucket=bucket_name, subresource='?lifecycle', headers=headers, payload=xml_body
+            )
+            resp.raise_for_status()
+            self._store(bucket_name, config if config is not None else LifecycleConfig.parse(xml_body))
+        except Exception:
+            self.invalidate(bucket_name)
+            raise
         return resp
 
+    def plan_sync(self, bucket_name: str, desired: list, managed: str = 'lifecycle-') -> dict:
+        """
+        Compare the rules of the bucket whose ID starts with `managed` to the
+        desired LifecycleRules by digest of their content.
+        The configuration is fetched again, not taken from the cache.
+
+        Returns {'add': [rule], 'change': [(rule, current)], 'remove': [current],
+        'unchanged': [rule]}. Rules with other IDs are left out of the plan.
+        """
+        config = self.get_config(bucket_name, refresh=True)
+        current = {rule.id: rule for rule in config if rule.id.startswith(managed)}
+        plan = {'add': [], 'change': [], 'remove': [], 'unchanged': []}
+        for rule in desired:
+            existing = current.pop(rule.id, None)
+            if existing is None:
+                plan['add'].append(rule)
+            elif existing.digest() != rule.digest():
+                plan['change'].append((rule, existing))
+            else:
+                plan['unchanged'].append(rule)
+        plan['remove'] = list(current.values())
+        return plan
+
+    def apply_sync(self, bucket_name: str, plan: dict, max_rules: int = MAX_LIFECYCLE_RULES) -> dict:
+        """Write a plan_sync() plan in one PUT (or DELETE when no rule is left), nothing if empty."""
+        if not (plan['add'] or plan['change'] or plan['remove']):
+            return {'success': True, 'changed': False}
+        with self.transaction(bucket_name) as tx:
+            for rule in plan['remove']:
+                tx.remove_rule(rule.id)
+            for rule in plan['add'] + [new for new, _ in plan['change']]:
+                tx.add(rule)
+            if len(tx.config) > max_rules:
+                raise ValueError(f"{len(tx.config)} rules exceed the limit of {max_rules} rules per bucket")
+        return {'success': True, 'changed': True}
+
+
+class LifecycleRule:
+    """
+    One lifecycle rule. Elements the model does not cover (transitions, tag
+    filters...) are kept as canonical XML fragments in `extra`, so rewriting
+    a configuration never drops them. Rules are not modified once created.
+    """
+
+    __slots__ = ('id', 'prefix', 'status', 'date', 'days', 'delete_marker', 'noncurrent_days', 'extra',
+                 'date_key')
+
+    def __init__(
+        self,
+        rule_id: str,
+        prefix: str = None,
+        status: str = 'Enabled',
+        date: str = None,
+        days: int = None,
+        delete_marker: bool = False,
+        noncurrent_days: int = None,
+        extra: tuple = ()
+    ):
+        self.id = rule_id
+        # An empty Filter and an empty Prefix both select the whole bucket
+        self.prefix = prefix or None
+        self.status = status
+        # Expiration dates are midnight UTC, ECS may add milliseconds
+        self.date = f"{date[:10]}T00:00:00Z" if date else None
+        self.days = int(days) if days is not None else None
+        self.delete_marker = bool(delete_marker)
+        self.noncurrent_days = int(noncurrent_days) if noncurrent_days is not None else None
+        self.extra = tuple(extra)
+        # (year, month) of the MM-YYYY prefix of the rule, else of its ID, or None
+        self.date_key = _date_key(self.prefix, rule_id)
+
+    @classmethod
+    def from_element(cls, rule_el) -> 'LifecycleRule':
+        """Rule from a parsed <Rule> element, namespaced or not."""
+        rule_id, prefix, status, noncurrent_days, expiration, extra = '', None, 'Enabled', None, {}, []
+        for child in rule_el:
+            tag = child.tag.rpartition('}')[2]
+            if tag == 'ID':
+                rule_id = child.text or ''
+            elif tag == 'Status':
+                status = (child.text or '').strip()
+            elif tag == 'Prefix':
+                # Legacy rule-level prefix, written back as a Filter
+                prefix = child.text
+            elif tag == 'Filter' and _only_child(child, 'Prefix'):
+                prefix = child[0].text if len(child) else None
+            elif tag == 'NoncurrentVersionExpiration' and len(child) and _only_child(child, 'NoncurrentDays'):
+                noncurrent_days = child[0].text
+            elif not (tag == 'Expiration' and _read_expiration(child, expiration)):
+                extra.append(_fragment(child))
+        return cls(rule_id, prefix, status, noncurrent_days=noncurrent_days, extra=extra, **expiration)
+
+    def content(self) -> tuple:
+        """Everything but the ID, equal for rules with the same effect."""
+        return (self.prefix, self.status, self.date, self.days, self.delete_marker,
+                self.noncurrent_days, self.extra)
+
+    def digest(self) -> str:
+        return hashlib.sha256(repr(self.content()).encode('utf-8')).hexdigest()
+
+    def to_xml(self) -> str:
+        parts = ['<Rule><ID>', escape(self.id), '</ID>']
+        # A Filter the model does not cover (tags, And) keeps its place
+        filters = [x for x in self.extra if x.startswith('<Filter')] if self.prefix is None else []
+        if self.prefix is not None:
+            parts += ['<Filter><Prefix>', escape(self.prefix), '</Prefix></Filter>']
+        else:
+            parts.extend(filters or ['<Filter />'])
+        parts += ['<Status>', escape(self.status), '</Status>']
+        if self.date or self.days is not None or self.delete_marker:
+            parts.append('<Expiration>')
+            if self.date:
+                parts += ['<Date>', self.date, '</Date>']
+            if self.days is not None:
+                parts += ['<Days>', str(self.days), '</Days>']
+            if self.delete_marker:
+                parts.append('<ExpiredObjectDeleteMarker>true</ExpiredObjectDeleteMarker>')
+            parts.append('</Expiration>')
+        if self.noncurrent_days is not None:
+            parts += ['<NoncurrentVersionExpiration><NoncurrentDays>', str(self.noncurrent_days),
+                      '</NoncurrentDays></NoncurrentVersionExpiration>']
+        parts.extend(x for x in self.extra if x not in filters)
+        parts.append('</Rule>')
+        return ''.join(parts)
+
+    def __eq__(self, other):
+        return isinstance(other, LifecycleRule) and self.id == other.id and self.content() == other.content()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"LifecycleRule({self.id!r}, prefix={self.prefix!r}, date={self.date!r}, days={self.days!r})"
+
+
+class LifecycleConfig:
+    """
+    Rules of a bucket lifecycle configuration in document order, indexed by
+    ID and by the MM-YYYY date of their prefix.
+    """
+
+    __slots__ = ('_rules', '_dated')
+
+    def __init__(self, rules=()):
+        self._rules = {}  # id -> LifecycleRule
+        for rule in rules:
+            # A later rule with the same ID replaces the earlier one and goes last
+            self._rules.pop(rule.id, None)
+            self._rules[rule.id] = rule
+        # sorted (date_key, id)
+        self._dated = sorted((rule.date_key, rule.id) for rule in self._rules.values()
+                             if rule.date_key is not None)
+
+    @classmethod
+    def parse(cls, data: bytes) -> 'LifecycleConfig':
+        """Parse a LifecycleConfiguration document (ET.ParseError if malformed)."""
+        root = ET.fromstring(data)
+        return cls(LifecycleRule.from_element(el) for el in root if _local(el.tag) == 'Rule')
+
+    def serialize(self) -> bytes:
+        """Canonical document: serialize(parse(serialize(c))) is byte-identical."""
+        body = ''.join(rule.to_xml() for rule in self._rules.values())
+        return _XML_HEADER + f'<LifecycleConfiguration xmlns="{NS}">{body}</LifecycleConfiguration>'.encode('utf-8')
+
+    def add(self, rule: LifecycleRule):
+        """Add a rule; it replaces the rule with the same ID and goes last."""
+        self.remove(rule.id)
+        self._rules[rule.id] = rule
+        key = rule.date_key
+        if key is not None:
+            bisect.insort(self._dated, (key, rule.id))
+
+    def remove(self, rule_id: str) -> bool:
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return False
+        key = rule.date_key
+        if key is not None:
+            del self._dated[bisect.bisect_left(self._dated, (key, rule_id))]
+        return True
+
+    def get(self, rule_id: str) -> LifecycleRule:
+        return self._rules.get(rule_id)
+
+    def ids(self) -> list:
+        return list(self._rules)
+
+    def dated(self, id_prefix: str = ''):
+        """Rules with a prefix date whose ID starts with id_prefix, oldest first."""
+        for _, rule_id in self._dated:
+            if rule_id.startswith(id_prefix):
+                yield self._rules[rule_id]
+
+    def oldest(self, id_prefix: str = '') -> LifecycleRule:
+        return next(self.dated(id_prefix), None)
+
+    def newest(self, id_prefix: str = '') -> LifecycleRule:
+        for _, rule_id in reversed(self._dated):
+            if rule_id.startswith(id_prefix):
+                return self._rules[rule_id]
+        return None
+
+    def copy(self) -> 'LifecycleConfig':
+        config = LifecycleConfig()
+        config._rules = dict(self._rules)
+        config._dated = list(self._dated)
+        return config
+
+    def __iter__(self):
+        return iter(list(self._rules.values()))
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __contains__(self, rule_id):
+        return rule_id in self._rules
+
+
+class LifecycleTransaction:
+    """Pending edits on a working copy of one bucket lifecycle configuration."""
+
+    def __init__(self, config: LifecycleConfig):
+        self.config = config
+        self.changed = False
+
+    def rule_ids(self) -> list:
+        return self.config.ids()
+
+    def remove_rule(self, rule_id: str) -> bool:
+        removed = self.config.remove(rule_id)
+        self.changed = self.changed or removed
+        return removed
+
+    def add(self, rule: LifecycleRule):
+        # Rule IDs are unique within a configuration, a new rule replaces the old one
+        self.config.add(rule)
+        self.changed = True
+
+    def add_date_rule(self, rule_id: str, prefix: str, date_str: str):
+        self.add(LifecycleRule(rule_id, prefix, date=date_str))
+
+    def add_days_rule(self, rule_id: str, days: int, prefix: str = None):
+        self.add(LifecycleRule(rule_id, prefix, days=days))
+
+    def add_delete_marker_rule(self, rule_id: str, prefix: str = None):
+        self.add(LifecycleRule(rule_id, prefix, delete_marker=True))
+
+
+def _local(tag: str) -> str:
+    """Strip the XML namespace from an element tag."""
+    return tag.rpartition('}')[2]
+
+
+def _fragment(el) -> str:
+    """Canonical XML of an element: no namespaces, no whitespace-only text."""
+    for node in el.iter():
+        node.tag = _local(node.tag)
+        if node.text is not None and not node.text.strip():
+            node.text = None
+        node.tail = None
+    return ET.tostring(el, encoding='unicode')
+
+
+def _only_child(el, tag: str) -> bool:
+    """True if el is empty or holds a single <tag> element."""
+    return len(el) == 0 or (len(el) == 1 and _local(el[0].tag) == tag)
+
+
+def _read_expiration(el, fields: dict) -> bool:
+    """Store the fields of an <Expiration> element, False if it holds anything else."""
+    found = {}
+    for child in el:
+        tag = child.tag.rpartition('}')[2]
+        text = (child.text or '').strip()
+        if tag == 'Date':
+            found['date'] = text
+        elif tag == 'Days':
+            found['days'] = text
+        elif tag == 'ExpiredObjectDeleteMarker':
+            found['delete_marker'] = text == 'true'
+        else:
+            return False
+    fields.update(found)
+    return True
+
+
+def _date_key(prefix: str, rule_id: str):
+    for text in (prefix, rule_id):
+        match = _MONTH_YEAR.search(text) if text else None
+        if match:
+            month, year = match.groups()
+            if '01' <= month <= '12':
+                return int(year), int(month)
+    return None
+
+
+def expiration_date_for_prefix(prefix: str, years: int) -> str:
+    """Expiration date of a MM-YYYY prefix: first day of the month plus `years`."""
+    month, year = prefix.rstrip('/').split('-')
+    from dateutil.relativedelta import relativedelta
+    expire = datetime.date(int(year), int(month), 1) + relativedelta(years=years)
+    return expire.strftime('%Y-%m-%dT00:00:00Z')
+
+
+def date_rules_for_prefixes(prefixes, years: int) -> list:
+    """LifecycleRules expiring each MM-YYYY prefix `years` after its month."""
+    return [
+        LifecycleRule(f"lifecycle-{prefix}", prefix + '/', date=expiration_date_for_prefix(prefix, years))
+        for prefix in prefixes
+    ]
+
 
 def build_lifecycle_with_date(rule_id: str, prefix: str, date_str: str) -> bytes:
     """
     Build XML for a LifecycleConfiguration with a Date expiration.
     """
-    root = Element('LifecycleConfiguration', xmlns=NS)
-    rule = SubElement(root, 'Rule')
-    SubElement(rule, 'ID').text = rule_id
-    flt = SubElement(rule, 'Filter')
-    SubElement(flt, 'Prefix').text = prefix
-    SubElement(rule, 'Status').text = 'Enabled'
-    exp = SubElement(rule, 'Expiration')
-    SubElement(exp, 'Date').text = date_str
-    raw = tostring(root, encoding='utf-8')
-    return b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + raw
\ No newline at end of file
+    return LifecycleConfig([LifecycleRule(rule_id, prefix, date=date_str)]).serialize()
@@ -0,0 +1,765 @@
+"""
+In-process ECS/S3 stand-in for offline tests and benchmarks.
+
+    with LocalECSServer({'AKID': ('secret', 'ns1')}, latency=0.005) as server:
+        server.create_bucket('ns1', 'bucket1')
+        ... point a profile endpoint at server.url ...
+
+It verifies v2 and v4 signatures, in headers or pre-signed URLs, with its
+own implementation of the AWS canonicalization rules rather than the
+client's S3Signer, so that signing bugs show up as SignatureDoesNotMatch,
+and the x-amz-content-sha256 of v4 requests. It scopes
+buckets by x-emc-namespace, and implements the subset of the API this
+tool uses: buckets, versioning, objects (ranges, multipart, server-side
+copies, Content-Type and x-amz-meta-* metadata), ListObjectsV2, ListObjectVersions, lifecycle and Multi-Object Delete. Latency, error
+rates and a concurrency cap can be injected to exercise retries and
+measure throughput.
+"""
+import base64
+import bisect
+import datetime
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+# Query parameters that belong to the v2 canonical resource
+_V2_SUBRESOURCES = frozenset([
+    'acl', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'notification',
+    'partNumber', 'policy', 'requestPayment', 'tagging', 'torrent', 'uploadId',
+    'uploads', 'versionId', 'versioning', 'versions', 'website',
+    'response-cache-control', 'response-content-disposition',
+    'response-content-encoding', 'response-content-language',
+    'response-content-type', 'response-expires',
+])
+
+NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+class S3Error(Exception):
+    def __init__(self, status: int, code: str, message: str = ''):
+        super().__init__(message or code)
+        self.status = status
+        self.code = code
+        self.message = message or code
+
+
+class _Version:
+    __slots__ = ('version_id', 'data', 'etag', 'last_modified', 'tags', 'headers')
+
+    def __init__(self, version_id, data, etag=None, tags=None, headers=None):
+        self.version_id = version_id
+        self.data = data  # None for a delete marker
+        self.etag = etag or (hashlib.md5(data).hexdigest() if data is not None else '')
+        self.last_modified = datetime.datetime.utcnow()
+        self.tags = tags or {}
+        self.headers = headers or {}  # Content-Type and x-amz-meta-*
+
+
+class _Bucket:
+    def __init__(self):
+        self.versioning = ''
+        self.lifecycle = None
+        self.tagging = {}
+        self.versions = {}  # key -> [_Version], oldest first
+        self.keys = []      # sorted keys that have at least one version
+        self.uploads = {}   # upload id -> (key, {part number: bytes}, headers)
+        self.lock = threading.RLock()
+
+    def current(self, key):
+        versions = self.versions.get(key)
+        if versions and versions[-1].data is not None:
+            return versions[-1]
+        return None
+
+    def put(self, key, data, etag=None, headers=None):
+        with self.lock:
+            version_id = uuid.uuid4().hex if self.versioning == 'Enabled' else 'null'
+            version = _Version(version_id, data, etag, headers=headers)
+            versions = self.versions.get(key)
+            if versions is None:
+                self.versions[key] = [version]
+                bisect.insort(self.keys, key)
+            else:
+                if version_id == 'null':
+                    versions[:] = [v for v in versions if v.version_id != 'null']
+                versions.append(version)
+            return version
+
+    def delete(self, key, version_id=None):
+        """Returns (version_id, delete_marker) of what was removed or created."""
+        with self.lock:
+            versions = self.versions.get(key, [])
+            if version_id:
+                remaining = [v for v in versions if v.version_id != version_id]
+                marker = any(v.version_id == version_id and v.data is None for v in versions)
+                self._set(key, remaining)
+                return version_id, marker
+            if self.versioning:
+                marker_id = uuid.uuid4().hex if self.versioning == 'Enabled' else 'null'
+                if marker_id == 'null':
+                    versions = [v for v in versions if v.version_id != 'null']
+                self._set(key, versions + [_Version(marker_id, None)])
+                return marker_id, True
+            self._set(key, [])
+            return None, False
+
+    def _set(self, key, versions):
+        if versions:
+            if key not in self.versions:
+                bisect.insort(self.keys, key)
+            self.versions[key] = versions
+        elif key in self.versions:
+            del self.versions[key]
+            self.keys.pop(bisect.bisect_left(self.keys, key))
+
+
+def _uri_encode(value: str, slash: bool = True) -> str:
+    """SigV4 URI encoding: every byte but A-Z a-z 0-9 - _ . ~ (and / in paths) as %XX."""
+    return quote(value, safe='-_.~/' if slash else '-_.~')
+
+
+def _query_pairs(query: str) -> list:
+    """Decoded (name, value) pairs of a raw query string, '+' kept as is."""
+    pairs = []
+    for item in query.split('&') if query else []:
+        name, _, value = item.partition('=')
+        pairs.append((unquote(name), unquote(value)))
+    return pairs
+
+
+def _v2_resource(raw_path: str) -> str:
+    path, _, query = raw_path.partition('?')
+    signed = sorted((k, v) for k, v in _query_pairs(query) if k in _V2_SUBRESOURCES)
+    if not signed:
+        return path
+    return path + '?' + '&'.join(f"{k}={v}" if v else k for k, v in signed)
+
+
+def _v4_key(secret: str, datestamp: str, region: str, service: str) -> bytes:
+    key = ('AWS4' + secret).encode('utf-8')
+    for part in (datestamp, region, service, 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    return key
+
+
+def _v4_signature(secret: str, amz_date: str, scope: str, canonical_request: str) -> str:
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    datestamp, region, service, _ = scope.split('/')
+    key = _v4_key(secret, datestamp, region, service)
+    return hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _v4_canonical_query(query: str, exclude: str = None) -> str:
+    pairs = sorted((_uri_encode(k, False), _uri_encode(v, False))
+                   for k, v in _query_pairs(query) if k != exclude)
+    return '&'.join(f"{k}={v}" for k, v in pairs)
+
+
+class LocalECSServer:
+    def __init__(
+        self,
+        credentials: dict,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency=0.0,
+        error_rate: float = 0.0,
+        max_in_flight: int = None,
+        seed: int = None
+    ):
+        """
+        :param credentials: {access_key: (secret_key, namespace)}
+        :param latency: Seconds added to every request, or a (min, max) range
+        :param error_rate: Probability of answering 503 SlowDown instead of serving
+        :param max_in_flight: Answer 503 SlowDown to requests beyond this many concurrent ones
+        :param seed: Seed of the random generator used for latency and errors
+        """
+        self.credentials = credentials
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.random = random.Random(seed)
+        self.buckets = {}  # (namespace, bucket) -> _Bucket
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.injected_errors = 0
+        self.latencies = []  # seconds spent serving each request
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.ecs = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'LocalECSServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def create_bucket(self, namespace: str, name: str, versioning: bool = False) -> _Bucket:
+        with self.lock:
+            bucket = self.buckets.setdefault((namespace, name), _Bucket())
+        if versioning:
+            bucket.versioning = 'Enabled'
+        return bucket
+
+    def bucket(self, namespace: str, name: str) -> _Bucket:
+        bucket = self.buckets.get((namespace, name))
+        if bucket is None:
+            raise S3Error(404, 'NoSuchBucket', f"Bucket {name} does not exist")
+        return bucket
+
+    def reset_stats(self):
+        with self.lock:
+            self.request_count = 0
+            self.injected_errors = 0
+            self.latencies = []
+
+    def _delay(self):
+        with self.lock:
+            self.request_count += 1
+            latency = self.latency
+            if isinstance(latency, (tuple, list)):
+                latency = self.random.uniform(*latency)
+            fail = ((self.error_rate and self.random.random() < self.error_rate)
+                    or (self.max_in_flight and self.in_flight > self.max_in_flight))
+            if fail:
+                self.injected_errors += 1
+        if latency:
+            time.sleep(latency)
+        if fail:
+            raise S3Error(503, 'SlowDown', 'Please reduce your request rate.')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without TCP_NODELAY small
+    # bodies wait for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        # Clients drop kept-alive connections, e.g. when they stop reading a listing
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+    def do_GET(self):
+        self._dispatch()
+
+    do_PUT = do_POST = do_DELETE = do_HEAD = do_GET
+
+    def _dispatch(self):
+        ecs = self.server.ecs
+        started = time.perf_counter()
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        parsed = urlparse(self.path)
+        self.query = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        parts = parsed.path.lstrip('/').split('/', 1)
+        self.bucket_name = unquote(parts[0])
+        self.key = unquote(parts[1]) if len(parts) > 1 else ''
+        with ecs.lock:
+            ecs.in_flight += 1
+        try:
+            ecs._delay()
+            self.namespace = self._authenticate()
+            method = getattr(self, f"_{'object' if self.key else 'bucket'}_{self.command.lower()}")
+            method()
+        except S3Error as e:
+            self._error(e)
+        except ET.ParseError:
+            self._error(S3Error(400, 'MalformedXML'))
+        elapsed = time.perf_counter() - started
+        with ecs.lock:
+            ecs.in_flight -= 1
+            ecs.latencies.append(elapsed)
+
+    # -- authentication ---------------------------------------------------
+
+    def _authenticate(self) -> str:
+        ecs = self.server.ecs
+        auth = self.headers.get('Authorization', '')
+        if auth.startswith('AWS4-HMAC-SHA256 '):
+            access_key, auth, expected = self._v4_expected(auth)
+        elif auth.startswith('AWS '):
+            access_key = auth[4:].rsplit(':', 1)[0]
+            expected = self._v2_expected(access_key)
+        elif 'AWSAccessKeyId' in self.query:
+            access_key = self.query['AWSAccessKeyId']
+            if int(self.query.get('Expires', 0)) < time.time():
+                raise S3Error(403, 'AccessDenied', 'Request has expired')
+            expected = self._v2_query_expected(access_key)
+            auth = self.query.get('Signature')
+        elif self.query.get('X-Amz-Algorithm') == 'AWS4-HMAC-SHA256':
+            access_key, expected = self._v4_query_expected()
+            auth = self.query.get('X-Amz-Signature', '')
+        else:
+            raise S3Error(403, 'AccessDenied', 'Anonymous access is not allowed')
+        if access_key not in ecs.credentials:
+            raise S3Error(403, 'InvalidAccessKeyId')
+        if not hmac.compare_digest(auth, expected):
+            raise S3Error(403, 'SignatureDoesNotMatch')
+
+        namespace = self.headers.get('x-emc-namespace') or ecs.credentials[access_key][1]
+        if namespace != ecs.credentials[access_key][1]:
+            raise S3Error(403, 'AccessDenied', f"Not allowed in namespace {namespace}")
+        if self.headers.get('Content-MD5') is not None:
+            digest = base64.b64encode(hashlib.md5(self.body).digest()).decode()
+            if digest != self.headers['Content-MD5']:
+                raise S3Error(400, 'BadDigest')
+        return namespace
+
+    def _v2_expected(self, access_key: str) -> str:
+        secret = self.server.ecs.credentials.get(access_key, ('',))[0]
+        amz = {}
+        for k, v in self.headers.items():
+            name = k.lower()
+            if name.startswith(('x-amz-', 'x-emc-')):
+                amz.setdefault(name, []).append(v.strip())
+        # x-amz-date replaces Date, which is then signed as an empty line
+        date = '' if 'x-amz-date' in amz else self.headers.get('Date', '')
+        string_to_sign = '\n'.join([
+            self.command,
+            self.headers.get('Content-MD5', ''),
+            self.headers.get('Content-Type', ''),
+            date,
+            ''.join(f"{k}:{','.join(amz[k])}\n" for k in sorted(amz)) + _v2_resource(self.path)
+        ])
+        mac = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), hashlib.sha1)
+        return f"AWS {access_key}:{base64.b64encode(mac.digest()).decode()}"
+
+    def _v2_query_expected(self, access_key: str) -> str:
+        secret = self.server.ecs.credentials.get(access_key, ('',))[0]
+        string_to_sign = f"{self.command}\n\n\n{self.query.get('Expires')}\n{_v2_resource(self.path)}"
+        mac = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), hashlib.sha1)
+        return base64.b64encode(mac.digest()).decode()
+
+    def _v4_query_expected(self) -> tuple:
+        access_key, datestamp, region, service, _ = self.query.get('X-Amz-Credential', '////').split('/')
+        secret = self.server.ecs.credentials.get(access_key, ('',))[0]
+        amz_date = self.query.get('X-Amz-Date', '')
+        signed_at = datetime.datetime.strptime(amz_date, '%Y%m%dT%H%M%SZ')
+        if signed_at + datetime.timedelta(seconds=int(self.query.get('X-Amz-Expires', 0))) < datetime.datetime.utcnow():
+            raise S3Error(403, 'AccessDenied', 'Request has expired')
+        path, _, query = self.path.partition('?')
+        canonical_request = '\n'.join([
+            self.command, _uri_encode(unquote(path)), _v4_canonical_query(query, exclude='X-Amz-Signature'),
+            f"host:{self.headers.get('Host', '')}\n", 'host', UNSIGNED_PAYLOAD
+        ])
+        scope = f"{datestamp}/{region}/{service}/aws4_request"
+        return access_key, _v4_signature(secret, amz_date, scope, canonical_request)
+
+    def _v4_expected(self, auth: str) -> tuple:
+        """(access key, signature, expected signature) of a header-signed v4 request."""
+        fields = dict(item.strip().split('=', 1) for item in auth[len('AWS4-HMAC-SHA256 '):].split(','))
+        access_key, datestamp, _ = fields['Credential'].split('/', 2)
+        scope = fields['Credential'].split('/', 1)[1]
+        secret = self.server.ecs.credentials.get(access_key, ('',))[0]
+        amz_date = self.headers.get('x-amz-date', '')
+        if amz_date[:8] != datestamp:
+            raise S3Error(403, 'SignatureDoesNotMatch', 'x-amz-date does not match the credential scope')
+
+        signed_headers = fields['SignedHeaders'].split(';')
+        unsigned = [k.lower() for k in self.headers if k.lower().startswith('x-amz-')
+                    and k.lower() not in signed_headers]
+        if 'host' not in signed_headers or unsigned:
+            raise S3Error(403, 'AccessDenied', f"Headers not signed: {', '.join(unsigned) or 'host'}")
+        payload_hash = self.headers.get('x-amz-content-sha256')
+        if payload_hash is None:
+            raise S3Error(400, 'InvalidRequest', 'Missing x-amz-content-sha256')
+        if payload_hash != UNSIGNED_PAYLOAD and payload_hash != hashlib.sha256(self.body).hexdigest():
+            raise S3Error(400, 'XAmzContentSHA256Mismatch')
+
+        canonical_headers = ''.join(
+            f"{name}:{','.join(' '.join(v.split()) for v in self.headers.get_all(name, []))}\n"
+            for name in signed_headers
+        )
+        path, _, query = self.path.partition('?')
+        canonical_request = '\n'.join([
+            self.command, _uri_encode(unquote(path)), _v4_canonical_query(query),
+            canonical_headers, fields['SignedHeaders'], payload_hash
+        ])
+        return access_key, fields['Signature'], _v4_signature(secret, amz_date, scope, canonical_request)
+
+    # -- responses ----------------------------------------------------------
+
+    def _send(self, status: int, body: bytes = b'', headers: dict = None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if 'Content-Length' not in (headers or {}):
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _xml(self, body: str, status: int = 200):
+        self._send(status, ('<?xml version="1.0" encoding="UTF-8"?>' + body).encode('utf-8'),
+                   {'Content-Type': 'application/xml'})
+
+    def _error(self, e: S3Error):
+        self._xml(f"<Error><Code>{e.code}</Code><Message>{escape(e.message)}</Message>"
+                  f"<Resource>{escape(self.path)}</Resource></Error>", e.status)
+
+    def _bucket(self) -> _Bucket:
+        return self.server.ecs.bucket(self.namespace, self.bucket_name)
+
+    # -- bucket operations ----------------------------------------------------
+
+    def _bucket_put(self):
+        ecs = self.server.ecs
+        if 'versioning' in self.query:
+            status = _find_text(self.body, 'Status')
+            self._bucket().versioning = status or ''
+        elif 'lifecycle' in self.query:
+            ET.fromstring(self.body)
+            self._bucket().lifecycle = self.body
+        elif 'tagging' in self.query:
+            self._bucket().tagging = _parse_tags(self.body)
+        else:
+            if (self.namespace, self.bucket_name) in ecs.buckets:
+                raise S3Error(409, 'BucketAlreadyExists')
+            ecs.create_bucket(self.namespace, self.bucket_name)
+        self._send(200)
+
+    def _bucket_head(self):
+        self._bucket()
+        self._send(200)
+
+    def _bucket_delete(self):
+        bucket = self._bucket()
+        if 'lifecycle' in self.query:
+            bucket.lifecycle = None
+        elif 'tagging' in self.query:
+            bucket.tagging = {}
+        else:
+            if bucket.keys:
+                raise S3Error(409, 'BucketNotEmpty')
+            del self.server.ecs.buckets[(self.namespace, self.bucket_name)]
+        self._send(204)
+
+    def _bucket_get(self):
+        bucket = self._bucket()
+        if 'versioning' in self.query:
+            status = f"<Status>{bucket.versioning}</Status>" if bucket.versioning else ''
+            return self._xml(f'<VersioningConfiguration xmlns="{NS}">{status}</VersioningConfiguration>')
+        if 'lifecycle' in self.query:
+            if bucket.lifecycle is None:
+                raise S3Error(404, 'NoSuchLifecycleConfiguration')
+            return self._send(200, bucket.lifecycle, {'Content-Type': 'application/xml'})
+        if 'tagging' in self.query:
+            if not bucket.tagging:
+                raise S3Error(404, 'NoSuchTagSet')
+            return self._xml(_tagging_xml(bucket.tagging))
+        if 'versions' in self.query:
+            return self._list_versions(bucket)
+        return self._list_objects(bucket)
+
+    def _bucket_post(self):
+        if 'delete' not in self.query:
+            raise S3Error(400, 'InvalidRequest')
+        bucket = self._bucket()
+        root = ET.fromstring(self.body)
+        quiet = _find_text(self.body, 'Quiet') == 'true'
+        out = []
+        for obj in root.iter(f'{{{NS}}}Object'):
+            key = obj.findtext(f'{{{NS}}}Key')
+            version_id = obj.findtext(f'{{{NS}}}VersionId')
+            removed, marker = bucket.delete(key, version_id)
+            if not quiet:
+                version = f"<VersionId>{removed}</VersionId>" if removed and version_id else ''
+                marker_xml = '<DeleteMarker>true</DeleteMarker>' if marker else ''
+                out.append(f"<Deleted><Key>{escape(key)}</Key>{version}{marker_xml}</Deleted>")
+        self._xml(f'<DeleteResult xmlns="{NS}">{"".join(out)}</DeleteResult>')
+
+    def _list_objects(self, bucket: _Bucket):
+        prefix = self.query.get('prefix', '')
+        delimiter = self.query.get('delimiter', '')
+        max_keys = min(int(self.query.get('max-keys', 1000)), 1000)
+        start = self.query.get('continuation-token') or self.query.get('start-after', '')
+
+        with bucket.lock:
+            index = bisect.bisect_right(bucket.keys, start) if start else bisect.bisect_left(bucket.keys, prefix)
+            contents, prefixes, last, truncated = [], [], None, False
+            while index < len(bucket.keys):
+                key = bucket.keys[index]
+                index += 1
+                if not key.startswith(prefix):
+                    if key > prefix:
+                        break
+                    continue
+                if len(contents) + len(prefixes) >= max_keys:
+                    truncated = True
+                    break
+                if delimiter and delimiter in key[len(prefix):]:
+                    common = key[:len(prefix) + key[len(prefix):].index(delimiter) + len(delimiter)]
+                    if not prefixes or prefixes[-1] != common:
+                        prefixes.append(common)
+                    last = common + '\uffff'
+                    # Skip the rest of this common prefix
+                    index = bisect.bisect_left(bucket.keys, last)
+                    continue
+                version = bucket.current(key)
+                if version is None:
+                    continue
+                contents.append((key, version))
+                last = key
+
+        body = [f'<ListBucketResult xmlns="{NS}"><Name>{escape(self.bucket_name)}</Name>',
+                f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(contents) + len(prefixes)}</KeyCount>",
+                f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+        if truncated:
+            body.append(f"<NextContinuationToken>{escape(last)}</NextContinuationToken>")
+        for key, version in contents:
+            body.append(f"<Contents><Key>{escape(key)}</Key>"
+                        f"<LastModified>{_iso(version.last_modified)}</LastModified>"
+                        f'<ETag>"{version.etag}"</ETag><Size>{len(version.data)}</Size>'
+                        f"<StorageClass>STANDARD</StorageClass></Contents>")
+        for common in prefixes:
+            body.append(f"<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>")
+        body.append('</ListBucketResult>')
+        self._xml(''.join(body))
+
+    def _list_versions(self, bucket: _Bucket):
+        prefix = self.query.get('prefix', '')
+        max_keys = min(int(self.query.get('max-keys', 1000)), 1000)
+        key_marker = self.query.get('key-marker', '')
+        version_marker = self.query.get('version-id-marker', '')
+
+        entries, truncated, next_marker = [], False, None
+        with bucket.lock:
+            index = bisect.bisect_left(bucket.keys, key_marker or prefix)
+            for key in bucket.keys[index:]:
+                if not key.startswith(prefix):
+                    if key > prefix:
+                        break
+                    continue
+                versions = list(reversed(bucket.versions[key]))
+                if key == key_marker:
+                    ids = [v.version_id for v in versions]
+                    if not version_marker:
+                        continue
+                    versions = versions[ids.index(version_marker) + 1:] if version_marker in ids else []
+                for version in versions:
+                    if len(entries) >= max_keys:
+                        truncated = True
+                        break
+                    entries.append((key, version, version is bucket.versions[key][-1]))
+                    next_marker = (key, version.version_id)
+                if truncated:
+                    break
+
+        body = [f'<ListVersionsResult xmlns="{NS}"><Name>{escape(self.bucket_name)}</Name>',
+                f"<Prefix>{escape(prefix)}</Prefix><MaxKeys>{max_keys}</MaxKeys>",
+                f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+        if truncated:
+            body.append(f"<NextKeyMarker>{escape(next_marker[0])}</NextKeyMarker>"
+                        f"<NextVersionIdMarker>{next_marker[1]}</NextVersionIdMarker>")
+        for key, version, latest in entries:
+            common = (f"<Key>{escape(key)}</Key><VersionId>{version.version_id}</VersionId>"
+                      f"<IsLatest>{'true' if latest else 'false'}</IsLatest>"
+                      f"<LastModified>{_iso(version.last_modified)}</LastModified>")
+            if version.data is None:
+                body.append(f"<DeleteMarker>{common}</DeleteMarker>")
+            else:
+                body.append(f'<Version>{common}<ETag>"{version.etag}"</ETag>'
+                            f"<Size>{len(version.data)}</Size></Version>")
+        body.append('</ListVersionsResult>')
+        self._xml(''.join(body))
+
+    # -- object operations -----------------------------------------------------
+
+    def _object_put(self):
+        bucket = self._bucket()
+        if 'x-amz-copy-source' in self.headers:
+            return self._object_copy(bucket)
+        if 'partNumber' in self.query:
+            upload = bucket.uploads.get(self.query.get('uploadId'))
+            if upload is None:
+                raise S3Error(404, 'NoSuchUpload')
+            upload[1][int(self.query['partNumber'])] = self.body
+            return self._send(200, headers={'ETag': f'"{hashlib.md5(self.body).hexdigest()}"'})
+        if 'tagging' in self.query:
+            version = self._version(bucket)
+            version.tags = _parse_tags(self.body)
+            return self._send(200)
+        version = bucket.put(self.key, self.body, headers=self._stored_headers())
+        self._send(200, headers={'ETag': f'"{version.etag}"', 'x-amz-version-id': version.version_id})
+
+    def _stored_headers(self) -> dict:
+        """Content-Type and x-amz-meta-* headers of the request, kept with the object."""
+        return {('Content-Type' if k.lower() == 'content-type' else k.lower()): v
+                for k, v in self.headers.items()
+                if k.lower() == 'content-type' or k.lower().startswith('x-amz-meta-')}
+
+    def _object_copy(self, bucket: _Bucket):
+        """CopyObject, or UploadPartCopy with partNumber, from a bucket of the same namespace."""
+        path, _, query = self.headers['x-amz-copy-source'].partition('?')
+        source_name, _, source_key = unquote(path).lstrip('/').partition('/')
+        source = self.server.ecs.bucket(self.namespace, source_name)
+        version = self._version(source, source_key, dict(parse_qsl(query)).get('versionId'))
+        if_match = self.headers.get('x-amz-copy-source-if-match')
+        if if_match and if_match.strip('"') != version.etag:
+            raise S3Error(412, 'PreconditionFailed')
+        data = version.data
+        if 'partNumber' not in self.query:
+            if self.headers.get('x-amz-metadata-directive', 'COPY') == 'REPLACE':
+                headers = self._stored_headers()
+            else:
+                headers = dict(version.headers)
+            copy = bucket.put(self.key, data, headers=headers)
+            return self._xml(f'<CopyObjectResult xmlns="{NS}"><LastModified>{_iso(copy.last_modified)}'
+                             f'</LastModified><ETag>"{copy.etag}"</ETag></CopyObjectResult>')
+        upload = bucket.uploads.get(self.query.get('uploadId'))
+        if upload is None:
+            raise S3Error(404, 'NoSuchUpload')
+        range_header = self.headers.get('x-amz-copy-source-range')
+        if range_header:
+            start, _, end = range_header[6:].partition('-')
+            if int(end) >= len(data):
+                raise S3Error(400, 'InvalidArgument', 'Range outside of the source object')
+            data = data[int(start):int(end) + 1]
+        upload[1][int(self.query['partNumber'])] = data
+        self._xml(f'<CopyPartResult xmlns="{NS}"><LastModified>{_iso(datetime.datetime.utcnow())}'
+                  f'</LastModified><ETag>"{hashlib.md5(data).hexdigest()}"</ETag></CopyPartResult>')
+
+    def _object_post(self):
+        bucket = self._bucket()
+        if 'uploads' in self.query:
+            upload_id = uuid.uuid4().hex
+            bucket.uploads[upload_id] = (self.key, {}, self._stored_headers())
+            return self._xml(f'<InitiateMultipartUploadResult xmlns="{NS}"><Bucket>{escape(self.bucket_name)}</Bucket>'
+                             f"<Key>{escape(self.key)}</Key><UploadId>{upload_id}</UploadId>"
+                             '</InitiateMultipartUploadResult>')
+        if 'uploadId' in self.query:
+            key, parts, headers = bucket.uploads.pop(self.query['uploadId'], (None, None, None))
+            if parts is None:
+                raise S3Error(404, 'NoSuchUpload')
+            root = ET.fromstring(self.body)
+            numbers = [int(p.findtext(f'{{{NS}}}PartNumber')) for p in root.iter(f'{{{NS}}}Part')]
+            if any(n not in parts for n in numbers):
+                raise S3Error(400, 'InvalidPart')
+            data = b''.join(parts[n] for n in numbers)
+            digests = b''.join(hashlib.md5(parts[n]).digest() for n in numbers)
+            etag = f"{hashlib.md5(digests).hexdigest()}-{len(numbers)}"
+            bucket.put(key, data, etag=etag, headers=headers)
+            return self._xml(f'<CompleteMultipartUploadResult xmlns="{NS}"><Key>{escape(key)}</Key>'
+                             f'<ETag>"{etag}"</ETag></CompleteMultipartUploadResult>')
+        raise S3Error(400, 'InvalidRequest')
+
+    def _object_delete(self):
+        bucket = self._bucket()
+        if 'uploadId' in self.query:
+            if bucket.uploads.pop(self.query['uploadId'], None) is None:
+                raise S3Error(404, 'NoSuchUpload')
+        elif 'tagging' in self.query:
+            self._version(bucket).tags = {}
+        else:
+            bucket.delete(self.key, self.query.get('versionId'))
+        self._send(204)
+
+    def _object_get(self):
+        bucket = self._bucket()
+        version = self._version(bucket)
+        if 'tagging' in self.query:
+            return self._xml(_tagging_xml(version.tags))
+        self._serve(version, with_body=True)
+
+    def _object_head(self):
+        self._serve(self._version(self._bucket()), with_body=False)
+
+    def _version(self, bucket: _Bucket, key: str = None, version_id: str = None) -> _Version:
+        """Version of the requested key (or of `key`), the current one without a versionId."""
+        if key is None:
+            key, version_id = self.key, self.query.get('versionId')
+        if version_id:
+            for version in bucket.versions.get(key, []):
+                if version.version_id == version_id and version.data is not None:
+                    return version
+            raise S3Error(404, 'NoSuchVersion')
+        version = bucket.current(key)
+        if version is None:
+            raise S3Error(404, 'NoSuchKey')
+        return version
+
+    def _serve(self, version: _Version, with_body: bool):
+        etag = f'"{version.etag}"'
+        if_match = self.headers.get('If-Match')
+        if if_match and if_match != etag:
+            raise S3Error(412, 'PreconditionFailed')
+        data = version.data
+        headers = {'ETag': etag, 'Last-Modified': _http_date(version.last_modified),
+                   'Accept-Ranges': 'bytes', 'x-amz-version-id': version.version_id, **version.headers}
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            start, _, end = range_header[6:].partition('-')
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                raise S3Error(416, 'InvalidRange')
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+            status = 206
+        headers['Content-Length'] = str(len(data))
+        self._send(status, data if with_body else b'', headers)
+
+
+def _find_text(body: bytes, tag: str):
+    for el in ET.fromstring(body).iter():
+        if el.tag.rpartition('}')[2] == tag:
+            return el.text
+    return None
+
+
+def _parse_tags(body: bytes) -> dict:
+    tags = {}
+    for el in ET.fromstring(body).iter():
+        if el.tag.rpartition('}')[2] == 'Tag':
+            fields = {child.tag.rpartition('}')[2]: child.text or '' for child in el}
+            tags[fields.get('Key')] = fields.get('Value', '')
+    return tags
+
+
+def _tagging_xml(tags: dict) -> str:
+    tag_set = ''.join(f"<Tag><Key>{escape(k)}</Key><Value>{escape(v)}</Value></Tag>"
+                      for k, v in tags.items())
+    return f'<Tagging xmlns="{NS}"><TagSet>{tag_set}</TagSet></Tagging>'
+
+
+def _iso(when: datetime.datetime) -> str:
+    return when.strftime('%Y-%m-%dT%H:%M:%S.') + f"{when.microsecond // 1000:03d}Z"
+
+
+def _http_date(when: datetime.datetime) -> str:
+    return when.strftime('%a, %d %b %Y %H:%M:%S GMT')
+
@@ -0,0 +1,202 @@
+"""
+Per-request instrumentation.
+
+Authenticator.request calls every registered hook with a RequestRecord
+once per HTTP attempt. TraceWriter writes the records as JSON lines and
+MetricsCollector aggregates them into per-operation counters and latency
+histograms, printable as a summary or exportable as a Prometheus textfile.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl
+
+from .utils import SIGNED_SUBRESOURCES
+
+# timestamp: epoch seconds when the request started
+# sign / connect / ttfb / total: seconds; ttfb counts from sending the request
+# (connection set-up included) to the response headers, total from the start
+# of signing to the end of the response body (headers only for streamed responses)
+RequestRecord = namedtuple('RequestRecord', [
+    'timestamp', 'profile', 'op', 'method', 'bucket', 'key', 'status',
+    'bytes_out', 'bytes_in', 'sign', 'connect', 'ttfb', 'total', 'attempt', 'error', 'endpoint'
+])
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def operation_name(method: str, object_name: str = '', subresource: str = '') -> str:
+    """Short label such as 'GET bucket?lifecycle', 'PUT object' or 'GET bucket?list-type'."""
+    target = 'object' if object_name else 'bucket'
+    names = [k for k, _ in parse_qsl(subresource.lstrip('?'), keep_blank_values=True)]
+    sub = next((k for k in names if k in SIGNED_SUBRESOURCES or k == 'list-type'), None)
+    return f"{method} {target}?{sub}" if sub else f"{method} {target}"
+
+
+def for_profile(hook, profile: str):
+    """Wrap a hook so that the records it receives carry the profile name."""
+    return lambda record: hook(record._replace(profile=profile))
+
+
+class TraceWriter:
+    """Hook writing one JSON line per record; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, record: RequestRecord):
+        line = json.dumps(record._asdict(), separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class _OpStats:
+    __slots__ = ('count', 'errors', 'retries', 'statuses', 'bytes_out', 'bytes_in',
+                 'sign', 'connect', 'ttfb', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = self.errors = self.retries = 0
+        self.bytes_out = self.bytes_in = 0
+        self.sign = self.connect = self.ttfb = self.total = 0.0
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, record: RequestRecord):
+        self.count += 1
+        if record.error or (record.status or 0) >= 400:
+            self.errors += 1
+        if record.attempt > 1:
+            self.retries += 1
+        status = str(record.status) if record.status else record.error
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes_out += record.bytes_out
+        self.bytes_in += record.bytes_in or 0
+        self.sign += record.sign
+        self.connect += record.connect
+        self.ttfb += record.ttfb or 0.0
+        self.total += record.total
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, record.total)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the histogram bucket holding the q-quantile."""
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return bound
+        return 0.0
+
+
+class MetricsCollector:
+    """Hook aggregating records per (profile, operation); safe to share between threads."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: RequestRecord):
+        with self._lock:
+            stats = self._ops.get((record.profile, record.op))
+            if stats is None:
+                stats = self._ops[(record.profile, record.op)] = _OpStats()
+            stats.add(record)
+
+    def summary(self) -> str:
+        """Human-readable table: one line per operation, then a latency histogram."""
+        with self._lock:
+            ops = sorted(self._ops.items())
+        if not ops:
+            return 'No requests.'
+        lines = [f"{'operation':<30} {'count':>6} {'errors':>6} {'retries':>7} "
+                 f"{'sent':>10} {'recv':>10} {'sign ms':>8} {'conn ms':>8} {'ttfb ms':>8} "
+                 f"{'avg ms':>8} {'p50 ms':>8} {'p99 ms':>8}"]
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        for (profile, op), s in ops:
+            label = f"[{profile}] {op}" if profile else op
+            lines.append(
+                f"{label:<30} {s.count:>6} {s.errors:>6} {s.retries:>7} "
+                f"{s.bytes_out:>10} {s.bytes_in:>10} {s.sign / s.count * 1000:>8.2f} "
+                f"{s.connect / s.count * 1000:>8.2f} {s.ttfb / s.count * 1000:>8.2f} "
+                f"{s.total / s.count * 1000:>8.2f} {_ms(s.quantile(0.5)):>8} {_ms(s.quantile(0.99)):>8}"
+            )
+            histogram = [a + b for a, b in zip(histogram, s.buckets)]
+        total = sum(histogram)
+        last = max(i for i, n in enumerate(histogram) if n)
+        lines.append('')
+        lines.append('latency histogram (all operations):')
+        for bound, n in zip(LATENCY_BUCKETS[:last + 1] + (float('inf'),), histogram[:last + 1]):
+            bar = '#' * round(40 * n / total)
+            lines.append(f"  <= {_ms(bound):>8} ms {n:>8} {bar}")
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        with self._lock:
+            ops = sorted(self._ops.items())
+        out = [
+            '# HELP s3cli_requests_total S3 requests sent, by operation and status.',
+            '# TYPE s3cli_requests_total counter',
+        ]
+        for (profile, op), s in ops:
+            for status, n in sorted(s.statuses.items()):
+                out.append(f"s3cli_requests_total{_labels(profile, op, status=status)} {n}")
+        for name, attr, help_text in (
+            ('s3cli_request_retries_total', 'retries', 'Requests that were retry attempts.'),
+            ('s3cli_request_sent_bytes_total', 'bytes_out', 'Request body bytes sent.'),
+            ('s3cli_request_received_bytes_total', 'bytes_in', 'Response body bytes received.'),
+        ):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} counter")
+            for (profile, op), s in ops:
+                out.append(f"{name}{_labels(profile, op)} {getattr(s, attr)}")
+        out.append('# HELP s3cli_request_phase_seconds_total Time spent per request phase.')
+        out.append('# TYPE s3cli_request_phase_seconds_total counter')
+        for (profile, op), s in ops:
+            for phase in ('sign', 'connect', 'ttfb'):
+                out.append(f"s3cli_request_phase_seconds_total{_labels(profile, op, phase=phase)} "
+                           f"{getattr(s, phase):.6f}")
+        out.append('# HELP s3cli_request_duration_seconds Request latency, signing to last byte.')
+        out.append('# TYPE s3cli_request_duration_seconds histogram')
+        for (profile, op), s in ops:
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), s.buckets):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                out.append(f"s3cli_request_duration_seconds_bucket{_labels(profile, op, le=le)} {cumulative}")
+            out.append(f"s3cli_request_duration_seconds_sum{_labels(profile, op)} {s.total:.6f}")
+            out.append(f"s3cli_request_duration_seconds_count{_labels(profile, op)} {s.count}")
+        out.append('# HELP s3cli_last_run_timestamp_seconds Start of the run that wrote this file.')
+        out.append('# TYPE s3cli_last_run_timestamp_seconds gauge')
+        out.append(f"s3cli_last_run_timestamp_seconds {self.started:.3f}")
+        return '\n'.join(out) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Write the textfile atomically so the node exporter never reads a partial file."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+def _ms(seconds: float) -> str:
+    return 'inf' if seconds == float('inf') else f"{seconds * 1000:g}"
+
+
+def _labels(profile: str, op: str, **extra) -> str:
+    labels = {'profile': profile, 'op': op, **extra}
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _escape(value) -> str:
+    return str(value or '').replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,651 @@
+import hashlib
+import mmap
+import os
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from .bucket import MAX_OBJECT_TAGS, BucketManager, parse_tagging, tagging_body
+from .checkpoint import load_state, remove_file, save_state
+from .concurrency import chunked, map_ordered
+from .utils import payload_digests
+
+NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+MiB = 1024 * 1024
+# S3 multipart limits
+MIN_PART_SIZE = 5 * MiB
+MAX_PART_SIZE = 5 * 1024 * MiB
+MAX_PARTS = 10000
+# Adaptive sizing starts here and doubles until the part count is reasonable
+DEFAULT_PART_SIZE = 8 * MiB
+TARGET_PARTS = 2000
+MULTIPART_THRESHOLD = 64 * MiB
+# Multi-Object Delete accepts up to 1000 keys per request
+MAX_DELETE_KEYS = 1000
+
+
+def choose_part_size(size: int, part_size: int = None) -> int:
+    """
+    Part size for a multipart upload of `size` bytes.
+    Starts at 8 MiB and doubles until the upload needs at most TARGET_PARTS
+    parts, so large archives use fewer, bigger requests. An explicit
+    part_size is only raised if the upload would exceed MAX_PARTS.
+    """
+    if part_size:
+        part_size = max(part_size, MIN_PART_SIZE)
+    else:
+        part_size = DEFAULT_PART_SIZE
+        while part_size < MAX_PART_SIZE and -(-size // part_size) > TARGET_PARTS:
+            part_size *= 2
+    while -(-size // part_size) > MAX_PARTS:
+        part_size *= 2
+    return min(part_size, MAX_PART_SIZE)
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+
+class ObjectManager:
+    def __init__(self, auth):
+        self.auth = auth
+
+    def _digests(self, data) -> tuple:
+        # The SHA-256 is only needed to sign v4 requests
+        return payload_digests(data, sha256=self.auth.auth_method == 'v4')
+
+    def put_object(self, bucket_name: str, key: str, data=b'', content_type: str = None,
+                   metadata: dict = None) -> dict:
+        """metadata is {name: value}, sent as x-amz-meta-<name> headers."""
+        md5_b64, sha_hex = self._digests(data)
+        headers = {'Content-MD5': md5_b64, 'Content-Length': str(len(data)), **_metadata_headers(metadata)}
+        if content_type:
+            headers['Content-Type'] = content_type
+        resp = self.auth.request(
+            'PUT', bucket=bucket_name, object_name=key, headers=headers,
+            payload=data, payload_hash=sha_hex
+        )
+        resp.raise_for_status()
+        return {'success': True, 'key': key, 'etag': resp.headers.get('ETag', '').strip('"')}
+
+    def create_multipart_upload(self, bucket_name: str, key: str, content_type: str = None,
+                                metadata: dict = None) -> str:
+        headers = _metadata_headers(metadata)
+        if content_type:
+            headers['Content-Type'] = content_type
+        resp = self.auth.request('POST', bucket=bucket_name, object_name=key,
+                                 subresource='?uploads', headers=headers)
+        resp.raise_for_status()
+        for el in ET.fromstring(resp.content).iter():
+            if _local(el.tag) == 'UploadId':
+                return el.text
+        raise ValueError(f"No UploadId in response for {bucket_name}/{key}")
+
+    def upload_part(self, bucket_name: str, key: str, upload_id: str, part_number: int, data) -> str:
+        """Upload one part with Content-MD5 integrity, returns its ETag."""
+        md5_b64, sha_hex = self._digests(data)
+        headers = {'Content-MD5': md5_b64, 'Content-Length': str(len(data))}
+        resp = self.auth.request(
+            'PUT', bucket=bucket_name, object_name=key,
+            subresource=f"?partNumber={part_number}&uploadId={quote(upload_id, safe='')}",
+            headers=headers, payload=data, payload_hash=sha_hex
+        )
+        resp.raise_for_status()
+        return resp.headers.get('ETag', '').strip('"')
+
+    def complete_multipart_upload(self, bucket_name: str, key: str, upload_id: str, etags: list) -> str:
+        """Complete an upload from the ordered list of part ETags, returns the object ETag."""
+        body = ''.join(
+            f'<Part><PartNumber>{n}</PartNumber><ETag>"{etag}"</ETag></Part>'
+            for n, etag in enumerate(etags, start=1)
+        )
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<CompleteMultipartUpload xmlns="{NS}">{body}</CompleteMultipartUpload>').encode()
+        resp = self.auth.request(
+            'POST', bucket=bucket_name, object_name=key,
+            subresource=f"?uploadId={quote(upload_id, safe='')}",
+            headers={'Content-Type': 'application/xml'}, payload=body
+        )
+        resp.raise_for_status()
+        # Errors may be reported with a 200 status once the upload has started
+        root = ET.fromstring(resp.content)
+        if _local(root.tag) == 'Error':
+            raise RuntimeError(f"CompleteMultipartUpload failed: {root.findtext('Message')}")
+        for el in root.iter():
+            if _local(el.tag) == 'ETag':
+                return el.text.strip('"')
+        return ''
+
+    def abort_multipart_upload(self, bucket_name: str, key: str, upload_id: str) -> dict:
+        resp = self.auth.request('DELETE', bucket=bucket_name, object_name=key,
+                                 subresource=f"?uploadId={quote(upload_id, safe='')}")
+        if resp.status_code != 404:
+            resp.raise_for_status()
+        return {'success': True, 'aborted': upload_id}
+
+    def delete_objects(self, bucket_name: str, entries: list) -> list:
+        """
+        Delete up to 1000 objects in one Multi-Object Delete request.
+        entries are keys or (key, version_id) tuples. Returns the per-key
+        errors reported by the server as dicts (key, version_id, code, message).
+        """
+        objects = []
+        for entry in entries:
+            key, version_id = entry if isinstance(entry, tuple) else (entry, None)
+            version = f"<VersionId>{escape(version_id)}</VersionId>" if version_id else ''
+            objects.append(f"<Object><Key>{escape(key)}</Key>{version}</Object>")
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                f'<Delete xmlns="{NS}"><Quiet>true</Quiet>{"".join(objects)}</Delete>').encode('utf-8')
+        md5_b64, sha_hex = self._digests(body)
+        headers = {'Content-Type': 'application/xml', 'Content-MD5': md5_b64}
+        resp = self.auth.request('POST', bucket=bucket_name, subresource='?delete',
+                                 headers=headers, payload=body, payload_hash=sha_hex)
+        resp.raise_for_status()
+
+        errors = []
+        for el in ET.fromstring(resp.content).iter():
+            if _local(el.tag) == 'Error':
+                fields = {_local(child.tag): child.text for child in el}
+                errors.append({
+                    'key': fields.get('Key'),
+                    'version_id': fields.get('VersionId'),
+                    'code': fields.get('Code'),
+                    'message': fields.get('Message')
+                })
+        return errors
+
+    def purge_prefix(
+        self,
+        bucket_name: str,
+        prefix: str,
+        versions: bool = False,
+        workers: int = 4,
+        keep: str = None,
+        progress=None
+    ) -> dict:
+        """
+        Delete everything under prefix with Multi-Object Delete. The listing
+        is streamed into batches of 1000 keys and up to `workers` batches are
+        in flight while the listing continues. With versions=True every
+        version and delete marker is removed as well. `keep` is a key (e.g.
+        the prefix placeholder) that is left in place.
+        progress(deleted_in_batch, failed_in_batch) is called per batch.
+        """
+        bm = BucketManager(self.auth)
+        if versions:
+            entries = ((v.key, v.version_id) for v in bm.list_object_versions(bucket_name, prefix=prefix)
+                       if v.key != keep)
+        else:
+            entries = (obj.key for obj in bm.list_objects(bucket_name, prefix=prefix)
+                       if obj.key != keep)
+
+        self.auth.transport.reserve(workers)
+        deleted, errors = 0, []
+        batches = chunked(entries, MAX_DELETE_KEYS)
+        for batch, batch_errors, err in map_ordered(
+                lambda b: self.delete_objects(bucket_name, b), batches, workers):
+            if err is not None:
+                batch_errors = _failed_batch(batch, err)
+            deleted += len(batch) - len(batch_errors)
+            errors.extend(batch_errors)
+            if progress:
+                progress(len(batch) - len(batch_errors), len(batch_errors))
+        return {'deleted': deleted, 'errors': errors}
+
+    def copy_object(self, source_bucket: str, source_key: str, bucket_name: str, key: str,
+                    etag: str = None) -> dict:
+        """
+        Server-side CopyObject (up to 5 GiB) within the namespace of this manager.
+        With etag, the copy fails with 412 if the source changed since it was listed.
+        """
+        headers = {'x-amz-copy-source': quote(f"/{source_bucket}/{source_key}", safe='/~')}
+        if etag:
+            headers['x-amz-copy-source-if-match'] = f'"{etag}"'
+        resp = self.auth.request('PUT', bucket=bucket_name, object_name=key, headers=headers)
+        resp.raise_for_status()
+        return {'success': True, 'key': key, 'etag': _copy_result_etag(resp, 'CopyObject')}
+
+    def upload_part_copy(self, bucket_name: str, key: str, upload_id: str, part_number: int,
+                         source_bucket: str, source_key: str, start: int, end: int,
+                         etag: str = None) -> str:
+        """Copy bytes start-end (inclusive) of the source object as one part, returns its ETag."""
+        headers = {
+            'x-amz-copy-source': quote(f"/{source_bucket}/{source_key}", safe='/~'),
+            'x-amz-copy-source-range': f"bytes={start}-{end}",
+        }
+        if etag:
+            headers['x-amz-copy-source-if-match'] = f'"{etag}"'
+        resp = self.auth.request(
+            'PUT', bucket=bucket_name, object_name=key,
+            subresource=f"?partNumber={part_number}&uploadId={quote(upload_id, safe='')}",
+            headers=headers
+        )
+        resp.raise_for_status()
+        return _copy_result_etag(resp, 'UploadPartCopy')
+
+    def copy_object_multipart(
+        self,
+        source_bucket: str,
+        source_key: str,
+        size: int,
+        bucket_name: str,
+        key: str,
+        etag: str = None,
+        part_size: int = None,
+        workers: int = 4,
+        source: 'ObjectManager' = None
+    ) -> dict:
+        """
+        Copy a large object as a multipart upload whose parts are copied
+        concurrently. Parts are UploadPartCopy requests, or, when `source` is
+        a manager for another endpoint or namespace, ranged GETs of the source
+        uploaded again (the bytes go through this process, one part per
+        worker at a time). Any failure aborts the multipart upload.
+        The Content-Type and metadata of the source, read with a HEAD, are
+        given to the new upload as CopyObject would keep them.
+        """
+        part_size = choose_part_size(size, part_size)
+        offsets = list(range(0, size, part_size))
+        info = (source or self).head_object(source_bucket, source_key)
+        upload_id = self.create_multipart_upload(bucket_name, key, content_type=info['content_type'],
+                                                 metadata=info['metadata'])
+
+        def send(number):
+            start = offsets[number - 1]
+            end = min(start + part_size, size) - 1
+            if source is None or source.same_namespace(self):
+                return self.upload_part_copy(bucket_name, key, upload_id, number,
+                                             source_bucket, source_key, start, end, etag=etag)
+            data = source.get_range(source_bucket, source_key, start, end, etag=etag)
+            return self.upload_part(bucket_name, key, upload_id, number, data)
+
+        etag = self._send_parts(bucket_name, key, upload_id, send, len(offsets), workers)
+        return {'success': True, 'key': key, 'etag': etag, 'parts': len(offsets), 'part_size': part_size}
+
+    def get_range(self, bucket_name: str, key: str, start: int, end: int, etag: str = None) -> bytes:
+        """Bytes start-end (inclusive) of an object, 412 if its ETag is no longer etag."""
+        return self._ranged_get(bucket_name, key, start, end, etag).content
+
+    def _ranged_get(self, bucket_name, key, start, end, etag=None):
+        headers = {'Range': f"bytes={start}-{end}", 'Accept-Encoding': 'identity'}
+        if etag:
+            headers['If-Match'] = f'"{etag}"'
+        resp = self.auth.request('GET', bucket=bucket_name, object_name=key, headers=headers)
+        resp.raise_for_status()
+        if len(resp.content) != end - start + 1:
+            raise IOError(f"Short read on bytes {start}-{end} of {bucket_name}/{key}")
+        return resp
+
+    def same_namespace(self, other: 'ObjectManager') -> bool:
+        """Whether server-side copies between the two managers are possible."""
+        return (bool(_nodes(self.auth) & _nodes(other.auth))
+                and self.auth.namespace == other.auth.namespace)
+
+    def copy_prefix(
+        self,
+        source_bucket: str,
+        prefix: str,
+        bucket_name: str,
+        dest_prefix: str = None,
+        source: 'ObjectManager' = None,
+        workers: int = 8,
+        part_size: int = None,
+        multipart_threshold: int = MULTIPART_THRESHOLD,
+        delete_source: bool = False,
+        progress=None
+    ) -> dict:
+        """
+        Copy every object under prefix of source_bucket to bucket_name, with
+        prefix replaced by dest_prefix if given. `source` is the manager of
+        the source side (this one by default).
+
+        The source listing is streamed into up to `workers` concurrent copies.
+        Within one endpoint and namespace objects are copied server-side with
+        CopyObject, or UploadPartCopy above multipart_threshold; otherwise
+        they are relayed (GET then PUT, ranged GETs then UploadPart above the
+        threshold) with the Content-Type and x-amz-meta-* metadata of the
+        source. Copies are conditional on the listed ETag. With
+        delete_source, copied keys are removed from the source with
+        Multi-Object Delete, 1000 at a time.
+        progress(key, size, error) is called per object.
+        """
+        source = source or self
+        server_side = source.same_namespace(self)
+        if dest_prefix is None:
+            dest_prefix = prefix
+        if server_side and source_bucket == bucket_name and dest_prefix.startswith(prefix):
+            raise ValueError(f"Destination {bucket_name}/{dest_prefix} overlaps the source {prefix}")
+
+        def copy(obj):
+            key = dest_prefix + obj.key[len(prefix):]
+            if obj.size >= multipart_threshold:
+                return self.copy_object_multipart(source_bucket, obj.key, obj.size, bucket_name, key,
+                                                  etag=obj.etag, part_size=part_size, source=source)
+            if server_side:
+                return self.copy_object(source_bucket, obj.key, bucket_name, key, etag=obj.etag)
+            if obj.size:
+                resp = source._ranged_get(source_bucket, obj.key, 0, obj.size - 1, etag=obj.etag)
+                data, (content_type, metadata) = resp.content, _stored_attributes(resp.headers)
+            else:
+                info = source.head_object(source_bucket, obj.key)
+                data, content_type, metadata = b'', info['content_type'], info['metadata']
+            return self.put_object(bucket_name, key, data, content_type=content_type, metadata=metadata)
+
+        objects = BucketManager(source.auth).list_objects(source_bucket, prefix=prefix)
+        self.auth.transport.reserve(workers)
+        source.auth.transport.reserve(workers)
+        copied, nbytes, deleted, errors, pending = 0, 0, 0, [], []
+
+        def flush():
+            try:
+                failed = source.delete_objects(source_bucket, pending)
+            except Exception as e:
+                failed = _failed_batch(pending, e)
+            errors.extend(failed)
+            done = len(pending) - len(failed)
+            pending.clear()
+            return done
+
+        for obj, _, err in map_ordered(copy, objects, workers):
+            if err is not None:
+                errors.append({'key': obj.key, 'version_id': None,
+                               'code': type(err).__name__, 'message': str(err)})
+            else:
+                copied += 1
+                nbytes += obj.size
+                if delete_source:
+                    pending.append(obj.key)
+                    if len(pending) >= MAX_DELETE_KEYS:
+                        deleted += flush()
+            if progress:
+                progress(obj.key, obj.size, err)
+        if pending:
+            deleted += flush()
+        return {'copied': copied, 'bytes': nbytes, 'deleted': deleted,
+                'server_side': server_side, 'errors': errors}
+
+    def get_object_tagging(self, bucket_name: str, key: str) -> dict:
+        """Tag set of the current version of an object as {key: value}."""
+        resp = self.auth.request('GET', bucket=bucket_name, object_name=key, subresource='?tagging')
+        resp.raise_for_status()
+        return parse_tagging(resp.content)
+
+    def put_object_tagging(self, bucket_name: str, key: str, tags: dict) -> dict:
+        """Replace the tag set of the current version of an object."""
+        if len(tags) > MAX_OBJECT_TAGS:
+            raise ValueError(f"{len(tags)} tags exceed the limit of {MAX_OBJECT_TAGS} per object")
+        body = tagging_body(tags)
+        md5_b64, sha_hex = self._digests(body)
+        headers = {'Content-Type': 'application/xml', 'Content-MD5': md5_b64}
+        resp = self.auth.request('PUT', bucket=bucket_name, object_name=key, subresource='?tagging',
+                                 headers=headers, payload=body, payload_hash=sha_hex)
+        resp.raise_for_status()
+        return {'success': True, 'key': key, 'tags': tags}
+
+    def tag_prefix(
+        self,
+        bucket_name: str,
+        prefix: str,
+        tags: dict,
+        replace: bool = False,
+        workers: int = 16,
+        progress=None
+    ) -> dict:
+        """
+        Tag every object under prefix. The listing is streamed into up to
+        `workers` concurrent tag updates; each reads the tag set of its
+        object, merges `tags` into it (or replaces it with replace=True) and
+        writes it back only if that changes it, so objects already carrying
+        the tags cost a single GET.
+        progress(key, changed, error) is called per object.
+        """
+        def tag(obj):
+            current = self.get_object_tagging(bucket_name, obj.key)
+            wanted = dict(tags) if replace else {**current, **tags}
+            if wanted == current:
+                return False
+            self.put_object_tagging(bucket_name, obj.key, wanted)
+            return True
+
+        objects = BucketManager(self.auth).list_objects(bucket_name, prefix=prefix or None)
+        self.auth.transport.reserve(workers)
+        tagged, skipped, errors = 0, 0, []
+        for obj, changed, err in map_ordered(tag, objects, workers):
+            if err is not None:
+                errors.append({'key': obj.key, 'message': str(err)})
+            elif changed:
+                tagged += 1
+            else:
+                skipped += 1
+            if progress:
+                progress(obj.key, changed, err)
+        return {'tagged': tagged, 'skipped': skipped, 'errors': errors}
+
+    def head_object(self, bucket_name: str, key: str) -> dict:
+        resp = self.auth.request('HEAD', bucket=bucket_name, object_name=key)
+        resp.raise_for_status()
+        content_type, metadata = _stored_attributes(resp.headers)
+        return {
+            'size': int(resp.headers.get('Content-Length', 0)),
+            'etag': resp.headers.get('ETag', '').strip('"'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'content_type': content_type,
+            'metadata': metadata
+        }
+
+    def upload_file(
+        self,
+        bucket_name: str,
+        key: str,
+        path: str,
+        part_size: int = None,
+        workers: int = 4,
+        multipart_threshold: int = MULTIPART_THRESHOLD,
+        content_type: str = None,
+        progress=None
+    ) -> dict:
+        """
+        Upload a local file. Large files are sent as a multipart upload whose
+        parts are memoryview slices of an mmap of the file (no copies) and are
+        uploaded concurrently. Any failure aborts the multipart upload.
+        progress(part_number, part_count, nbytes) is called as parts complete.
+        """
+        size = os.path.getsize(path)
+        if size == 0:
+            return self.put_object(bucket_name, key, b'', content_type=content_type)
+
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                if size < multipart_threshold:
+                    res = self.put_object(bucket_name, key, view, content_type=content_type)
+                    if progress:
+                        progress(1, 1, size)
+                    return res
+                return self._upload_multipart(
+                    bucket_name, key, view, size, part_size, workers, content_type, progress
+                )
+            finally:
+                view.release()
+
+    def _upload_multipart(self, bucket_name, key, view, size, part_size, workers, content_type, progress):
+        part_size = choose_part_size(size, part_size)
+        offsets = list(range(0, size, part_size))
+        self.auth.transport.reserve(workers)
+        upload_id = self.create_multipart_upload(bucket_name, key, content_type=content_type)
+
+        def send(number):
+            offset = offsets[number - 1]
+            with view[offset:offset + part_size] as part:
+                return self.upload_part(bucket_name, key, upload_id, number, part)
+
+        def sent(number):
+            if progress:
+                progress(number, len(offsets), min(part_size, size - offsets[number - 1]))
+
+        etag = self._send_parts(bucket_name, key, upload_id, send, len(offsets), workers, sent)
+        return {'success': True, 'key': key, 'etag': etag, 'parts': len(offsets),
+                'part_size': part_size, 'upload_id': upload_id}
+
+    def _send_parts(self, bucket_name, key, upload_id, send, parts, workers, sent=None) -> str:
+        """
+        Run send(part_number) for parts 1 to `parts` on `workers` threads,
+        then complete the upload with the returned part ETags and return its
+        ETag. sent(part_number) is called as parts succeed, in order. Any
+        failure, Ctrl-C included, aborts the multipart upload.
+        """
+        etags = []
+        results = map_ordered(send, range(1, parts + 1), workers)
+        try:
+            for number, etag, err in results:
+                if err is not None:
+                    raise err
+                etags.append(etag)
+                if sent:
+                    sent(number)
+            results.close()
+            return self.complete_multipart_upload(bucket_name, key, upload_id, etags)
+        except BaseException:
+            # Wait for in-flight parts before aborting (and before the caller unmaps its file)
+            results.close()
+            try:
+                self.abort_multipart_upload(bucket_name, key, upload_id)
+            except Exception:
+                pass  # keep the original error, it explains the failure
+            raise
+
+    def download_file(
+        self,
+        bucket_name: str,
+        key: str,
+        path: str,
+        part_size: int = None,
+        workers: int = 4,
+        resume: bool = True,
+        progress=None
+    ) -> dict:
+        """
+        Download an object with concurrent ranged GETs written straight into
+        a preallocated, memory-mapped `path.part` file at their offsets.
+
+        Completed ranges are recorded in `path.part.json` so an interrupted
+        download resumes where it stopped, as long as the object ETag did not
+        change. Every range is requested with If-Match on that ETag, and a
+        single-part ETag is checked against the MD5 of the finished file.
+        progress(part_number, part_count, nbytes) is called as ranges complete.
+        """
+        info = self.head_object(bucket_name, key)
+        size, etag = info['size'], info['etag']
+        tmp_path, state_path = path + '.part', path + '.part.json'
+
+        if size == 0:
+            open(path, 'wb').close()
+            return {'success': True, 'key': key, 'path': path, 'size': 0, 'etag': etag}
+
+        part_size = choose_part_size(size, part_size)
+        state = load_state(state_path) if resume else None
+        if (state and os.path.exists(tmp_path) and state.get('etag') == etag
+                and state.get('size') == size and state.get('part_size') == part_size):
+            done = set(state['done'])
+        else:
+            done = set()
+            with open(tmp_path, 'wb') as f:
+                f.truncate(size)
+        state = {'etag': etag, 'size': size, 'part_size': part_size, 'done': sorted(done)}
+
+        count = -(-size // part_size)
+        pending = [n for n in range(1, count + 1) if n not in done]
+        self.auth.transport.reserve(workers)
+
+        with open(tmp_path, 'r+b') as f, mmap.mmap(f.fileno(), size) as mm:
+            def fetch(number):
+                start = (number - 1) * part_size
+                end = min(start + part_size, size) - 1
+                self._get_range(bucket_name, key, etag, mm, start, end)
+                return end - start + 1
+
+            results = map_ordered(fetch, pending, workers)
+            try:
+                for number, nbytes, err in results:
+                    if err is not None:
+                        raise err
+                    done.add(number)
+                    state['done'] = sorted(done)
+                    save_state(state_path, state)
+                    if progress:
+                        progress(number, count, nbytes)
+            finally:
+                # Wait for in-flight ranges before the mapping is closed
+                results.close()
+            mm.flush()
+            # Multipart ETags are not an MD5 of the content, If-Match covers those
+            md5_ok = not etag or '-' in etag or hashlib.md5(mm).hexdigest() == etag
+
+        if not md5_ok:
+            remove_file(tmp_path)
+            remove_file(state_path)
+            raise ValueError(f"MD5 of {key} does not match ETag {etag}")
+
+        os.replace(tmp_path, path)
+        remove_file(state_path)
+        return {'success': True, 'key': key, 'path': path, 'size': size,
+                'etag': etag, 'parts': count, 'resumed': count - len(pending)}
+
+    def _get_range(self, bucket_name, key, etag, mm, start, end):
+        headers = {'Range': f"bytes={start}-{end}", 'Accept-Encoding': 'identity'}
+        if etag:
+            headers['If-Match'] = f'"{etag}"'
+        resp = self.auth.request('GET', bucket=bucket_name, object_name=key,
+                                 headers=headers, stream=True)
+        try:
+            resp.raise_for_status()
+            if resp.status_code != 206 and not (start == 0 and end == len(mm) - 1):
+                raise ValueError(f"Range request not honoured for {bucket_name}/{key}")
+            with memoryview(mm) as whole, whole[start:end + 1] as target:
+                pos = 0
+                while pos < len(target):
+                    with target[pos:] as rest:
+                        n = resp.raw.readinto(rest)
+                    if not n:
+                        raise IOError(f"Short read on bytes {start}-{end} of {bucket_name}/{key}")
+                    pos += n
+        finally:
+            resp.close()
+
+
+def _failed_batch(batch: list, err: Exception) -> list:
+    """Per-key errors for a delete batch whose request failed as a whole."""
+    errors = []
+    for entry in batch:
+        key, version_id = entry if isinstance(entry, tuple) else (entry, None)
+        errors.append({'key': key, 'version_id': version_id,
+                       'code': 'RequestFailed', 'message': str(err)})
+    return errors
+
+
+def _nodes(auth) -> set:
+    return set(auth.endpoints.endpoints) if auth.endpoints else {auth.endpoint}
+
+
+def _metadata_headers(metadata: dict = None) -> dict:
+    return {f"x-amz-meta-{name}": value for name, value in (metadata or {}).items()}
+
+
+def _stored_attributes(headers) -> tuple:
+    """(Content-Type, {name: value} of the x-amz-meta-* headers) of a GET or HEAD response."""
+    metadata = {k.lower()[len('x-amz-meta-'):]: v for k, v in headers.items()
+                if k.lower().startswith('x-amz-meta-')}
+    return headers.get('Content-Type'), metadata
+
+
+def _copy_result_etag(resp, operation: str) -> str:
+    # Copies can fail after the 200 status was sent, with an Error body
+    root = ET.fromstring(resp.content)
+    if _local(root.tag) == 'Error':
+        raise RuntimeError(f"{operation} failed: {root.findtext('Message')}")
+    for el in root.iter():
+        if _local(el.tag) == 'ETag':
+            return el.text.strip('"')
+    return ''
+
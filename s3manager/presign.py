@@ -0,0 +1,99 @@
+import base64
+import calendar
+import datetime
+import hashlib
+import hmac
+from urllib.parse import quote, urlencode, urlparse
+
+from .utils import UNSIGNED_PAYLOAD, _v4_signing_key
+
+# SigV4 pre-signed URLs are valid for at most seven days
+MAX_V4_EXPIRES = 7 * 24 * 3600
+
+
+class Presigner:
+    """
+    Query-string authentication (pre-signed URLs) for many keys of one bucket.
+
+    Everything that does not depend on the key -- expiry, credential scope,
+    canonical query and the HMAC/SHA state of the constant prefixes -- is
+    computed once, so signing a key is a couple of hash copies and updates.
+    Pre-signed URLs carry no x-emc-namespace header, ECS resolves the
+    namespace from the access key.
+    """
+
+    def __init__(self, auth, bucket: str, expires: int = 3600, method: str = 'GET', now=None):
+        """
+        :param auth: Authenticator holding credentials, endpoint and auth method
+        :param bucket: Bucket the keys belong to
+        :param expires: Validity of the URLs in seconds
+        :param method: HTTP method the URLs are valid for
+        :param now: Signing time (UTC datetime), defaults to the current time
+        """
+        self.auth = auth
+        self.bucket = bucket
+        self.method = method
+        self.expires = expires
+        self.now = now or datetime.datetime.utcnow()
+        self.expires_at = self.now + datetime.timedelta(seconds=expires)
+        self._base = f"{auth.endpoint}/{bucket}/"
+
+        if auth.auth_method == 'v2':
+            self._prepare_v2()
+        elif auth.auth_method == 'v4':
+            self._prepare_v4()
+        else:
+            raise NotImplementedError(f"Unsupported authentication method '{auth.auth_method}'")
+
+    def url(self, key: str) -> str:
+        return self._sign(quote(key, safe='/~'))
+
+    def _prepare_v2(self):
+        epoch = calendar.timegm(self.expires_at.timetuple())
+        self._query = '?' + urlencode({'AWSAccessKeyId': self.auth.access_key, 'Expires': epoch}) + '&Signature='
+        # "METHOD\n\n\nExpires\n/bucket/" is shared by every key
+        prefix = f"{self.method}\n\n\n{epoch}\n/{self.bucket}/".encode('utf-8')
+        self._mac = hmac.new(self.auth.secret_key.encode('utf-8'), prefix, hashlib.sha1)
+        self._sign = self._sign_v2
+
+    def _sign_v2(self, encoded_key: str) -> str:
+        mac = self._mac.copy()
+        mac.update(encoded_key.encode('utf-8'))
+        signature = base64.b64encode(mac.digest()).decode('utf-8')
+        return self._base + encoded_key + self._query + quote(signature, safe='')
+
+    def _prepare_v4(self):
+        if self.expires > MAX_V4_EXPIRES:
+            raise ValueError(f"v4 pre-signed URLs expire after at most {MAX_V4_EXPIRES} seconds")
+        region = self.auth.region or 'us-east-1'
+        amz_date = self.now.strftime('%Y%m%dT%H%M%SZ')
+        scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+        params = sorted({
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f"{self.auth.access_key}/{scope}",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(self.expires),
+            'X-Amz-SignedHeaders': 'host',
+        }.items())
+        canonical_query = '&'.join(
+            f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in params
+        )
+        host = urlparse(self.auth.endpoint).netloc
+        self._query = '?' + canonical_query + '&X-Amz-Signature='
+        # Canonical request = prefix + key + suffix, hash state of the prefix is reused
+        self._request_suffix = (
+            f"\n{canonical_query}\nhost:{host}\n\nhost\n{UNSIGNED_PAYLOAD}"
+        ).encode('utf-8')
+        self._request_sha = hashlib.sha256(f"{self.method}\n/{self.bucket}/".encode('utf-8'))
+        key = _v4_signing_key(self.auth.secret_key, amz_date[:8], region, 's3')
+        self._mac = hmac.new(key, f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n".encode('utf-8'),
+                             hashlib.sha256)
+        self._sign = self._sign_v4
+
+    def _sign_v4(self, encoded_key: str) -> str:
+        sha = self._request_sha.copy()
+        sha.update(encoded_key.encode('utf-8'))
+        sha.update(self._request_suffix)
+        mac = self._mac.copy()
+        mac.update(sha.hexdigest().encode('utf-8'))
+        return self._base + encoded_key + self._query + mac.hexdigest()
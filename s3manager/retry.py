@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+
+import requests
+
+# ECS answers 503 SlowDown when it throttles, some gateways use 429
+THROTTLE_STATUSES = frozenset([429, 503])
+RETRY_STATUSES = frozenset([500, 502, 503, 504]) | THROTTLE_STATUSES
+# Errors that reached the network, as opposed to local ones (signing, bugs)
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff for transient failures.
+
+    Only idempotent requests are retried: GET, HEAD, PUT and DELETE, plus
+    POST ?delete (Multi-Object Delete). Initiating or completing a multipart
+    upload is not retried, a repeat could create a second upload or fail on
+    an upload that already completed.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.1,
+        max_delay: float = 20.0,
+        rand: random.Random = None
+    ):
+        """
+        :param max_attempts: Attempts per request, first one included (1 disables retries)
+        :param base_delay: Backoff ceiling of the first retry in seconds, doubled on each retry
+        :param max_delay: Upper bound of a single backoff in seconds
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = rand or random.Random()
+
+    @classmethod
+    def from_config(cls, conf: dict) -> 'RetryPolicy':
+        return cls(
+            max_attempts=int(conf.get('max_attempts', 5)),
+            base_delay=float(conf.get('retry_base_delay', 0.1)),
+            max_delay=float(conf.get('retry_max_delay', 20))
+        )
+
+    @staticmethod
+    def idempotent(method: str, subresource: str = '') -> bool:
+        if method in ('GET', 'HEAD', 'PUT', 'DELETE'):
+            return True
+        query = subresource.partition('?')[2]
+        return method == 'POST' and query.split('&')[0] == 'delete'
+
+    def retry_response(self, method: str, subresource: str, resp, attempt: int) -> bool:
+        return (attempt < self.max_attempts and resp.status_code in RETRY_STATUSES
+                and self.idempotent(method, subresource))
+
+    def retry_error(self, method: str, subresource: str, error: Exception, attempt: int) -> bool:
+        return (attempt < self.max_attempts
+                and isinstance(error, NETWORK_ERRORS)
+                and self.idempotent(method, subresource))
+
+    def delay(self, attempt: int, resp=None) -> float:
+        """Full jitter backoff before attempt + 1, at least Retry-After if the server sent one."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = self._random.uniform(0, ceiling)
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_delay, float(retry_after)))
+        return delay
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit shared by all requests of an Authenticator, adjusted
+    by additive increase / multiplicative decrease: each successful response
+    raises the limit by about one per window of `limit` requests, a throttled
+    or failed one multiplies it by `decrease`. Throttling reported by
+    requests that were already in flight before the last decrease is not
+    counted again, so a burst of 503s halves the limit once.
+    """
+
+    def __init__(self, initial: int = 16, minimum: int = 1, maximum: int = 64, decrease: float = 0.5):
+        """
+        :param initial: Requests allowed in flight at start
+        :param minimum: Lower bound of the limit
+        :param maximum: Upper bound of the limit
+        :param decrease: Factor applied to the limit on throttling
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.in_flight = 0
+        self.throttled = 0
+        self._generation = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, conf: dict):
+        """Limiter for a profile, None when adaptive_concurrency is disabled."""
+        if not conf.get('adaptive_concurrency', True):
+            return None
+        maximum = int(conf.get('max_concurrency', 64))
+        return cls(initial=min(16, maximum), maximum=maximum)
+
+    def acquire(self) -> int:
+        """Wait for a slot; returns a token to pass to release()."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            return self._generation
+
+    def release(self, token: int, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if token == self._generation:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._generation += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
@@ -0,0 +1,311 @@
+"""
+Incremental sync between a local directory and a bucket prefix.
+
+Files are matched to keys by relative path (prefix + "a/b.txt"). A file is
+transferred when it is missing on the other side, when the sizes differ,
+or when its ETag differs. The ETag of a local file is the MD5 of its
+content, or for objects uploaded in parts, the MD5 of the part MD5s
+followed by "-<parts>", computed with the part size upload_file() would
+use. When the part count of a remote ETag shows another part size, the
+newer modification time wins instead.
+
+Local ETags are cached in a SQLite database keyed by (path, size, mtime),
+so unchanged files are never read twice. Files to hash are split into
+parts hashed concurrently over mmaps; hashlib releases the GIL on large
+buffers, so threads keep several cores busy.
+"""
+import calendar
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+from .bucket import BucketManager
+from .concurrency import map_ordered
+from .config import CACHE_DIR
+from .objects import MULTIPART_THRESHOLD, choose_part_size
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    part_size INTEGER NOT NULL,
+    etag TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def hash_cache_path() -> str:
+    return os.path.join(CACHE_DIR, 'hashes.sqlite')
+
+
+class HashCache:
+    """ETags of local files, valid while the size and mtime of the file are unchanged."""
+
+    def __init__(self, path: str = None):
+        """
+        :param path: SQLite database file, see hash_cache_path(); ':memory:' for no persistence
+        """
+        path = path or hash_cache_path()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        # Transfers record the ETag of what they sent from their own thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, path: str, size: int, mtime_ns: int, part_size: int):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT etag FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND part_size = ?',
+                (path, size, mtime_ns, part_size)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, entries: list):
+        """Store (path, size, mtime_ns, part_size, etag) tuples."""
+        with self.lock, self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, part_size, etag) VALUES (?, ?, ?, ?, ?)',
+                entries
+            )
+
+
+def etag_part_size(size: int, remote_etag: str = None) -> int:
+    """
+    Part size of the ETag to compare with remote_etag: 0 for a plain MD5,
+    the upload_file() part size for a multipart ETag, None when the part
+    count of remote_etag does not match it.
+    """
+    if remote_etag is None:
+        if size < MULTIPART_THRESHOLD:
+            return 0
+    elif '-' not in remote_etag:
+        return 0
+    part_size = choose_part_size(size)
+    if remote_etag is not None and remote_etag.rpartition('-')[2] != str(-(-size // part_size)):
+        return None
+    return part_size
+
+
+def _part_md5(path: str, offset: int, length: int) -> bytes:
+    if not length:
+        return hashlib.md5().digest()
+    with open(path, 'rb') as f:
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        with mmap.mmap(f.fileno(), length + offset - start, access=mmap.ACCESS_READ, offset=start) as mm:
+            with memoryview(mm) as view, view[offset - start:] as part:
+                return hashlib.md5(part).digest()
+
+
+def hash_files(files: list, cache: HashCache = None, workers: int = 8) -> dict:
+    """
+    ETags of local files given as (path, size, mtime_ns, part_size) tuples,
+    part_size 0 for a plain MD5. Returns {path: etag}.
+    """
+    etags, missing = {}, []
+    for path, size, mtime_ns, part_size in files:
+        etag = cache.get(path, size, mtime_ns, part_size) if cache else None
+        if etag is None:
+            missing.append((path, size, mtime_ns, part_size))
+        else:
+            etags[path] = etag
+
+    def parts():
+        for path, size, _, part_size in missing:
+            step = part_size or size
+            for offset in range(0, size, step) if size else [0]:
+                yield path, offset, min(step, size - offset)
+
+    digests = {}
+    for (path, _, _), digest, err in map_ordered(lambda p: _part_md5(*p), parts(), workers):
+        if err is not None:
+            raise err
+        digests.setdefault(path, []).append(digest)
+
+    entries = []
+    for path, size, mtime_ns, part_size in missing:
+        found = digests[path]
+        if part_size:
+            etag = f"{hashlib.md5(b''.join(found)).hexdigest()}-{len(found)}"
+        else:
+            etag = found[0].hex()
+        etags[path] = etag
+        entries.append((path, size, mtime_ns, part_size, etag))
+    if cache and entries:
+        cache.put_many(entries)
+    return etags
+
+
+def _local_path(root: str, rel: str) -> str:
+    """Path of the key relative path rel under the directory root, None if it resolves outside of root."""
+    path = os.path.normpath(os.path.join(root, *rel.split('/')))
+    if path == root or os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+
+def _remote_mtime(last_modified: str) -> float:
+    return calendar.timegm(time.strptime(last_modified[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+class DirectorySync:
+    def __init__(self, object_mgr, cache: HashCache = None):
+        """
+        :param object_mgr: ObjectManager of the bucket side
+        :param cache: HashCache of local ETags, files are always hashed if None
+        """
+        self.object_mgr = object_mgr
+        self.bucket_mgr = BucketManager(object_mgr.auth)
+        self.cache = cache
+
+    def scan_local(self, local_dir: str) -> dict:
+        """{relative path with '/': (absolute path, size, mtime_ns)} of the regular files under local_dir."""
+        files = {}
+        root = os.path.abspath(local_dir)
+        if not os.path.isdir(root):
+            return files
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(('.part', '.part.json')) or not os.path.isfile(path):
+                    continue  # partial downloads, sockets...
+                st = os.stat(path)
+                rel = os.path.relpath(path, root).replace(os.sep, '/')
+                files[rel] = (path, st.st_size, st.st_mtime_ns)
+        return files
+
+    def scan_remote(self, bucket_name: str, prefix: str) -> dict:
+        """{key relative to prefix: ObjectInfo}, prefix placeholders left out."""
+        return {
+            obj.key[len(prefix):]: obj
+            for obj in self.bucket_mgr.list_objects(bucket_name, prefix=prefix or None)
+            if not obj.key.endswith('/')
+        }
+
+    def plan(self, local_dir: str, bucket_name: str, prefix: str, push: bool, workers: int = 8) -> dict:
+        """
+        Files to send (push) or fetch: {'transfer': [(relative path, reason)],
+        'unchanged': count, 'local': {...}, 'remote': {...}}. Reasons are
+        'missing', 'size', 'etag' and 'mtime'.
+        """
+        local = self.scan_local(local_dir)
+        remote = self.scan_remote(bucket_name, prefix)
+        source, target = (local, remote) if push else (remote, local)
+
+        transfer, to_hash, candidates = [], [], []
+        for rel in sorted(source):
+            if rel not in target:
+                transfer.append((rel, 'missing'))
+                continue
+            path, size, mtime_ns = local[rel]
+            obj = remote[rel]
+            if size != obj.size:
+                transfer.append((rel, 'size'))
+                continue
+            part_size = etag_part_size(size, obj.etag)
+            if part_size is None:
+                # Uploaded with another part size, the ETag cannot be compared
+                local_newer = mtime_ns / 1e9 > _remote_mtime(obj.last_modified)
+                if local_newer == push:
+                    transfer.append((rel, 'mtime'))
+                continue
+            to_hash.append((path, size, mtime_ns, part_size))
+            candidates.append(rel)
+
+        etags = hash_files(to_hash, self.cache, workers)
+        for rel in candidates:
+            if etags[local[rel][0]] != remote[rel].etag:
+                transfer.append((rel, 'etag'))
+        transfer.sort()
+        return {'transfer': transfer, 'unchanged': len(source) - len(transfer),
+                'local': local, 'remote': remote}
+
+    def push(self, local_dir: str, bucket_name: str, prefix: str = '', workers: int = 4,
+             dry_run: bool = False, progress=None) -> dict:
+        """
+        Upload the files of local_dir that differ from the objects under prefix.
+        progress(relative path, reason, error) is called per transfer.
+        """
+        plan = self.plan(local_dir, bucket_name, prefix, push=True, workers=max(workers, 8))
+        local = plan['local']
+
+        def send(item):
+            rel, _ = item
+            path, size, mtime_ns = local[rel]
+            res = self.object_mgr.upload_file(bucket_name, prefix + rel, path)
+            part_size = etag_part_size(size)
+            if self.cache and res.get('etag') and os.stat(path).st_mtime_ns == mtime_ns:
+                self.cache.put_many([(path, size, mtime_ns, part_size, res['etag'])])
+            return size
+
+        return self._run(plan, send, workers, dry_run, progress)
+
+    def pull(self, bucket_name: str, prefix: str, local_dir: str, workers: int = 4,
+             dry_run: bool = False, progress=None) -> dict:
+        """
+        Download the objects under prefix that differ from the files of local_dir.
+        Downloaded files get the LastModified time of their object.
+        progress(relative path, reason, error) is called per transfer.
+        """
+        plan = self.plan(local_dir, bucket_name, prefix, push=False, workers=max(workers, 8))
+        remote = plan['remote']
+        root = os.path.abspath(local_dir)
+        # Keys are not trusted to stay under local_dir ("../" segments)
+        paths = {rel: _local_path(root, rel) for rel, _ in plan['transfer']}
+        outside = [(rel, reason) for rel, reason in plan['transfer'] if paths[rel] is None]
+        plan['transfer'] = [item for item in plan['transfer'] if paths[item[0]] is not None]
+
+        def fetch(item):
+            rel, _ = item
+            obj = remote[rel]
+            path = paths[rel]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.object_mgr.download_file(bucket_name, obj.key, path)
+            mtime = _remote_mtime(obj.last_modified)
+            os.utime(path, (mtime, mtime))
+            part_size = etag_part_size(obj.size, obj.etag)
+            if self.cache and part_size is not None:
+                self.cache.put_many([(path, obj.size, os.stat(path).st_mtime_ns, part_size, obj.etag)])
+            return obj.size
+
+        stats = self._run(plan, fetch, workers, dry_run, progress)
+        for rel, reason in outside:
+            err = ValueError(f"{prefix + rel} would be written outside of {root}, skipped")
+            stats['errors'].append({'path': rel, 'message': str(err)})
+            if progress:
+                progress(rel, reason, err)
+        return stats
+
+    @staticmethod
+    def _run(plan, transfer, workers, dry_run, progress) -> dict:
+        stats = {'transferred': 0, 'bytes': 0, 'unchanged': plan['unchanged'], 'errors': []}
+        if dry_run:
+            for rel, reason in plan['transfer']:
+                if progress:
+                    progress(rel, reason, None)
+            stats['pending'] = len(plan['transfer'])
+            return stats
+        for (rel, reason), nbytes, err in map_ordered(transfer, plan['transfer'], workers):
+            if err is None:
+                stats['transferred'] += 1
+                stats['bytes'] += nbytes
+            else:
+                stats['errors'].append({'path': rel, 'message': str(err)})
+            if progress:
+                progress(rel, reason, err)
+        return stats
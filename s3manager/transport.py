@@ -0,0 +1,143 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .endpoints import endpoint_list
+
+# Time spent opening connections (TCP + TLS) by the current thread's request
+_connect_time = threading.local()
+
+
+class _TimedConnection:
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.seconds = getattr(_connect_time, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class Transport:
+    """
+    Pooled keep-alive HTTP transport shared by every manager of a profile.
+
+    One instance wraps a single ``requests.Session`` so that consecutive
+    calls to the ECS endpoint reuse established TCP/TLS connections instead
+    of paying a new handshake per request.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        verify=True,
+        keep_alive: bool = True,
+        hosts: int = 1
+    ):
+        """
+        :param pool_size: Maximum number of pooled connections per host
+        :param timeout: Read timeout in seconds
+        :param connect_timeout: Connect timeout in seconds
+        :param verify: TLS verification flag or path to a CA bundle
+        :param keep_alive: Keep connections open between requests
+        :param hosts: Number of endpoints that each keep a connection pool
+        """
+        self.timeout = (connect_timeout, timeout)
+        self.keep_alive = keep_alive
+
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.hosts = hosts
+        self._lock = threading.Lock()
+        self._mount(pool_size)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    @classmethod
+    def from_config(cls, conf: dict) -> 'Transport':
+        """
+        Build a transport from the optional tuning keys of a profile, sized
+        for its endpoints and for the requests the adaptive limit lets in
+        flight, so that commands do not have to grow it.
+        """
+        pool_size = int(conf.get('pool_size', 10))
+        if conf.get('adaptive_concurrency', True):
+            pool_size = max(pool_size, int(conf.get('max_concurrency', 64)))
+        return cls(
+            pool_size=pool_size,
+            timeout=float(conf.get('timeout', 60)),
+            connect_timeout=float(conf.get('connect_timeout', 10)),
+            verify=conf.get('verify_ssl', True),
+            keep_alive=bool(conf.get('keep_alive', True)),
+            hosts=max(1, len(endpoint_list(conf)))
+        )
+
+    def _mount(self, pool_size: int):
+        # pool_connections is the number of per-host pools kept, pool_maxsize their size
+        adapter = HTTPAdapter(pool_connections=max(pool_size, self.hosts), pool_maxsize=pool_size)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool, 'https': _TimedHTTPSConnectionPool
+        }
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = pool_size
+
+    def reserve(self, workers: int):
+        """
+        Make room for `workers` concurrent requests. A pool too small gets
+        replaced by a larger adapter: requests in flight finish on the
+        previous one, its idle connections are not reused.
+        """
+        with self._lock:
+            if workers > self.pool_size:
+                self._mount(workers)
+
+    def reserve_hosts(self, hosts: int):
+        """Keep a connection pool for each of `hosts` endpoints instead of evicting the oldest."""
+        with self._lock:
+            if hosts > max(self.hosts, self.pool_size):
+                self.hosts = hosts
+                self._mount(self.pool_size)
+            self.hosts = max(self.hosts, hosts)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict = None,
+        data=None,
+        stream: bool = False
+    ) -> requests.Response:
+        _connect_time.seconds = 0.0
+        return self.session.request(
+            method, url, headers=headers, data=data, stream=stream, timeout=self.timeout
+        )
+
+    @staticmethod
+    def connect_time() -> float:
+        """Seconds the last request of this thread spent opening connections (0 when reused)."""
+        return getattr(_connect_time, 'seconds', 0.0)
+
+    def close(self):
+        self.session.close()
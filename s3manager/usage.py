@@ -0,0 +1,251 @@
+"""
+Bucket usage computed from the object listing.
+
+The keyspace under the scanned prefix is split into key ranges at the
+common prefixes ("05-2025/", ...) and the ranges are listed concurrently.
+Each range keeps the last key it fully counted, so the scan state can be
+checkpointed to a JSON file and an interrupted scan resumed where it
+stopped.
+"""
+import bisect
+import datetime
+import re
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from .bucket import BucketManager
+from .checkpoint import load_state, remove_file, save_state
+
+# Upper bounds in days of the storage age buckets, the last one is open-ended
+AGE_LIMITS = (30, 90, 365, 730, 1825)
+AGE_LABELS = ('<30d', '30-90d', '90d-1y', '1-2y', '2-5y', '>5y')
+STATES = ('current', 'noncurrent', 'delete-marker')
+# Group of the keys outside the MM-YYYY layout and the profile prefix_list
+OTHER = '(other)'
+
+_DATE_PREFIX = re.compile(r'^(\d{2})-(\d{4})$')
+# Objects counted by a range between two snapshots of its progress
+_SNAPSHOT_EVERY = 1000
+
+
+class UsageReport:
+    """Object counts and bytes per (prefix, age, state)."""
+
+    def __init__(self, rows: dict = None):
+        self.rows = rows or {}  # (prefix, age, state) -> [objects, bytes]
+
+    def merge(self, rows: dict):
+        for group, (count, size) in rows.items():
+            row = self.rows.setdefault(group, [0, 0])
+            row[0] += count
+            row[1] += size
+
+    def totals(self) -> list:
+        count = size = 0
+        for c, s in self.rows.values():
+            count += c
+            size += s
+        return [count, size]
+
+    def by(self, field: str) -> dict:
+        """{label: [objects, bytes]} for field 'prefix', 'age' or 'state', in display order."""
+        index = ('prefix', 'age', 'state').index(field)
+        out = {}
+        for group, (count, size) in self.rows.items():
+            row = out.setdefault(group[index], [0, 0])
+            row[0] += count
+            row[1] += size
+        order = {'age': AGE_LABELS, 'state': STATES}.get(field)
+        if order is None:
+            return dict(sorted(out.items(), key=lambda item: _prefix_order(item[0])))
+        return {label: out[label] for label in order if label in out}
+
+    def by_prefix_state(self) -> dict:
+        """{prefix: {state: [objects, bytes]}}"""
+        out = {}
+        for (prefix, _, state), (count, size) in self.rows.items():
+            row = out.setdefault(prefix, {}).setdefault(state, [0, 0])
+            row[0] += count
+            row[1] += size
+        return dict(sorted(out.items(), key=lambda item: _prefix_order(item[0])))
+
+    def to_dict(self) -> dict:
+        def counts(rows):
+            return {label: {'objects': c, 'bytes': s} for label, (c, s) in rows.items()}
+        count, size = self.totals()
+        return {
+            'objects': count,
+            'bytes': size,
+            'prefixes': {prefix: counts(states) for prefix, states in self.by_prefix_state().items()},
+            'ages': counts(self.by('age')),
+            'states': counts(self.by('state')),
+        }
+
+
+class UsageScanner:
+    def __init__(self, auth):
+        self.auth = auth
+        self.bucket_mgr = BucketManager(auth)
+
+    def partitions(self, bucket_name: str, prefix: str = '') -> list:
+        """
+        Key ranges [start, end] covering every key under prefix: a range holds
+        the keys k with start < k <= end, None standing for an open bound.
+        """
+        bounds = sorted({
+            common[:-1] for common in self.bucket_mgr.list_common_prefixes(bucket_name, prefix or None)
+        } - {''})
+        return [list(r) for r in zip([None] + bounds, bounds + [None])]
+
+    def scan(
+        self,
+        bucket_name: str,
+        prefix: str = '',
+        versions: bool = False,
+        known_prefixes=(),
+        workers: int = 8,
+        checkpoint: str = None,
+        progress=None,
+        interval: float = 10.0
+    ) -> UsageReport:
+        """
+        Count objects and bytes under prefix, grouped by prefix, age and
+        state (current / noncurrent / delete-marker with versions=True).
+
+        Keys are grouped by the path segment in which prefix ends when that
+        path is one of known_prefixes or the segment looks like MM-YYYY,
+        OTHER otherwise.
+        With a checkpoint path, progress is saved there every `interval`
+        seconds and when the scan fails or is interrupted, a later scan with
+        the same parameters resumes from it. progress(objects, ranges_done,
+        ranges) is called after each save.
+        """
+        prefix = prefix or ''
+        params = {'bucket': bucket_name, 'prefix': prefix, 'versions': bool(versions),
+                  'known': sorted(known_prefixes)}
+        state = load_state(checkpoint) if checkpoint else None
+        if not state or state.get('params') != params:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            ranges = self.partitions(bucket_name, prefix)
+            state = {
+                'params': params,
+                'now': now.strftime('%Y-%m-%dT%H:%M:%S'),
+                'ranges': ranges,
+                'slots': [{'marker': None, 'done': False, 'objects': 0, 'rows': []} for _ in ranges],
+            }
+        # ISO 8601 timestamps compare like the dates they stand for
+        now = datetime.datetime.strptime(state['now'], '%Y-%m-%dT%H:%M:%S')
+        cutoffs = sorted(
+            (now - datetime.timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%S') for days in AGE_LIMITS
+        )
+        known = {p.strip('/') for p in known_prefixes}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def publish(i, marker, done, objects, rows):
+            slot = {'marker': marker, 'done': done, 'objects': objects,
+                    'rows': [[*group, *row] for group, row in rows.items()]}
+            with lock:
+                state['slots'][i] = slot
+
+        def group_of(path):
+            if path in known or _DATE_PREFIX.match(path.rpartition('/')[2]):
+                return path + '/'
+            return OTHER
+
+        def scan_range(i):
+            start, end = state['ranges'][i]
+            slot = state['slots'][i]
+            rows = {tuple(row[:3]): row[3:] for row in slot['rows']}
+            objects = slot['objects']
+            marker = slot['marker'] or start
+            if versions:
+                records = self.bucket_mgr.list_object_versions(bucket_name, prefix=prefix, key_marker=marker)
+            else:
+                records = self.bucket_mgr.list_objects(bucket_name, prefix=prefix, start_after=marker)
+            groups = {}
+            last, since, group = None, 0, OTHER
+            try:
+                for rec in records:
+                    key = rec.key
+                    if key != last:
+                        if end is not None and key > end:
+                            break
+                        if stop.is_set():
+                            return
+                        # Every version of `last` is counted, a consistent point to resume from
+                        if since >= _SNAPSHOT_EVERY:
+                            publish(i, last, False, objects, rows)
+                            since = 0
+                        last = key
+                        # Path segment holding the end of prefix, e.g. "05-2025"
+                        cut = key.find('/', len(prefix))
+                        group = groups.get(key[:cut]) if cut >= 0 else OTHER
+                        if group is None:
+                            group = groups[key[:cut]] = group_of(key[:cut])
+                    age = AGE_LABELS[len(cutoffs) - bisect.bisect_right(cutoffs, rec.last_modified or '')]
+                    if not versions or rec.is_latest and not rec.delete_marker:
+                        status = 'current'
+                    else:
+                        status = 'delete-marker' if rec.delete_marker else 'noncurrent'
+                    row = rows.get((group, age, status))
+                    if row is None:
+                        row = rows[(group, age, status)] = [0, 0]
+                    row[0] += 1
+                    row[1] += rec.size or 0
+                    objects += 1
+                    since += 1
+            finally:
+                records.close()
+            publish(i, last or marker, True, objects, rows)
+
+        def save():
+            if checkpoint:
+                with lock:
+                    save_state(checkpoint, state)
+            if progress:
+                slots = state['slots']
+                progress(sum(s['objects'] for s in slots), sum(s['done'] for s in slots), len(slots))
+
+        pending = [i for i, slot in enumerate(state['slots']) if not slot['done']]
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        futures = [pool.submit(scan_range, i) for i in pending]
+        finished = False
+        try:
+            running = set(futures)
+            while running:
+                done, running = wait(running, timeout=interval, return_when=FIRST_EXCEPTION)
+                for fut in done:
+                    fut.result()
+                if running:
+                    save()
+            finished = True
+        finally:
+            stop.set()
+            for fut in futures:
+                fut.cancel()
+            pool.shutdown(wait=True)
+            if not finished:
+                save()
+
+        if checkpoint:
+            remove_file(checkpoint)
+        report = UsageReport()
+        for slot in state['slots']:
+            report.merge({tuple(row[:3]): row[3:] for row in slot['rows']})
+        return report
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _prefix_order(label: str):
+    """MM-YYYY prefixes in date order, then the others by name, OTHER last."""
+    match = _DATE_PREFIX.match(label.rstrip('/').rpartition('/')[2])
+    if match:
+        return 0, label[:-len(match.group(0)) - 1], match.group(2), match.group(1)
+    return (2, '', '', '') if label == OTHER else (1, label, '', '')
@@ -2,7 +2,73 @@ import hashlib
 import hmac
 import base64
 import datetime
-from urllib.parse import urlparse
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qsl, quote
+
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+# Block size used when hashing large payloads
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Sub-resources that are part of the V2 canonical resource. Other query
+# parameters (list-type, prefix, continuation-token...) are not signed.
+SIGNED_SUBRESOURCES = frozenset([
+    'acl', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'notification',
+    'partNumber', 'policy', 'requestPayment', 'tagging', 'torrent', 'uploadId',
+    'uploads', 'versionId', 'versioning', 'versions', 'website',
+    'response-cache-control', 'response-content-disposition',
+    'response-content-encoding', 'response-content-language',
+    'response-content-type', 'response-expires',
+])
+
+
+def canonical_subresources(query: str) -> str:
+    """Sorted `?name[=value]` string of the signed sub-resources in a query."""
+    pairs = sorted(
+        (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+        if k in SIGNED_SUBRESOURCES
+    )
+    if not pairs:
+        return ''
+    return '?' + '&'.join(f"{k}={v}" if v else k for k, v in pairs)
+
+
+def payload_digests(data, block_size: int = HASH_BLOCK_SIZE, sha256: bool = True) -> tuple:
+    """
+    Compute (Content-MD5 base64, SHA-256 hex) of a payload in a single pass.
+    data may be bytes, a memoryview (e.g. over an mmap) or a binary file object.
+    With sha256=False only the MD5 is computed and None is returned for SHA-256.
+    """
+    hashes = [hashlib.md5()]
+    if sha256:
+        hashes.append(hashlib.sha256())
+    if hasattr(data, 'read'):
+        for block in iter(lambda: data.read(block_size), b''):
+            for h in hashes:
+                h.update(block)
+    else:
+        view = memoryview(data)
+        for offset in range(0, len(view), block_size):
+            block = view[offset:offset + block_size]
+            for h in hashes:
+                h.update(block)
+    md5_b64 = base64.b64encode(hashes[0].digest()).decode('utf-8')
+    return md5_b64, hashes[1].hexdigest() if sha256 else None
+
+
+@lru_cache(maxsize=64)
+def _v4_signing_key(secret_key: str, datestamp: str, region: str, service: str) -> bytes:
+    """Derived SigV4 key, cached per (secret, date, region, service)."""
+    k_date = hmac.new(('AWS4' + secret_key).encode('utf-8'), datestamp.encode('utf-8'), hashlib.sha256).digest()
+    k_region = hmac.new(k_date, region.encode('utf-8'), hashlib.sha256).digest()
+    k_service = hmac.new(k_region, service.encode('utf-8'), hashlib.sha256).digest()
+    return hmac.new(k_service, b'aws4_request', hashlib.sha256).digest()
+
+
+def _v4_signed_header(name: str) -> bool:
+    return (name in ('host', 'content-type', 'content-md5', 'range')
+            or name.startswith('x-amz-') or name.startswith('x-emc-'))
+
 
 class S3Signer:
     @staticmethod
@@ -17,9 +83,7 @@ class S3Signer:
         parsed = urlparse(url)
         path = parsed.path or '/'
         # Construire canonical resource avec subresource query
-        canonical_resource = path
-        if parsed.query:
-            canonical_resource += '?' + parsed.query
+        canonical_resource = path + canonical_subresources(parsed.query)
 
         # 1) Date
         now = datetime.datetime.utcnow()
@@ -31,8 +95,8 @@ class S3Signer:
         for k, v in headers.items():
             lk = k.lower()
             if lk.startswith('x-amz-') or lk.startswith('x-emc-'):
-                # collapse whitespace
-                amz_headers[lk] = ' '.join(v.split())
+                # V2 only trims values, inner whitespace is signed as sent
+                amz_headers[lk] = v.strip()
         canonical_amz = ''.join(f"{k}:{amz_headers[k]}\n" for k in sorted(amz_headers))
 
         # 3) Content-MD5 (optionnel), Content-Type (optionnel)
@@ -57,3 +121,73 @@ class S3Signer:
         # 6) Authorization header
         headers['Authorization'] = f"AWS {access_key}:{signature_b64}"
         return headers
+
+    @staticmethod
+    def sign_request_v4(
+        method: str,
+        url: str,
+        headers: dict,
+        access_key: str,
+        secret_key: str,
+        region: str,
+        payload_hash: str = EMPTY_SHA256,
+        service: str = 's3',
+        now: datetime.datetime = None
+    ) -> dict:
+        """
+        AWS Signature Version 4 (header based).
+        - payload_hash: hex SHA-256 of the body, or UNSIGNED_PAYLOAD
+        - headers: dict of headers (mutated to add x-amz-date,
+          x-amz-content-sha256 and Authorization)
+        The derived signing key is cached per day/region/service.
+        """
+        parsed = urlparse(url)
+        now = now or datetime.datetime.utcnow()
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = amz_date[:8]
+
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = payload_hash
+
+        # 1) Canonical query: every parameter, URI-encoded and sorted
+        query = sorted(parse_qsl(parsed.query, keep_blank_values=True))
+        canonical_query = '&'.join(
+            f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in query
+        )
+
+        # 2) Canonical headers, host included
+        canonical = {'host': parsed.netloc}
+        for k, v in headers.items():
+            lk = k.lower()
+            if _v4_signed_header(lk):
+                canonical[lk] = ' '.join(str(v).split())
+        signed_headers = ';'.join(sorted(canonical))
+        canonical_headers = ''.join(f"{k}:{canonical[k]}\n" for k in sorted(canonical))
+
+        canonical_request = '\n'.join([
+            method,
+            parsed.path or '/',
+            canonical_query,
+            canonical_headers,
+            signed_headers,
+            payload_hash
+        ])
+
+        # 3) String to sign
+        scope = f"{datestamp}/{region}/{service}/aws4_request"
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+        ])
+
+        # 4) Signature with the cached derived key
+        key = _v4_signing_key(secret_key, datestamp, region, service)
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        headers['Authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
+import os
 import subprocess
 import sys
+import tempfile
 
 # Nom du profil défini dans .config.yaml
 PROFILE = "NEWBUCKET4"
 # Chemin vers votre CLI
 CLI = "python s3cli.py"
+# Options globales ajoutées à chaque commande (--config en mode --local)
+OPTIONS = ""
 
 def run(cmd):
     print(f"\n$ {cmd}")
@@ -17,20 +21,38 @@ def run(cmd):
 
 def main():
     # 1) Création des placeholders pour tous les prefixes
-    run(f"{CLI} --profile {PROFILE} create-prefixes")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} create-prefixes")
     # 2) Vérification : affichage des objets (les placeholders sont listés)
-    run(f"{CLI} --profile {PROFILE} list-objects {PROFILE}")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} list-objects {PROFILE}")
     # 3) Génération de règles de lifecycle avec +10 ans
-    run(f"{CLI} --profile {PROFILE} batch-lifecycle 10")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} batch-lifecycle 10")
     # 4) Maintenance mensuelle : supprime la plus ancienne, ajoute la suivante (+10 ans)
     # Utilisation du groupe 'lifecycle' et de la sous-commande 'populate-lifecycles'
-    run(f"{CLI} --profile {PROFILE} lifecycle populate-lifecycles {PROFILE} 10")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} lifecycle populate-lifecycles {PROFILE} 10")
     # 5) Affichage des règles de cycle de vie
-    run(f"{CLI} --profile {PROFILE} lifecycle get {PROFILE}")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} lifecycle get {PROFILE}")
     # 6) Liste des objets via la sous-commande lifecycle
-    run(f"{CLI} --profile {PROFILE} lifecycle list-objects {PROFILE}")
+    run(f"{CLI}{OPTIONS} --profile {PROFILE} lifecycle list-objects {PROFILE}")
 
     print("\n✅ Tous les tests se sont terminés avec succès.")
 
+def main_local():
+    """Même scénario hors ligne, contre le serveur LocalECSServer."""
+    global OPTIONS
+    import yaml
+    from s3manager.localserver import LocalECSServer
+
+    with open('.config.yaml') as f:
+        conf = dict(yaml.safe_load(f)[PROFILE])
+    with LocalECSServer({'local-user': ('local-secret', conf['namespace'])}) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        server.create_bucket(conf['namespace'], PROFILE)
+        conf.update(endpoint=server.url, access_key='local-user', secret_key='local-secret')
+        config_path = os.path.join(tmp, 'config.yaml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump({PROFILE: conf}, f)
+        OPTIONS = f" --config {config_path}"
+        main()
+
 if __name__ == "__main__":
-    main()
+    main_local() if '--local' in sys.argv[1:] else main()
@@ -0,0 +1,42 @@
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s3manager.auth import Authenticator  # noqa: E402
+from s3manager.localserver import LocalECSServer  # noqa: E402
+from s3manager.retry import RetryPolicy  # noqa: E402
+
+ACCESS_KEY = 'test-user'
+SECRET_KEY = 'test-secret'
+NAMESPACE = 'ns1'
+BUCKET = 'bucket1'
+
+
+@pytest.fixture
+def server():
+    with LocalECSServer({ACCESS_KEY: (SECRET_KEY, NAMESPACE)}, seed=1) as server:
+        server.create_bucket(NAMESPACE, BUCKET)
+        yield server
+
+
+@pytest.fixture
+def make_auth(server):
+    """Authenticator factory for the server, with retries that do not wait."""
+    def make(endpoint=None, secret_key=SECRET_KEY, max_attempts=5, **kwargs):
+        kwargs.setdefault('retry', RetryPolicy(max_attempts=max_attempts, base_delay=0.001, max_delay=0.01))
+        return Authenticator(ACCESS_KEY, secret_key, NAMESPACE, endpoint or server.url, **kwargs)
+    return make
+
+
+@pytest.fixture
+def dead_endpoint():
+    """URL of a local port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
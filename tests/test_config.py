@@ -0,0 +1,41 @@
+import json
+
+import yaml
+
+from s3manager import config
+
+CONFIG = """\
+p1:
+  access_key: AK1
+  secret_key: abc/def+ghi=   # comment
+  endpoint: [http://a, http://b]
+p2:
+  access_key: AK2
+  secret_key: 'it''s "quoted"'
+"""
+
+
+def load_twice(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(config, '_memo', {})
+    path = tmp_path / 'config.yaml'
+    path.write_text(text)
+    first = config.load_profiles(str(path))
+    config._memo.clear()
+    return first, config.load_profiles(str(path)), config._cache_path(str(path))
+
+
+def test_cache_holds_no_secret(tmp_path, monkeypatch):
+    first, second, cache_path = load_twice(tmp_path, monkeypatch, CONFIG)
+    assert first == second == yaml.safe_load(CONFIG)
+    with open(cache_path) as f:
+        cached = f.read()
+    assert 'abc/def' not in cached and 'quoted' not in cached
+    assert all('secret_key' not in conf for conf in json.loads(cached)['profiles'].values())
+
+
+def test_secrets_that_cannot_be_read_back_disable_the_cache(tmp_path, monkeypatch):
+    text = 'p1:\n  secret_key: "tab\\there"\n'
+    first, second, cache_path = load_twice(tmp_path, monkeypatch, text)
+    assert first == second == {'p1': {'secret_key': 'tab\there'}}
+    assert not (tmp_path / 'cache').exists()
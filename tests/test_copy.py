@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+from s3manager.auth import Authenticator
+from s3manager.localserver import LocalECSServer
+from s3manager.objects import MiB, ObjectManager
+
+
+@pytest.fixture
+def two_namespaces():
+    with LocalECSServer({'src-user': ('s1', 'ns1'), 'dst-user': ('s2', 'ns2')}) as server:
+        server.create_bucket('ns1', 'src')
+        server.create_bucket('ns1', 'dst')
+        server.create_bucket('ns2', 'dst')
+        yield server
+
+
+@pytest.fixture
+def managers(two_namespaces):
+    url = two_namespaces.url
+    return (ObjectManager(Authenticator('src-user', 's1', 'ns1', url)),
+            ObjectManager(Authenticator('dst-user', 's2', 'ns2', url)))
+
+
+@pytest.mark.parametrize('server_side', [True, False])
+def test_copy_prefix_keeps_content_type_and_metadata(managers, server_side):
+    source, other = managers
+    objects = {'p/small': b'hello', 'p/empty': b'', 'p/big': b'x' * (6 * MiB)}
+    for key, data in objects.items():
+        source.put_object('src', key, data, content_type='text/plain', metadata={'owner': key})
+    dest = source if server_side else other
+
+    res = dest.copy_prefix('src', 'p/', 'dst', dest_prefix='q/', source=source,
+                           multipart_threshold=5 * MiB, part_size=5 * MiB)
+    assert (res['server_side'], res['copied'], res['errors']) == (server_side, 3, [])
+    for key, data in objects.items():
+        info = dest.head_object('dst', 'q/' + key[2:])
+        assert (info['size'], info['content_type'], info['metadata']) == (len(data), 'text/plain', {'owner': key})
+
+
+@pytest.mark.parametrize('server_side', [True, False])
+def test_failed_multipart_copy_is_aborted(two_namespaces, managers, server_side):
+    source, other = managers
+    dest = source if server_side else other
+    source.put_object('src', 'big', b'x' * (6 * MiB))
+    with pytest.raises(requests.HTTPError) as e:
+        dest.copy_object_multipart('src', 'big', 6 * MiB, 'dst', 'copy', etag='stale',
+                                   part_size=5 * MiB, source=source)
+    assert e.value.response.status_code == 412
+    assert two_namespaces.bucket(dest.auth.namespace, 'dst').uploads == {}
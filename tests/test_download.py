@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from s3manager.objects import MiB, ObjectManager
+
+from conftest import BUCKET
+
+DATA = bytes(range(256)) * (12 * MiB // 256 + 1)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def stop_after(parts):
+    def progress(number, count, nbytes):
+        if number == parts:
+            raise Interrupted()
+    return progress
+
+
+@pytest.fixture
+def om(make_auth):
+    om = ObjectManager(make_auth())
+    om.put_object(BUCKET, 'big', DATA)
+    return om
+
+
+def gets(om):
+    records = []
+    om.auth.add_hook(lambda r: r.method == 'GET' and records.append(r))
+    return records
+
+
+def test_download_in_ranges(om, tmp_path):
+    path = str(tmp_path / 'big')
+    res = om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=3)
+    assert (res['parts'], res['resumed'], res['size']) == (3, 0, len(DATA))
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    assert os.listdir(tmp_path) == ['big']
+
+
+def test_interrupted_download_resumes_from_the_part_file(om, tmp_path):
+    path = str(tmp_path / 'big')
+    with pytest.raises(Interrupted):
+        om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=1, progress=stop_after(1))
+    assert sorted(os.listdir(tmp_path)) == ['big.part', 'big.part.json']
+    assert os.path.getsize(path + '.part') == len(DATA)
+
+    records = gets(om)
+    res = om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=1)
+    assert (res['parts'], res['resumed']) == (3, 1)
+    assert [r.status for r in records] == [206, 206]
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    assert os.listdir(tmp_path) == ['big']
+
+
+@pytest.mark.parametrize('change', ['object', 'part_size', 'no_resume'])
+def test_download_starts_over(om, tmp_path, change):
+    path = str(tmp_path / 'big')
+    with pytest.raises(Interrupted):
+        om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=1, progress=stop_after(2))
+    data = DATA
+    kwargs = {'part_size': 5 * MiB}
+    if change == 'object':
+        data = DATA[::-1]
+        om.put_object(BUCKET, 'big', data)
+    elif change == 'part_size':
+        kwargs['part_size'] = 6 * MiB
+    else:
+        kwargs['resume'] = False
+    res = om.download_file(BUCKET, 'big', path, workers=2, **kwargs)
+    assert res['resumed'] == 0
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_corrupt_part_file_fails_the_md5_check(om, tmp_path):
+    path = str(tmp_path / 'big')
+    with pytest.raises(Interrupted):
+        om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=1, progress=stop_after(1))
+    with open(path + '.part', 'r+b') as f:
+        f.write(b'corrupt')
+    with pytest.raises(ValueError, match='MD5'):
+        om.download_file(BUCKET, 'big', path, part_size=5 * MiB, workers=1)
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_object(om, tmp_path):
+    om.put_object(BUCKET, 'empty', b'')
+    path = str(tmp_path / 'empty')
+    assert om.download_file(BUCKET, 'empty', path)['size'] == 0
+    assert os.path.getsize(path) == 0
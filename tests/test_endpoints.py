@@ -0,0 +1,116 @@
+import pytest
+
+from s3manager.endpoints import EndpointPool, endpoint_list
+from s3manager.localserver import LocalECSServer
+
+from conftest import ACCESS_KEY, BUCKET, NAMESPACE, SECRET_KEY
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counts(pool):
+    return {s['endpoint']: s['requests'] for s in pool.status()}
+
+
+def test_round_robin_spreads_requests():
+    pool = EndpointPool(['http://a/', 'http://b', 'http://c'])
+    for _ in range(9):
+        pool.release(pool.acquire())
+    assert counts(pool) == {'http://a': 3, 'http://b': 3, 'http://c': 3}
+
+
+def test_least_outstanding_avoids_busy_endpoints():
+    pool = EndpointPool(['http://a', 'http://b'], strategy='least-outstanding')
+    busy = pool.acquire()
+    assert pool.acquire() != busy
+
+
+def attempt(pool, failing=()):
+    endpoint = pool.acquire()
+    pool.release(endpoint, failed=endpoint in failing)
+    return endpoint
+
+
+def test_ejection_and_recovery():
+    clock = Clock()
+    pool = EndpointPool(['http://a', 'http://b'], cooldown=30, max_failures=2, clock=clock)
+    # Round-robin: a (fails), b, a (succeeds, resets its count)
+    assert [attempt(pool, ['http://a']), attempt(pool), attempt(pool)] == ['http://a', 'http://b', 'http://a']
+    assert all(s['ejections'] == 0 for s in pool.status())
+
+    # Two failures in a row eject a
+    assert [attempt(pool, ['http://a']) for _ in range(4)] == ['http://b', 'http://a'] * 2
+    status = {s['endpoint']: s for s in pool.status()}
+    assert status['http://a']['ejections'] == 1
+    assert status['http://a']['ejected_for'] == 30
+    assert {attempt(pool) for _ in range(4)} == {'http://b'}
+
+    clock.now = 29.9
+    assert attempt(pool) == 'http://b'
+    clock.now = 30
+    assert {attempt(pool) for _ in range(4)} == {'http://a', 'http://b'}
+    assert {s['endpoint']: s['outstanding'] for s in pool.status()} == {'http://a': 0, 'http://b': 0}
+
+
+def test_all_ejected_uses_the_first_to_come_back():
+    clock = Clock()
+    pool = EndpointPool(['http://a', 'http://b'], cooldown=30, clock=clock)
+    pool.release(pool.acquire(), failed=True)   # a, back at 30
+    clock.now = 10
+    pool.release(pool.acquire(), failed=True)   # b, back at 40
+    assert pool.acquire() == 'http://a'
+
+
+def test_from_config():
+    assert EndpointPool.from_config({'endpoint': 'http://a'}) is None
+    pool = EndpointPool.from_config({'endpoint': ['http://a/', 'http://b'], 'endpoint_strategy': 'least-outstanding',
+                                     'endpoint_cooldown': 5, 'endpoint_max_failures': 3})
+    assert (pool.endpoints, pool.strategy, pool.cooldown, pool.max_failures) == (
+        ['http://a', 'http://b'], 'least-outstanding', 5.0, 3)
+    assert endpoint_list({'endpoint': 'http://a/'}) == ['http://a']
+    with pytest.raises(ValueError):
+        EndpointPool(['http://a'], strategy='random')
+
+
+def test_dead_node_is_ejected_and_recovers(server, make_auth, dead_endpoint):
+    clock = Clock()
+    pool = EndpointPool([dead_endpoint, server.url], cooldown=30, clock=clock)
+    auth = make_auth(endpoints=pool)
+    for i in range(6):
+        resp = auth.request('PUT', bucket=BUCKET, object_name=f"k{i}", payload=b'x')
+        assert resp.status_code == 200
+    status = {s['endpoint']: s for s in pool.status()}
+    # One failed attempt on the dead node, retried on the live one
+    assert status[dead_endpoint]['requests'] == 1
+    assert status[dead_endpoint]['ejections'] == 1
+    assert status[server.url]['requests'] == 6
+
+    # The node comes back on the same port; after the cooldown it gets requests again
+    port = int(dead_endpoint.rsplit(':', 1)[1])
+    with LocalECSServer({ACCESS_KEY: (SECRET_KEY, NAMESPACE)}, port=port) as revived:
+        revived.create_bucket(NAMESPACE, BUCKET)
+        clock.now = 30
+        for i in range(6):
+            assert auth.request('GET', bucket=BUCKET).status_code == 200
+        assert revived.request_count == 3
+    assert {s['endpoint']: s['ejections'] for s in pool.status()} == {dead_endpoint: 1, server.url: 0}
+
+
+def test_throttling_does_not_eject(server, make_auth):
+    clock = Clock()
+    sick = LocalECSServer({ACCESS_KEY: (SECRET_KEY, NAMESPACE)}).start()
+    try:
+        pool = EndpointPool([sick.url, server.url], cooldown=30, clock=clock)
+        auth = make_auth(endpoints=pool, max_attempts=1)
+        sick.error_rate = 1.0  # 503 SlowDown: throttling, not a sick node
+        for _ in range(4):
+            auth.request('GET', bucket=BUCKET)
+        assert {s['endpoint']: s['ejections'] for s in pool.status()}[sick.url] == 0
+    finally:
+        sick.stop()
@@ -0,0 +1,78 @@
+from s3manager.bucket import BucketManager
+from s3manager.index import ObjectIndex
+
+from conftest import BUCKET, NAMESPACE
+
+
+def keys(index, prefix=''):
+    return [obj.key for obj in index.list_objects(prefix)]
+
+
+def fill(bucket, *names):
+    for name in names:
+        bucket.put(name, name.encode('utf-8'))
+
+
+def test_build_and_queries(server, make_auth, tmp_path):
+    bucket = server.bucket(NAMESPACE, BUCKET)
+    fill(bucket, 'root.txt', '01-2020/', '01-2020/a', '01-2020/b', '02-2020/a')
+    with ObjectIndex(str(tmp_path / 'index.sqlite')) as index:
+        stats = index.build(BucketManager(make_auth()), BUCKET)
+        assert (stats['listed'], stats['objects']) == (2, 5)
+        assert keys(index) == ['01-2020/', '01-2020/a', '01-2020/b', '02-2020/a', 'root.txt']
+        assert keys(index, '01-2020/') == ['01-2020/', '01-2020/a', '01-2020/b']
+        assert index.summary('01-2020/') == {'objects': 3, 'bytes': len('01-2020/' '01-2020/a' '01-2020/b')}
+        assert index.exists_any('01-2020/') and not index.exists_any('03-2020/')
+        assert [p[0] for p in index.partitions()] == ['', '01-2020/', '02-2020/']
+
+
+def test_refresh_lists_known_folders_after_their_last_key(server, make_auth, tmp_path):
+    bucket = server.bucket(NAMESPACE, BUCKET)
+    fill(bucket, '01-2020/a', '01-2020/b', '02-2020/a', 'gone/x')
+    bm = BucketManager(make_auth())
+    with ObjectIndex(str(tmp_path / 'index.sqlite')) as index:
+        index.build(bm, BUCKET)
+        markers = {name: marker for name, marker, _, _ in index.partitions()}
+        assert markers['01-2020/'] == '01-2020/b'
+
+        fill(bucket, '01-2020/c', '03-2020/a', 'root.txt')
+        bucket.delete('gone/x')
+        # Deleted inside a known folder: not seen by an incremental refresh
+        bucket.delete('01-2020/a')
+        server.request_count = 0
+        stats = index.refresh(bm, BUCKET)
+        assert (stats['listed'], stats['checked'], stats['removed']) == (1, 2, 1)
+        # Folders, root keys, then one listing per folder
+        assert server.request_count == 5
+        assert keys(index) == ['01-2020/a', '01-2020/b', '01-2020/c', '02-2020/a', '03-2020/a', 'root.txt']
+        assert {name: marker for name, marker, _, _ in index.partitions()}['01-2020/'] == '01-2020/c'
+
+        # Nothing changed: one request per folder finds nothing new, root keys are listed again
+        stats = index.refresh(bm, BUCKET)
+        assert (stats['listed'], stats['checked'], stats['added']) == (0, 3, 1)
+
+        stats = index.refresh(bm, BUCKET, prefixes=['01-2020/'])
+        assert (stats['listed'], stats['checked']) == (1, 0)
+        assert keys(index, '01-2020/') == ['01-2020/b', '01-2020/c']
+
+
+def test_max_age_relists_old_folders(server, make_auth, tmp_path):
+    bucket = server.bucket(NAMESPACE, BUCKET)
+    fill(bucket, '01-2020/a', '01-2020/b')
+    bm = BucketManager(make_auth())
+    with ObjectIndex(str(tmp_path / 'index.sqlite')) as index:
+        index.build(bm, BUCKET)
+        bucket.delete('01-2020/a')
+        assert index.refresh(bm, BUCKET, max_age=3600)['listed'] == 0
+        assert keys(index) == ['01-2020/a', '01-2020/b']
+        assert index.refresh(bm, BUCKET, max_age=0)['listed'] == 1
+        assert keys(index) == ['01-2020/b']
+
+
+def test_index_survives_reopening(server, make_auth, tmp_path):
+    fill(server.bucket(NAMESPACE, BUCKET), '01-2020/a')
+    path = str(tmp_path / 'index.sqlite')
+    with ObjectIndex(path) as index:
+        index.build(BucketManager(make_auth()), BUCKET)
+    with ObjectIndex(path, create=False) as index:
+        assert keys(index) == ['01-2020/a']
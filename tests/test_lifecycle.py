@@ -0,0 +1,112 @@
+from s3manager.lifecycle import (
+    NS, LifecycleConfig, LifecycleManager, LifecycleRule, date_rules_for_prefixes
+)
+
+from conftest import BUCKET, NAMESPACE
+
+FOREIGN_DOCUMENT = f"""<?xml version="1.0" encoding="UTF-8"?>
+<LifecycleConfiguration xmlns="{NS}">
+  <Rule>
+    <ID>lifecycle-01-2020</ID>
+    <Filter><Prefix>01-2020/</Prefix></Filter>
+    <Status>Enabled</Status>
+    <Expiration><Date>2030-01-01T00:00:00.000Z</Date></Expiration>
+  </Rule>
+  <Rule>
+    <ID>legacy</ID>
+    <Prefix>logs/</Prefix>
+    <Status>Disabled</Status>
+    <Expiration><Days>30</Days></Expiration>
+    <NoncurrentVersionExpiration><NoncurrentDays>7</NoncurrentDays></NoncurrentVersionExpiration>
+  </Rule>
+  <Rule>
+    <ID>tagged</ID>
+    <Filter><And><Prefix>tmp/</Prefix><Tag><Key>k</Key><Value>v</Value></Tag></And></Filter>
+    <Status>Enabled</Status>
+    <Transition><Days>10</Days><StorageClass>GLACIER</StorageClass></Transition>
+  </Rule>
+</LifecycleConfiguration>
+""".encode('utf-8')
+
+
+def sample_config():
+    return LifecycleConfig([
+        *date_rules_for_prefixes(['03-2021', '01-2020', '12-2020'], 10),
+        LifecycleRule('expire-after-30-days', days=30, noncurrent_days=7),
+        LifecycleRule('remove-expired-markers', delete_marker=True),
+        LifecycleRule('archive & co', 'archive/<x>', extra=[
+            '<Transition><Days>30</Days><StorageClass>GLACIER</StorageClass></Transition>'
+        ]),
+    ])
+
+
+def test_serialize_parse_round_trip():
+    config = sample_config()
+    data = config.serialize()
+    parsed = LifecycleConfig.parse(data)
+    assert list(parsed) == list(config)
+    assert parsed.serialize() == data
+
+
+def test_foreign_document_is_read_and_kept():
+    config = LifecycleConfig.parse(FOREIGN_DOCUMENT)
+    assert config.ids() == ['lifecycle-01-2020', 'legacy', 'tagged']
+    assert config.get('lifecycle-01-2020').date == '2030-01-01T00:00:00Z'
+    legacy = config.get('legacy')
+    assert (legacy.prefix, legacy.status, legacy.days, legacy.noncurrent_days) == ('logs/', 'Disabled', 30, 7)
+    tagged = config.get('tagged')
+    assert tagged.prefix is None
+    assert tagged.extra[0].startswith('<Filter><And>')
+    # Unknown elements survive and the canonical form is stable
+    data = config.serialize()
+    assert b'<StorageClass>GLACIER</StorageClass>' in data
+    assert b'<Tag><Key>k</Key><Value>v</Value></Tag>' in data
+    assert LifecycleConfig.parse(data).serialize() == data
+    assert data.index(b'<Filter><And>') < data.index(b'<Status>Enabled</Status><Transition>')
+
+
+def test_oldest_and_newest_follow_prefix_dates():
+    config = sample_config()
+    assert config.oldest('lifecycle-').id == 'lifecycle-01-2020'
+    assert config.newest('lifecycle-').id == 'lifecycle-03-2021'
+    config.remove('lifecycle-03-2021')
+    assert config.newest('lifecycle-').id == 'lifecycle-12-2020'
+    assert config.oldest('other-') is None
+
+
+def test_digest_ignores_the_rule_id_only():
+    rule = LifecycleRule('a', 'p/', date='2030-01-01')
+    assert LifecycleRule('b', 'p/', date='2030-01-01T00:00:00Z').digest() == rule.digest()
+    assert LifecycleRule('a', 'p/', date='2031-01-01').digest() != rule.digest()
+
+
+def test_plan_sync_is_idempotent(server, make_auth):
+    lm = LifecycleManager(make_auth())
+    with lm.transaction(BUCKET) as tx:
+        tx.add_days_rule('expire-after-30-days', 30)
+        tx.add_date_rule('lifecycle-01-2019', '01-2019/', '2029-01-01')
+    desired = date_rules_for_prefixes(['01-2020', '02-2020'], 10)
+
+    plan = lm.plan_sync(BUCKET, desired)
+    assert [r.id for r in plan['add']] == ['lifecycle-01-2020', 'lifecycle-02-2020']
+    assert [r.id for r in plan['remove']] == ['lifecycle-01-2019']
+    assert lm.apply_sync(BUCKET, plan)['changed']
+
+    for _ in range(2):
+        plan = lm.plan_sync(BUCKET, desired)
+        assert (plan['add'], plan['change'], plan['remove']) == ([], [], [])
+        assert [r.id for r in plan['unchanged']] == ['lifecycle-01-2020', 'lifecycle-02-2020']
+        assert lm.apply_sync(BUCKET, plan) == {'success': True, 'changed': False}
+
+    stored = LifecycleConfig.parse(server.bucket(NAMESPACE, BUCKET).lifecycle)
+    # Rules outside the managed prefix are kept
+    assert stored.ids() == ['expire-after-30-days', 'lifecycle-01-2020', 'lifecycle-02-2020']
+
+
+def test_plan_sync_detects_changed_rules(make_auth):
+    lm = LifecycleManager(make_auth())
+    lm.apply_sync(BUCKET, lm.plan_sync(BUCKET, date_rules_for_prefixes(['01-2020'], 10)))
+    plan = lm.plan_sync(BUCKET, date_rules_for_prefixes(['01-2020'], 5))
+    assert [(new.date, old.date) for new, old in plan['change']] == [
+        ('2025-01-01T00:00:00Z', '2030-01-01T00:00:00Z')
+    ]
@@ -0,0 +1,113 @@
+import pytest
+import requests
+
+from s3manager.retry import AIMDLimiter, RetryPolicy
+
+from conftest import BUCKET
+
+
+def attempts_of(auth):
+    records = []
+    auth.add_hook(records.append)
+    return records
+
+
+def test_503_is_retried_until_success(server, make_auth):
+    auth = make_auth(max_attempts=10)
+    records = attempts_of(auth)
+    server.error_rate = 0.3
+    for i in range(20):
+        assert auth.request('PUT', bucket=BUCKET, object_name=f"k{i}", payload=b'x').status_code == 200
+    assert server.injected_errors > 0
+    assert max(r.attempt for r in records) > 1
+    assert len(records) == 20 + server.injected_errors
+
+
+def test_503_gives_up_after_max_attempts(server, make_auth):
+    auth = make_auth(max_attempts=3)
+    records = attempts_of(auth)
+    server.error_rate = 1.0
+    assert auth.request('GET', bucket=BUCKET).status_code == 503
+    assert [r.attempt for r in records] == [1, 2, 3]
+    assert server.request_count == 3
+
+
+def test_multipart_initiate_is_not_retried(server, make_auth):
+    auth = make_auth()
+    server.error_rate = 1.0
+    assert auth.request('POST', bucket=BUCKET, object_name='big', subresource='?uploads').status_code == 503
+    assert server.request_count == 1
+
+
+def test_connection_error_is_retried_then_raised(make_auth, dead_endpoint):
+    auth = make_auth(endpoint=dead_endpoint, max_attempts=3)
+    records = attempts_of(auth)
+    with pytest.raises(requests.ConnectionError):
+        auth.request('GET', bucket=BUCKET)
+    assert [(r.attempt, r.error) for r in records] == [(i, 'ConnectionError') for i in (1, 2, 3)]
+
+
+def test_throttled_response_halves_the_limit(server, make_auth):
+    limiter = AIMDLimiter(initial=16)
+    auth = make_auth(max_attempts=1, limiter=limiter)
+    server.error_rate = 1.0
+    auth.request('GET', bucket=BUCKET)
+    assert (limiter.limit, limiter.throttled, limiter.in_flight) == (8, 1, 0)
+
+
+def test_connection_errors_halve_the_limit_per_attempt(make_auth, dead_endpoint):
+    limiter = AIMDLimiter(initial=16)
+    auth = make_auth(endpoint=dead_endpoint, max_attempts=3, limiter=limiter)
+    with pytest.raises(requests.ConnectionError):
+        auth.request('GET', bucket=BUCKET)
+    assert (limiter.limit, limiter.throttled, limiter.in_flight) == (2, 3, 0)
+
+
+def test_local_errors_do_not_throttle(make_auth):
+    limiter = AIMDLimiter(initial=16)
+    auth = make_auth(method='v3', limiter=limiter)
+    with pytest.raises(NotImplementedError):
+        auth.request('GET', bucket=BUCKET)
+    assert limiter.throttled == 0
+    assert limiter.limit >= 16
+    assert limiter.in_flight == 0
+
+
+def test_successes_raise_the_limit_additively(make_auth):
+    limiter = AIMDLimiter(initial=4, maximum=64)
+    auth = make_auth(limiter=limiter)
+    for _ in range(4):
+        assert auth.request('GET', bucket=BUCKET).status_code == 200
+    assert 4.9 < limiter.limit < 5.1
+
+
+def test_burst_of_throttling_halves_the_limit_once():
+    limiter = AIMDLimiter(initial=16)
+    tokens = [limiter.acquire() for _ in range(8)]
+    for token in tokens:
+        limiter.release(token, throttled=True)
+    assert (limiter.limit, limiter.throttled) == (8, 8)
+    # A request sent after the decrease is counted again
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 4
+
+
+def test_limit_stays_within_bounds():
+    limiter = AIMDLimiter(initial=2, minimum=2, maximum=3)
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+    for _ in range(20):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 3
+
+
+class _Response:
+    def __init__(self, retry_after=None):
+        self.headers = {'Retry-After': retry_after} if retry_after else {}
+
+
+def test_delay_honours_retry_after_up_to_max_delay():
+    policy = RetryPolicy(base_delay=0.001, max_delay=5)
+    assert policy.delay(1, _Response('2')) == 2
+    assert policy.delay(1, _Response('60')) == 5
+    assert 0 <= policy.delay(10) <= 5
@@ -0,0 +1,95 @@
+import hashlib
+import os
+
+from s3manager.objects import MULTIPART_THRESHOLD, MiB, ObjectManager, choose_part_size
+from s3manager.sync import DirectorySync, HashCache, etag_part_size, hash_files
+
+from conftest import BUCKET, NAMESPACE
+
+
+def test_pull_skips_keys_outside_the_directory(server, make_auth, tmp_path):
+    bucket = server.bucket(NAMESPACE, BUCKET)
+    for key in ('p/ok.txt', 'p/../../escape.txt', 'p/a/../../../up.txt'):
+        bucket.put(key, b'data')
+    local = tmp_path / 'dst'
+    errors = []
+    with HashCache(':memory:') as cache:
+        res = DirectorySync(ObjectManager(make_auth()), cache).pull(
+            BUCKET, 'p/', str(local), progress=lambda rel, reason, err: err and errors.append(rel))
+    assert sorted(e['path'] for e in res['errors']) == sorted(errors) == ['../../escape.txt', 'a/../../../up.txt']
+    assert res['transferred'] == 1
+    assert [p.name for p in tmp_path.rglob('*.txt')] == ['ok.txt']
+    assert (local / 'ok.txt').read_bytes() == b'data'
+
+
+def write(path, data):
+    path.write_bytes(data)
+    st = os.stat(path)
+    return str(path), st.st_size, st.st_mtime_ns
+
+
+def test_etag_part_size():
+    big = MULTIPART_THRESHOLD + 1
+    assert etag_part_size(10) == 0
+    assert etag_part_size(big) == choose_part_size(big)
+    assert etag_part_size(big, 'd41d8cd98f00b204e9800998ecf8427e') == 0
+    parts = -(-big // choose_part_size(big))
+    assert etag_part_size(big, f"abc-{parts}") == choose_part_size(big)
+    # Uploaded with another part size: the ETag cannot be compared
+    assert etag_part_size(big, f"abc-{parts + 1}") is None
+    assert etag_part_size(10, 'abc-1') == choose_part_size(10)
+
+
+def test_local_etags_match_the_server(make_auth, tmp_path):
+    om = ObjectManager(make_auth())
+    data = os.urandom(11 * MiB)
+    path, size, mtime_ns = write(tmp_path / 'big', data)
+    small = write(tmp_path / 'small', b'hello')
+    empty = write(tmp_path / 'empty', b'')
+    multipart = om.upload_file(BUCKET, 'big', path, part_size=5 * MiB, multipart_threshold=5 * MiB)
+    assert multipart['etag'].endswith('-3')
+
+    etags = hash_files([(path, size, mtime_ns, 5 * MiB), (*small, 0), (*empty, 0)], workers=4)
+    assert etags == {
+        path: multipart['etag'],
+        small[0]: hashlib.md5(b'hello').hexdigest(),
+        empty[0]: hashlib.md5(b'').hexdigest(),
+    }
+
+
+def test_hash_cache_hits_while_size_and_mtime_are_unchanged(tmp_path):
+    path, size, mtime_ns = write(tmp_path / 'f', b'first')
+    with HashCache(str(tmp_path / 'hashes.sqlite')) as cache:
+        assert hash_files([(path, size, mtime_ns, 0)], cache) == {path: hashlib.md5(b'first').hexdigest()}
+        assert cache.get(path, size, mtime_ns, 0) == hashlib.md5(b'first').hexdigest()
+
+        # Same size and mtime: the file is not read again
+        write(tmp_path / 'f', b'other')
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        assert hash_files([(path, size, mtime_ns, 0)], cache) == {path: hashlib.md5(b'first').hexdigest()}
+
+        # Another mtime or part size is a miss
+        assert hash_files([(path, size, mtime_ns + 1, 0)], cache) == {path: hashlib.md5(b'other').hexdigest()}
+        assert cache.get(path, size, mtime_ns, 5 * MiB) is None
+        part_etag = hashlib.md5(hashlib.md5(b'other').digest()).hexdigest() + '-1'
+        assert hash_files([(path, size, mtime_ns, 5 * MiB)], cache) == {path: part_etag}
+
+    with HashCache(str(tmp_path / 'hashes.sqlite')) as cache:
+        # One entry per path, the latest one, kept across sessions
+        assert cache.get(path, size, mtime_ns + 1, 0) is None
+        assert cache.get(path, size, mtime_ns, 5 * MiB) == part_etag
+
+
+def test_push_then_pull_transfers_nothing(make_auth, tmp_path):
+    local = tmp_path / 'src'
+    (local / 'd').mkdir(parents=True)
+    (local / 'd' / 'a.txt').write_bytes(b'a')
+    (local / 'big').write_bytes(os.urandom(MULTIPART_THRESHOLD + 1))
+    with HashCache(':memory:') as cache:
+        syncer = DirectorySync(ObjectManager(make_auth()), cache)
+        assert syncer.push(str(local), BUCKET, 'p/')['transferred'] == 2
+        assert syncer.plan(str(local), BUCKET, 'p/', push=True)['transfer'] == []
+        assert syncer.pull(BUCKET, 'p/', str(local))['transferred'] == 0
+
+        (local / 'd' / 'a.txt').write_bytes(b'b')
+        assert syncer.plan(str(local), BUCKET, 'p/', push=True)['transfer'] == [('d/a.txt', 'etag')]
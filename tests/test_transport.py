@@ -0,0 +1,22 @@
+from s3manager.transport import Transport
+
+URL = 'http://127.0.0.1:9020/bucket'
+
+
+def test_from_config_sizes_the_pool_for_the_profile():
+    transport = Transport.from_config({'endpoint': ['http://a', 'http://b'], 'pool_size': 4})
+    assert (transport.pool_size, transport.hosts) == (64, 2)
+    transport = Transport.from_config({'pool_size': 4, 'adaptive_concurrency': False})
+    assert (transport.pool_size, transport.hosts) == (4, 1)
+
+
+def test_reserve_keeps_the_adapter_while_it_fits():
+    transport = Transport(pool_size=16)
+    adapter = transport.session.get_adapter(URL)
+    transport.reserve(16)
+    transport.reserve_hosts(3)
+    assert transport.session.get_adapter(URL) is adapter
+
+    transport.reserve(32)
+    assert transport.pool_size == 32
+    assert transport.session.get_adapter(URL) is not adapter